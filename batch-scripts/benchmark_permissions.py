@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+
+from mediadrop.lib.cli_commands import LoadAppCommand, load_app
+
+_script_name = "Permission Benchmark"
+_script_description = """Use this script to measure the overhead of permission checks.
+
+Specify your ini config file as the first argument to this script.
+
+The script compares building a new permission system for every call (as
+viewable_media() used to do) with the permission system which is shared by
+all requests. Only the overhead is measured, the filtered query is not
+executed."""
+
+# BEGIN SCRIPT & SCRIPT SPECIFIC IMPORTS
+import sys
+import time
+
+
+def measure(function, iterations):
+    """Return the average time of one call in microseconds."""
+    function()
+    started = time.time()
+    for i in xrange(iterations):
+        function()
+    return (time.time() - started) / iterations * 1000000
+
+def main(parser, options, args):
+    from pylons import config
+    from mediadrop.lib.auth.permission_system import MediaDropPermissionSystem
+    from mediadrop.model import DBSession, Media
+
+    config = config._current_obj()
+    shared_system = config['pylons.app_globals'].permission_system
+    perm = MediaDropPermissionSystem.permissions_for_request({}, config)
+    query = Media.query.published()
+
+    def per_call():
+        permission_system = MediaDropPermissionSystem(config)
+        permission_system.filter_restricted_items(query, u'view', perm)
+        permission_system.has_permission(u'view', perm)
+
+    def shared():
+        shared_system.filter_restricted_items(query, u'view', perm)
+        shared_system.has_permission(u'view', perm)
+
+    results = [
+        ('new system per call', measure(per_call, options.iterations)),
+        ('shared system', measure(shared, options.iterations)),
+    ]
+    DBSession.remove()
+    for name, microseconds in results:
+        print '%-20s %8.1f us/call' % (name, microseconds)
+
+if __name__ == "__main__":
+    cmd = LoadAppCommand(_script_name, _script_description)
+    cmd.parser.add_option(
+        '--iterations',
+        action='store',
+        type='int',
+        dest='iterations',
+        help='Number of calls which are measured (default: 2000).',
+        default=2000,
+    )
+    load_app(cmd)
+    main(cmd.parser, cmd.options, cmd.args)
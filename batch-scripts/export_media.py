@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+
+from mediadrop.lib.cli_commands import LoadAppCommand, load_app
+
+_script_name = "Media Exporter"
+_script_description = """Use this script to export all published media as newline delimited JSON.
+
+Specify your ini config file as the first argument to this script.
+
+Every line contains the same data as the /api/media/export API (one media
+item per line). Pass --modified-since with the start time of the previous
+export to get only the media which were changed since then."""
+
+# BEGIN SCRIPT & SCRIPT SPECIFIC IMPORTS
+from datetime import datetime
+import os
+import sys
+
+
+def main(parser, options, args):
+    from pylons import config
+    from mediadrop.config.middleware import setup_app
+    from mediadrop.lib.media_export import (export_to_file,
+        parse_modified_since)
+    from mediadrop.model import DBSession
+    from mediadrop.model.settings import Setting
+
+    base_url = options.base_url or config.get('feeds_base_url')
+    if not base_url:
+        parser.error('Please specify --base-url or set feeds_base_url.')
+    if options.modified_since and \
+            parse_modified_since(options.modified_since) is None:
+        parser.error("Please specify the date as 'YYYY-MM-DD HH:MM:SS'.")
+    api_key = Setting.query.filter_by(key=u'api_secret_key').one().value
+    app = setup_app(config._current_obj(), full_stack=False,
+        static_files=False)
+
+    started = datetime.now()
+    if options.output in (None, '-'):
+        exported = export_to_file(app, base_url, sys.stdout, api_key,
+            options.modified_since)
+    else:
+        # the file is replaced only after a complete export
+        temp_path = options.output + '.tmp'
+        with open(temp_path, 'wb') as fileobj:
+            exported = export_to_file(app, base_url, fileobj, api_key,
+                options.modified_since)
+        os.rename(temp_path, options.output)
+    DBSession.remove()
+    print >> sys.stderr, 'Exported %d media items (started at %s)' % \
+        (exported, started.strftime('%Y-%m-%d %H:%M:%S'))
+
+if __name__ == "__main__":
+    cmd = LoadAppCommand(_script_name, _script_description)
+    cmd.parser.add_option(
+        '--output',
+        action='store',
+        dest='output',
+        help='File to write the export to (default: standard output).',
+        default=None,
+    )
+    cmd.parser.add_option(
+        '--modified-since',
+        action='store',
+        dest='modified_since',
+        help="Only export media modified at or after this date "
+             "('YYYY-MM-DD HH:MM:SS').",
+        default=None,
+    )
+    cmd.parser.add_option(
+        '--base-url',
+        action='store',
+        dest='base_url',
+        help='URL of the site which is used for links in the export '
+             '(default: feeds_base_url from the config file).',
+        default=None,
+    )
+    load_app(cmd)
+    main(cmd.parser, cmd.options, cmd.args)
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+
+from mediadrop.lib.cli_commands import LoadAppCommand, load_app
+
+_script_name = "Feed Generator"
+_script_description = """Use this script to pregenerate all feed and sitemap files.
+
+Specify your ini config file as the first argument to this script.
+
+The files are only used if 'pregenerate_feeds' is enabled in the config
+file. MediaDrop regenerates them after media was published or unpublished;
+run this script regularly (e.g. every 15 minutes from cron) so other changes
+(edited media, new views, publish dates which were reached) show up in the
+feeds as well."""
+
+# BEGIN SCRIPT & SCRIPT SPECIFIC IMPORTS
+
+
+def main(parser, options, args):
+    from pylons import config
+    from mediadrop.config.middleware import setup_app
+    from mediadrop.lib.feed_files import feed_files
+    from mediadrop.model import DBSession
+
+    base_url = options.base_url or config.get('feeds_base_url')
+    if not base_url:
+        parser.error('Please specify --base-url or set feeds_base_url.')
+    app = setup_app(config._current_obj(), full_stack=False,
+        static_files=False)
+    written = feed_files.generate(base_url, app=app)
+    DBSession.remove()
+    print 'Wrote %d feed files to %s' % (written, feed_files.directory())
+
+if __name__ == "__main__":
+    cmd = LoadAppCommand(_script_name, _script_description)
+    cmd.parser.add_option(
+        '--base-url',
+        action='store',
+        dest='base_url',
+        help='URL of the site which is used for links in the feeds '
+             '(default: feeds_base_url from the config file).',
+        default=None,
+    )
+    load_app(cmd)
+    main(cmd.parser, cmd.options, cmd.args)
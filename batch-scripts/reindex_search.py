@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+
+from mediadrop.lib.cli_commands import LoadAppCommand, load_app
+
+_script_name = "Search Index Rebuilder"
+_script_description = """Use this script to rebuild the search index.
+
+Specify your ini config file as the first argument to this script.
+
+MediaDrop updates the index whenever media, tags or categories are changed.
+Run this script after changing the search backend or its configuration
+(e.g. 'search_postgresql_config') and after importing media directly into
+the database."""
+
+# BEGIN SCRIPT & SCRIPT SPECIFIC IMPORTS
+import sys
+
+from sqlalchemy import sql
+
+
+def media_ids_in_batches(batch_size):
+    from mediadrop.model import DBSession
+    from mediadrop.model.media import media
+    last_id = 0
+    while True:
+        select = sql.select([media.c.id], media.c.id > last_id).\
+            order_by(media.c.id).limit(batch_size)
+        # the session is committed after every batch
+        connection = DBSession.connection()
+        media_ids = [row[0] for row in connection.execute(select)]
+        if not media_ids:
+            break
+        yield media_ids
+        last_id = media_ids[-1]
+
+def main(parser, options, args):
+    from mediadrop.lib.search import search_backend, update_search_index
+    from mediadrop.model import DBSession, Media
+
+    backend = search_backend(DBSession.connection())
+    total = Media.query.count()
+    done = 0
+    print 'Rebuilding the %s search index for %d media items' % (backend.name, total)
+    backend.clear_index(DBSession.connection())
+    DBSession.commit()
+    for media_ids in media_ids_in_batches(options.batch_size):
+        update_search_index(DBSession.connection(), media_ids, backend=backend)
+        DBSession.commit()
+        done += len(media_ids)
+        sys.stdout.write('\r%d/%d' % (done, total))
+        sys.stdout.flush()
+    sys.stdout.write('\n')
+
+if __name__ == "__main__":
+    cmd = LoadAppCommand(_script_name, _script_description)
+    cmd.parser.add_option(
+        '--batch-size',
+        action='store',
+        type='int',
+        dest='batch_size',
+        help='Number of media items per transaction (default: 500).',
+        default=500,
+    )
+    load_app(cmd)
+    main(cmd.parser, cmd.options, cmd.args)
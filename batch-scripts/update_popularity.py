@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+
+from mediadrop.lib.cli_commands import LoadAppCommand, load_app
+
+_script_name = "Popularity Updater"
+_script_description = """Use this script to recompute the popularity scores.
+
+Specify your ini config file as the first argument to this script.
+
+MediaDrop only updates the popularity of a media item when it is liked,
+disliked or edited. Run this script regularly (e.g. hourly from cron) so
+media which were published (or unpublished) by their publish dates get the
+right scores."""
+
+# BEGIN SCRIPT & SCRIPT SPECIFIC IMPORTS
+import sys
+
+from sqlalchemy import sql
+
+
+def media_ids_in_batches(batch_size):
+    from mediadrop.model import DBSession
+    from mediadrop.model.media import media
+    last_id = 0
+    while True:
+        select = sql.select([media.c.id], media.c.id > last_id).\
+            order_by(media.c.id).limit(batch_size)
+        # the session is committed after every batch
+        connection = DBSession.connection()
+        media_ids = [row[0] for row in connection.execute(select)]
+        if not media_ids:
+            break
+        yield media_ids
+        last_id = media_ids[-1]
+
+def main(parser, options, args):
+    from datetime import datetime
+    from mediadrop.lib.popularity import popularity_settings, update_popularity
+    from mediadrop.model import DBSession, Media
+
+    decay = popularity_settings(DBSession.connection())
+    now = datetime.now()
+    total = Media.query.count()
+    done = updated = 0
+    print 'Computing popularity for %d media items' % total
+    for media_ids in media_ids_in_batches(options.batch_size):
+        updated += update_popularity(DBSession.connection(), media_ids,
+            decay=decay, now=now)
+        DBSession.commit()
+        done += len(media_ids)
+        sys.stdout.write('\r%d/%d' % (done, total))
+        sys.stdout.flush()
+    sys.stdout.write('\n')
+    print 'Updated %d media items' % updated
+
+if __name__ == "__main__":
+    cmd = LoadAppCommand(_script_name, _script_description)
+    cmd.parser.add_option(
+        '--batch-size',
+        action='store',
+        type='int',
+        dest='batch_size',
+        help='Number of media items per transaction (default: 1000).',
+        default=1000,
+    )
+    load_app(cmd)
+    main(cmd.parser, cmd.options, cmd.args)
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+
+from mediadrop.lib.cli_commands import LoadAppCommand, load_app
+
+_script_name = "Related Media Updater"
+_script_description = """Use this script to compute the related media lists.
+
+Specify your ini config file as the first argument to this script.
+
+MediaDrop keeps the lists up to date when media is added or changed. Run
+this script once after upgrading and whenever you want to recompute all
+lists (e.g. after importing media directly into the database)."""
+
+# BEGIN SCRIPT & SCRIPT SPECIFIC IMPORTS
+import sys
+
+from sqlalchemy import sql
+
+
+def media_ids_in_batches(batch_size, only_missing):
+    from mediadrop.model import DBSession
+    from mediadrop.model.media import media, media_related_status
+    last_id = 0
+    while True:
+        conditions = [media.c.id > last_id]
+        if only_missing:
+            computed = sql.select([media_related_status.c.media_id])
+            conditions.append(sql.not_(media.c.id.in_(computed)))
+        select = sql.select([media.c.id], sql.and_(*conditions)).\
+            order_by(media.c.id).limit(batch_size)
+        # the session is committed after every batch
+        connection = DBSession.connection()
+        media_ids = [row[0] for row in connection.execute(select)]
+        if not media_ids:
+            break
+        yield media_ids
+        last_id = media_ids[-1]
+
+def main(parser, options, args):
+    from mediadrop.lib.related_media import update_related_media
+    from mediadrop.model import DBSession, Media
+
+    total = Media.query.count()
+    done = 0
+    print 'Computing related media for %d media items' % total
+    for media_ids in media_ids_in_batches(options.batch_size, options.only_missing):
+        update_related_media(DBSession.connection(), media_ids)
+        DBSession.commit()
+        done += len(media_ids)
+        sys.stdout.write('\r%d/%d' % (done, total))
+        sys.stdout.flush()
+    sys.stdout.write('\n')
+
+if __name__ == "__main__":
+    cmd = LoadAppCommand(_script_name, _script_description)
+    cmd.parser.add_option(
+        '--batch-size',
+        action='store',
+        type='int',
+        dest='batch_size',
+        help='Number of media items per transaction (default: 100).',
+        default=100,
+    )
+    cmd.parser.add_option(
+        '--only-missing',
+        action='store_true',
+        dest='only_missing',
+        help='Only compute lists for media which do not have one yet.',
+        default=False,
+    )
+    load_app(cmd)
+    main(cmd.parser, cmd.options, cmd.args)
@@ -15,7 +15,12 @@ from pylons.configuration import PylonsConfig
 from sqlalchemy import engine_from_config
 
 from mediadrop.lib.app_globals import Globals
+from mediadrop.lib.auth.permission_system import MediaDropPermissionSystem
+import mediadrop.lib.catalog
 import mediadrop.lib.helpers
+import mediadrop.lib.related_media
+import mediadrop.lib.search
+import mediadrop.lib.view_counter
 
 from mediadrop.config.routing import create_mapper, add_routes
 from mediadrop.lib.templating import TemplateLoader
@@ -79,6 +84,9 @@ def load_environment(global_conf, app_conf):
     init_model(engine, config.get('db_table_prefix', None))
     events.Environment.init_model()
 
+    # The policies are configured once, all requests share the same system.
+    globals_.permission_system = MediaDropPermissionSystem(config)
+
     # CONFIGURATION OPTIONS HERE (note: all config options will override
     #                                   any Pylons config options)
 
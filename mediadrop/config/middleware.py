@@ -9,6 +9,7 @@
 import logging
 import os
 import threading
+import zlib
 
 from beaker.middleware import SessionMiddleware
 from genshi.template import loader
@@ -33,6 +34,8 @@ import tw.api
 from mediadrop import monkeypatch_method
 from mediadrop.config.environment import load_environment
 from mediadrop.lib.auth import add_auth
+from mediadrop.lib.feed_files import feed_files
+from mediadrop.lib.streaming import STREAMING_ENVIRON_KEY
 from mediadrop.migrations.util import MediaDropMigrator
 from mediadrop.model import metadata, DBSession
 from mediadrop.plugin import events
@@ -74,7 +77,11 @@ def setup_prefix_middleware(app, global_conf, proxy_prefix):
     return app
 
 class DBSessionRemoverMiddleware(object):
-    """Ensure the contextual session ends at the end of the request."""
+    """Ensure the contextual session ends at the end of the request.
+
+    Streamed responses still need the session after the app returned, see
+    :class:`mediadrop.lib.streaming.StreamedResponse`.
+    """
     def __init__(self, app):
         self.app = app
 
@@ -82,7 +89,8 @@ class DBSessionRemoverMiddleware(object):
         try:
             return self.app(environ, start_response)
         finally:
-            DBSession.remove()
+            if not environ.get(STREAMING_ENVIRON_KEY):
+                DBSession.remove()
 
 class FastCGIScriptStripperMiddleware(object):
     """Strip the given fcgi_script_name from the end of environ['SCRIPT_NAME'].
@@ -259,6 +267,9 @@ def setup_gzip_middleware(app, global_conf):
     extra compression and it also breaks Flowplayer 3.2.3, and
     potentially others.
 
+    Streamed responses are compressed incrementally instead of being
+    buffered, see :class:`StreamingGzipMiddleware`.
+
     """
     @monkeypatch_method(gzipper.GzipResponse)
     def gzip_start_response(self, status, headers, exc_info=None):
@@ -278,7 +289,59 @@ def setup_gzip_middleware(app, global_conf):
         self.headers = headers
         self.status = status
         return self.buffer.write
-    return gzipper.make_gzip_middleware(app, global_conf)
+    return StreamingGzipMiddleware(app)
+
+class StreamingGzipMiddleware(gzipper.middleware):
+    """paste.gzipper middleware which does not buffer streamed responses.
+
+    Regular responses are compressed as a whole (so they get a
+    Content-Length header). Responses which were marked as streamed (see
+    :mod:`mediadrop.lib.streaming`) are compressed chunk by chunk.
+    """
+    def __call__(self, environ, start_response):
+        if 'gzip' not in environ.get('HTTP_ACCEPT_ENCODING', ''):
+            return self.application(environ, start_response)
+        response = gzipper.GzipResponse(start_response, self.compress_level)
+        app_iter = self.application(environ, response.gzip_start_response)
+        if app_iter is None:
+            return response.write()
+        if not environ.get(STREAMING_ENVIRON_KEY):
+            response.finish_response(app_iter)
+            return response.write()
+        start_response(response.status, response.headers)
+        compressor = None
+        if response.compressible:
+            compressor = zlib.compressobj(self.compress_level, zlib.DEFLATED,
+                16 + zlib.MAX_WBITS)
+        return GzipStreamIterator(app_iter, compressor,
+            response.buffer.getvalue())
+
+class GzipStreamIterator(object):
+    """Compress the chunks of the app_iter while they are sent."""
+    def __init__(self, app_iter, compressor=None, prefix=''):
+        self.app_iter = app_iter
+        self.compressor = compressor
+        self.prefix = prefix
+
+    def __iter__(self):
+        if self.prefix:
+            yield self._compress(self.prefix)
+        for chunk in self.app_iter:
+            if chunk:
+                yield self._compress(chunk)
+        if self.compressor is not None:
+            yield self.compressor.flush()
+
+    def _compress(self, chunk):
+        if self.compressor is None:
+            return chunk
+        # flush every chunk so the client receives data continuously
+        return self.compressor.compress(chunk) + \
+            self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def close(self):
+        if hasattr(self.app_iter, 'close'):
+            self.app_iter.close()
 
 def make_app(global_conf, full_stack=True, static_files=True, **app_conf):
     """Create a Pylons WSGI application and return it
@@ -318,6 +381,24 @@ def make_app(global_conf, full_stack=True, static_files=True, **app_conf):
     if db_is_current:
         events.Environment.database_ready()
 
+    app = setup_app(config, global_conf, full_stack=full_stack,
+        static_files=static_files)
+    feed_files.app = app
+    app.config = config
+    return app
+
+def setup_app(config, global_conf=None, full_stack=True, static_files=True):
+    """Wrap the Pylons WSGI application of the given environment with all
+    middleware and return it.
+
+    Used by :func:`make_app` and by scripts which loaded the environment
+    themselves but need to dispatch requests internally (e.g. to pregenerate
+    feeds, see :mod:`mediadrop.lib.feed_files`).
+    """
+    if global_conf is None:
+        global_conf = {}
+    plugin_mgr = config['pylons.app_globals'].plugin_mgr
+
     # The Pylons WSGI app
     app = PylonsApp(config=config)
 
@@ -404,6 +485,4 @@ def make_app(global_conf, full_stack=True, static_files=True, **app_conf):
 
     if asbool(config.get('enable_gzip', 'true')):
         app = setup_gzip_middleware(app, global_conf)
-
-    app.config = config
     return app
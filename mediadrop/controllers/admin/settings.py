@@ -19,7 +19,8 @@ from mediadrop.lib.base import BaseSettingsController
 from mediadrop.lib.decorators import autocommit, expose, observable, validate
 from mediadrop.lib.helpers import filter_vulgarity, redirect, url_for
 from mediadrop.lib.i18n import LanguageError, Translator
-from mediadrop.model import Comment, Media
+from mediadrop.lib.popularity import recompute_popularity
+from mediadrop.model import Comment
 from mediadrop.model.meta import DBSession
 from mediadrop.plugin import events
 from mediadrop.websetup import appearance_settings, generate_appearance_css
@@ -144,16 +145,9 @@ class SettingsController(BaseSettingsController):
         values.
         """
         self._save(popularity_form, values=kwargs)
-        # ".util.calculate_popularity()" uses the popularity settings from
-        # the request.settings which are only updated when a new request
-        # comes in.
-        # update the settings manually so the popularity is actually updated
-        # correctly.
-        for key in ('popularity_decay_exponent', 'popularity_decay_lifetime'):
-            request.settings[key] = kwargs['popularity.'+key]
-        for m in Media.query:
-            m.update_popularity()
-            DBSession.add(m)
+        decay = (kwargs['popularity.popularity_decay_exponent'],
+                 kwargs['popularity.popularity_decay_lifetime'])
+        recompute_popularity(DBSession.connection(), decay=decay)
         redirect(action='popularity')
 
     @expose('admin/settings/upload.html')
@@ -8,6 +8,7 @@
 from decorator import decorator
 from paste.util.converters import asbool
 from pylons import request
+from pylons.controllers.util import abort
 from sqlalchemy import sql
 
 class APIException(Exception):
@@ -53,3 +54,13 @@ def require_api_key_if_necessary(func, *args, **kwargs):
         return dict(error='Authentication Error')
     
     return func(*args, **kwargs)
+
+@decorator
+def require_api_key(func, *args, **kwargs):
+    """Like :func:`require_api_key_if_necessary` but the key is required
+    even if the API is public (e.g. for the full catalog export)."""
+    api_key = kwargs.get('api_key')
+    secret_key = request.settings['api_secret_key']
+    if not secret_key or api_key != secret_key:
+        abort(403, 'Authentication Error')
+    return func(*args, **kwargs)
@@ -14,6 +14,7 @@ from sqlalchemy import orm
 
 from mediadrop.controllers.api import APIException, get_order_by, require_api_key_if_necessary
 from mediadrop.lib import helpers
+from mediadrop.lib.api_cache import cached_api_response
 from mediadrop.lib.base import BaseController
 from mediadrop.lib.compat import any
 from mediadrop.lib.decorators import expose
@@ -38,6 +39,7 @@ class CategoriesController(BaseController):
 
     @expose('json')
     @require_api_key_if_necessary
+    @cached_api_response
     def index(self, order=None, offset=0, limit=10, **kwargs):
         """Query for a flat list of categories.
 
@@ -97,6 +99,7 @@ class CategoriesController(BaseController):
 
     @expose('json')
     @require_api_key_if_necessary
+    @cached_api_response
     def tree(self, depth=10, **kwargs):
         """Query for an expanded tree of categories.
 
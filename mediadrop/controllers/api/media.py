@@ -10,14 +10,25 @@ from datetime import datetime, timedelta
 
 from paste.util.converters import asbool
 from pylons import app_globals, config, request, response, session, tmpl_context
+from pylons.controllers.util import abort
 from sqlalchemy import orm, sql
 
-from mediadrop.controllers.api import APIException, get_order_by, require_api_key_if_necessary
-from mediadrop.lib import helpers
+from mediadrop.controllers.api import (APIException, get_order_by,
+    require_api_key, require_api_key_if_necessary)
+from mediadrop.lib.api_cache import cached_api_response
 from mediadrop.lib.base import BaseController
+from mediadrop.lib.conditional_get import (aggregate_validators,
+    conditional_response, media_aggregate, page_validators)
 from mediadrop.lib.decorators import expose, expose_xhr, observable, paginate, validate
 from mediadrop.lib.helpers import get_featured_category, url_for, url_for_media
-from mediadrop.lib.thumbnails import thumb
+from mediadrop.lib.media_export import (export_lines, parse_modified_since,
+    EXPORT_CONTENT_TYPE)
+from mediadrop.lib.media_info import MediaInfoSerializer
+from mediadrop.lib.paginate import (decode_cursor, encode_cursor, seek_order,
+    seek_query, seek_values)
+from mediadrop.lib.random_media import random_media
+from mediadrop.lib.search.suggest import suggestions
+from mediadrop.lib.streaming import stream_response
 from mediadrop.model import Category, Media, Podcast, Tag, fetch_row, get_available_slug
 from mediadrop.model.meta import DBSession
 from mediadrop.plugin import events
@@ -38,8 +49,49 @@ order_columns = {
     'comment_count': 'comment_count_published %s'
 }
 
+MAX_SUGGESTIONS = 50
+MAX_BULK_ITEMS = 200
+
+COUNT_MODES = ('true', 'false', 'estimate')
+# 'count=estimate' stops counting after this many results
+COUNT_ESTIMATE_LIMIT = 1000
+
 AUTHERROR = "Authentication Error"
 INVALIDFORMATERROR = "Invalid format (%s). Only json and mrss are supported"
+INVALIDLIMITERROR = "Invalid limit (%s). The limit must be a number"
+TOOMANYITEMSERROR = "Too many items (%d). Request at most %d items at once"
+NOTFOUNDERROR = "No match found"
+INVALIDDATEERROR = "Invalid date. The expected format is 'YYYY-MM-DD HH:MM:SS'"
+INVALIDCOUNTERROR = "Invalid count (%s). Use true, false or estimate"
+INVALIDCURSORERROR = "Invalid cursor. Cursors are not supported for random "\
+    "order, search results and the comment_count order"
+
+def _split_list(value):
+    """Return the non-empty items of a comma separated list."""
+    items = [item.strip() for item in (value or u'').split(',')]
+    return [item for item in items if item]
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError, UnicodeError):
+        return None
+
+def _estimate_count(query, results, limit, start=None):
+    """Return the number of results (up to COUNT_ESTIMATE_LIMIT) and if
+    there might be more.
+
+    The count is known without a query if the results of an offset page
+    end before the limit.
+    """
+    if start is not None and len(results) < limit and (results or not start):
+        return start + len(results), False
+    ids = query.order_by(None).with_entities(Media.id)\
+        .limit(COUNT_ESTIMATE_LIMIT + 1).subquery()
+    count = DBSession.query(sql.func.count()).select_from(ids).scalar()
+    if count > COUNT_ESTIMATE_LIMIT:
+        return COUNT_ESTIMATE_LIMIT, True
+    return count, False
 
 class MediaController(BaseController):
     """
@@ -48,11 +100,13 @@ class MediaController(BaseController):
 
     @expose('json')
     @require_api_key_if_necessary
+    @cached_api_response
     @observable(events.API.MediaController.index)
     def index(self, type=None, podcast=None, tag=None, category=None, search=None,
               max_age=None, min_age=None, order=None, offset=0, limit=10,
               published_after=None, published_before=None, featured=False,
-              id=None, slug=None, include_embed=False, format="json", **kwargs):
+              id=None, slug=None, include_embed=False, format="json",
+              cursor=None, count='true', **kwargs):
         """Query for a list of media.
 
         :param type:
@@ -99,6 +153,8 @@ class MediaController(BaseController):
             A column name and 'asc' or 'desc', seperated by a space.
             The column name can be any one of the returned columns.
             Defaults to newest media first (publish_on desc).
+            Use 'random' to get randomly selected media (the offset is
+            ignored then).
 
         :param offset:
             Where in the complete resultset to start returning results.
@@ -107,6 +163,21 @@ class MediaController(BaseController):
             next 50 and so on.
         :type offset: int
 
+        :param cursor:
+            Continue after the last item of a previous response, pass its
+            'next_cursor' value (or an empty string to get the first page).
+            Unlike the offset, this is fast for deep pages and items do not
+            shift when media is published in the meantime. Not available
+            for random order, search results and the comment_count order.
+            The offset is ignored if a cursor is given.
+        :type cursor: str or None
+
+        :param count:
+            'true' (default) to return the total number of results, 'false'
+            to skip counting or 'estimate' to count at most 1000
+            results (the 'count_estimated' field is true if there are more).
+        :type count: str
+
         :param limit:
             Number of results to return in each query. Defaults to 10.
             The maximum allowed value defaults to 50 and is set via
@@ -143,8 +214,15 @@ class MediaController(BaseController):
         :rtype: JSON-ready dict
         :returns: The returned dict has the following fields:
 
-            count (int)
-                The total number of results that match this query.
+            count (int or None)
+                The total number of results that match this query (None
+                if the count parameter is 'false').
+            count_estimated (bool)
+                Only if the count parameter is 'estimate': true if the count
+                was capped and there are more results.
+            next_cursor (str or None)
+                Only if the cursor parameter was given: the cursor for the
+                next page, None if this is the last page.
             media (list of dicts)
                 A list of **media_info** dicts, as generated by the
                 :meth:`_info <mediadrop.controllers.api.media.MediaController._info>`
@@ -159,9 +237,7 @@ class MediaController(BaseController):
         if format not in ("json", "mrss"):
             return dict(error= INVALIDFORMATERROR % format)
 
-        query = Media.query\
-            .published()\
-            .options(orm.undefer('comment_count_published'))
+        query = Media.query.published()
 
         # Basic filters
         if id:
@@ -199,7 +275,12 @@ class MediaController(BaseController):
         if published_before:
             query = query.filter(Media.publish_on <= published_before)
 
-        query = query.order_by(get_order_by(order, order_columns))
+        random_order = (order == 'random')
+        if not random_order:
+            query = query.order_by(get_order_by(order, order_columns))
+            if (order or u'').strip().lower().startswith('comment_count '):
+                # the order refers to the label of the deferred column
+                query = query.options(orm.undefer('comment_count_published'))
 
         # Search will supercede the ordering above
         if search:
@@ -210,27 +291,74 @@ class MediaController(BaseController):
             if featured_cat:
                 query = query.in_category(featured_cat)
 
-        # Preload podcast slugs so we don't do n+1 queries
-        podcast_slugs = dict(DBSession.query(Podcast.id, Podcast.slug))
+        if count not in COUNT_MODES:
+            return dict(error=INVALIDCOUNTERROR % count)
+        if cursor is not None:
+            seek = not random_order and seek_order(query) or None
+            values = None
+            if seek and cursor:
+                values = decode_cursor(cursor, seek)
+            if seek is None or (cursor and values is None):
+                return dict(error=INVALIDCURSORERROR)
+
+        # Answer conditional requests before the media is loaded, the
+        # aggregate query for the validators also counts the results.
+        # Random results change with every request.
+        total = None
+        if random_order:
+            if count == 'true':
+                total = query.count()
+        elif count == 'true':
+            aggregate = media_aggregate(query)
+            total = aggregate[2]
+            conditional_response(*aggregate_validators(aggregate))
 
         # Rudimentary pagination support
         start = int(offset)
-        end = start + min(int(limit), int(request.settings['api_media_max_results']))
+        limit = min(int(limit), int(request.settings['api_media_max_results']))
+
+        if random_order:
+            results = random_media(query, count=limit)
+        elif cursor is not None:
+            # one more item tells if there is a next page
+            results = seek_query(query, seek, values)[:limit + 1]
+            next_cursor = None
+            if len(results) > limit:
+                results = results[:limit]
+                next_cursor = encode_cursor(seek_values(results[-1], seek))
+        else:
+            results = query[start:start + limit]
+
+        if count == 'estimate':
+            # the position of the results is only known for offset pages
+            offset_start = None
+            if cursor is None and not random_order:
+                offset_start = start
+            total, estimated = _estimate_count(query, results, limit, offset_start)
+        if count != 'true' and not random_order:
+            # without the aggregate only the returned items are validated
+            conditional_response(*page_validators(results, total))
 
         if format == "mrss":
             request.override_template = "sitemaps/mrss.xml"
             return dict(
-                media = query[start:end],
+                media = results,
                 title = "Media Feed",
             )
 
-        media = [self._info(m, podcast_slugs, include_embed) for m in query[start:end]]
+        # podcasts, categories and comment counts are loaded for all results
+        # at once so we don't do n+1 queries
+        media = MediaInfoSerializer(include_embed).serialize(results)
 
-        return dict(
+        result = dict(
             media = media,
-            count = query.count(),
+            count = total,
         )
-
+        if count == 'estimate':
+            result['count_estimated'] = estimated
+        if cursor is not None:
+            result['next_cursor'] = next_cursor
+        return result
 
     @expose('json')
     @require_api_key_if_necessary
@@ -278,6 +406,153 @@ class MediaController(BaseController):
         return self._info(media, include_embed=True)
 
 
+    @expose('json')
+    @require_api_key_if_necessary
+    @cached_api_response
+    @observable(events.API.MediaController.bulk)
+    def bulk(self, ids=None, slugs=None, include_embed=False, **kwargs):
+        """Expose info on many media items at once.
+
+        All items are loaded with one query, this is much faster than
+        calling :meth:`get` for each item.
+
+        :param ids: A comma separated list of
+            :attr:`ids <mediadrop.model.media.Media.id>`.
+        :type ids: str or None
+        :param slugs: A comma separated list of
+            :attr:`slugs <mediadrop.model.media.Media.slug>`.
+        :type slugs: str or None
+        :param include_embed:
+            If nonzero, the HTML for the embeddable player is included
+            for all results.
+        :type include_embed: bool
+        :param api_key: The api access key if required in settings
+        :type api_key: unicode or None
+        :rtype: JSON-ready dict
+        :returns: The returned dict has the following fields:
+
+            count (int)
+                The number of media items which were found.
+            media (list of dicts)
+                One entry for every requested id and slug (ids first), in
+                the requested order. Found items are **media_info** dicts,
+                as generated by the
+                :meth:`_info <mediadrop.controllers.api.media.MediaController._info>`
+                method. For other items the dict only contains the
+                requested 'id' or 'slug' and an 'error' message. At most
+                200 items can be requested at once.
+
+        """
+        keys = [('id', key) for key in _split_list(ids)] + \
+            [('slug', key) for key in _split_list(slugs)]
+        if len(keys) > MAX_BULK_ITEMS:
+            return dict(error=TOOMANYITEMSERROR % (len(keys), MAX_BULK_ITEMS))
+
+        keys = [(name, name == 'id' and _to_int(key) or key)
+                for name, key in keys]
+        media_ids = [key for name, key in keys
+                     if name == 'id' and isinstance(key, (int, long))]
+        media_slugs = [key for name, key in keys if name == 'slug']
+        conditions = []
+        if media_ids:
+            conditions.append(Media.id.in_(media_ids))
+        if media_slugs:
+            conditions.append(Media.slug.in_(media_slugs))
+        found = []
+        if conditions:
+            found = Media.query.published().filter(sql.or_(*conditions)).all()
+
+        serializer = MediaInfoSerializer(asbool(include_embed))
+        infos = dict((media.id, info) for media, info in
+                     zip(found, serializer.serialize(found)))
+        by_key = {}
+        for media in found:
+            by_key[('id', media.id)] = infos[media.id]
+            by_key[('slug', media.slug)] = infos[media.id]
+
+        results = []
+        for name, key in keys:
+            info = by_key.get((name, key))
+            if info is None:
+                info = {name: key, 'error': NOTFOUNDERROR}
+            results.append(info)
+        return dict(
+            media = results,
+            count = len(found),
+        )
+
+
+    @expose()
+    @require_api_key
+    @observable(events.API.MediaController.export)
+    def export(self, modified_since=None, **kwargs):
+        """Export all published media as newline delimited JSON.
+
+        The response is streamed, every line contains one **media_info**
+        dict as generated by the
+        :meth:`_info <mediadrop.controllers.api.media.MediaController._info>`
+        method (without the embed code). The media are ordered by their
+        modification date (and id), only a few hundred media items are
+        loaded at once. See also ``batch-scripts/export_media.py``.
+
+        :param modified_since:
+            If given, only media modified *on or after* this date is
+            returned. The expected format is 'YYYY-MM-DD HH:MM:SS'. Pass
+            the time when the previous export started for incremental
+            updates.
+        :type modified_since: str or None
+        :param api_key: The api access key, always required.
+        :type api_key: unicode
+        :raises webob.exc.HTTPForbidden: If the api key is missing or wrong.
+        :raises webob.exc.HTTPBadRequest: If the date is invalid.
+
+        """
+        if modified_since:
+            modified_since = parse_modified_since(modified_since)
+            if modified_since is None:
+                abort(400, INVALIDDATEERROR)
+        response.content_type = EXPORT_CONTENT_TYPE
+        response.charset = 'utf-8'
+        return stream_response(
+            export_lines(Media.query.published(), modified_since or None))
+
+
+    @expose('json')
+    @require_api_key_if_necessary
+    @observable(events.API.MediaController.suggest)
+    def suggest(self, q=None, limit=10, **kwargs):
+        """Complete the given search prefix with media titles and tags.
+
+        The completions are served from an in-memory index (see
+        :mod:`mediadrop.lib.search.suggest`) so this can be requested
+        on every keystroke.
+
+        :param q: The text entered so far.
+        :type q: unicode or None
+        :param limit: Maximum number of titles and of tags to return.
+            Defaults to 10, the maximum is 50.
+        :type limit: int
+        :param api_key: The api access key if required in settings
+        :type api_key: unicode or None
+        :rtype: JSON-ready dict
+        :returns: The returned dict has the following fields:
+
+            titles (list of dicts)
+                The ``id``, ``slug`` and ``title`` of published media
+                whose title contains a word starting with ``q``.
+            tags (list of dicts)
+                The ``name`` and ``slug`` of matching tags.
+
+        """
+        try:
+            limit = min(max(int(limit), 1), MAX_SUGGESTIONS)
+        except ValueError:
+            return dict(error=INVALIDLIMITERROR % limit)
+        if not q:
+            return dict(titles=[], tags=[])
+        return suggestions.suggest(q, limit)
+
+
     def _info(self, media, podcast_slugs=None, include_embed=False):
         """
         Return a **media_info** dict--a JSON-ready dict for describing a media instance.
@@ -345,46 +620,9 @@ class MediaController(BaseController):
                     medium_width = thumbs['m']['x']
                     medium_height = thumbs['m']['y']
         """
-        if media.podcast_id:
-            media_url = url_for(controller='/media', action='view', slug=media.slug,
-                                podcast_slug=media.podcast.slug, qualified=True)
-        else:
-            media_url = url_for_media(media, qualified=True)
-
-        if media.podcast_id is None:
-            podcast_slug = None
-        elif podcast_slugs:
-            podcast_slug = podcast_slugs[media.podcast_id]
-        else:
-            podcast_slug = DBSession.query(Podcast.slug)\
-                .filter_by(id=media.podcast_id).scalar()
-
-        thumbs = {}
-        for size in config['thumb_sizes'][media._thumb_dir].iterkeys():
-            thumbs[size] = thumb(media, size, qualified=True)
-
-        info = dict(
-            id = media.id,
-            slug = media.slug,
-            url = media_url,
-            title = media.title,
-            author = media.author.name,
-            type = media.type,
-            podcast = podcast_slug,
-            description = media.description,
-            description_plain = media.description_plain,
-            comment_count = media.comment_count_published,
-            publish_on = unicode(media.publish_on),
-            likes = media.likes,
-            views = media.views,
-            thumbs = thumbs,
-            categories = dict((c.slug, c.name) for c in list(media.categories)),
-        )
-
-        if include_embed:
-            info['embed'] = unicode(helpers.embed_player(media))
-
-        return info
+        # podcast_slugs is not needed anymore, the serializer loads the
+        # podcasts itself. See MediaInfoSerializer for serializing many items.
+        return MediaInfoSerializer(include_embed).serialize([media])[0]
 
 
     @expose('json')
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+
+from pylons import app_globals
+
+from mediadrop.lib.test import *
+from mediadrop.model import DBSession, Media
+
+
+__all__ = ['MediaBulkTest']
+
+class MediaBulkTest(ControllerTestCase, RequestMixin):
+    def tearDown(self):
+        self.remove_globals()
+        super(MediaBulkTest, self).tearDown()
+
+    def bulk(self, query_string):
+        app_globals.settings['api_secret_key_required'] = 'false'
+        request = self.init_fake_request(method='GET',
+            request_uri='/api/media/bulk?' + query_string)
+        # the module uses the translator on import
+        from ..media import MediaController
+        response = self.call_controller(MediaController, request)
+        assert_equals(200, response.status_int)
+        return response.json
+
+    def published_media(self, title, **kwargs):
+        media = published_media(title=title, **kwargs)
+        DBSession.commit()
+        return media
+
+    def test_returns_media_in_requested_order(self):
+        hedgehog = self.published_media(u'Hedgehog')
+        squirrel = self.published_media(u'Squirrel')
+        unpublished = Media.example(title=u'Porcupine')
+        DBSession.commit()
+
+        result = self.bulk('ids=%d,%d,%d,foo&slugs=hedgehog,badger' % (
+            squirrel.id, unpublished.id, hedgehog.id))
+        assert_equals(2, result['count'])
+        media = result['media']
+        assert_equals([squirrel.id, unpublished.id, hedgehog.id, u'foo',
+                       hedgehog.id, u'badger'],
+                      [item.get('id', item.get('slug')) for item in media])
+        assert_equals(u'Squirrel', media[0]['title'])
+        assert_not_contains('embed', media[0])
+        assert_contains('error', media[1])
+        assert_contains('error', media[3])
+        assert_equals(media[2], media[4])
+        assert_equals({u'slug': u'badger', u'error': u'No match found'}, media[5])
+
+    def test_rejects_too_many_items(self):
+        ids = ','.join(str(i) for i in range(1, 202))
+        assert_contains('error', self.bulk('ids=' + ids))
+
+
+def suite():
+    import unittest
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(MediaBulkTest))
+    return suite
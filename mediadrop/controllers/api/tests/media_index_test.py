@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+
+from datetime import datetime, timedelta
+
+from pylons import app_globals
+from sqlalchemy import event
+
+from mediadrop.lib.test import *
+from mediadrop.model import Category, Comment, DBSession, Media, Podcast
+
+
+__all__ = ['MediaIndexTest']
+
+class MediaIndexTest(ControllerTestCase, RequestMixin):
+    def setUp(self):
+        super(MediaIndexTest, self).setUp()
+        self.statements = None
+        self.requests = 0
+        event.listen(DBSession.bind, 'before_cursor_execute', self._record)
+    
+    def tearDown(self):
+        self.statements = None
+        # every fake request pushes its own request globals
+        for i in range(max(self.requests, 1)):
+            self.remove_globals()
+        super(MediaIndexTest, self).tearDown()
+    
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if self.statements is not None:
+            self.statements.append(statement)
+    
+    def index(self, query_string):
+        app_globals.settings['api_secret_key_required'] = 'false'
+        request = self.init_fake_request(method='GET',
+            request_uri='/api/media?' + query_string)
+        self.requests += 1
+        # the module uses the translator on import
+        from ..media import MediaController
+        response = self.call_controller(MediaController, request)
+        assert_equals(200, response.status_int)
+        return response.json
+    
+    def published_media(self, title, **kwargs):
+        media = published_media(title=title, **kwargs)
+        DBSession.commit()
+        return media
+    
+    def add_comment(self, media, publishable=True):
+        comment = Comment()
+        comment.subject = u'Re: %s' % media.title
+        comment.body = u'Nice'
+        comment.author_name = u'Joe'
+        comment.author_ip = 2130706433
+        comment.publishable = comment.reviewed = publishable
+        media.comments.append(comment)
+        DBSession.commit()
+    
+    def count_queries(self, query_string):
+        DBSession.expunge_all()
+        self.statements = []
+        result = self.index(query_string)
+        statements, self.statements = self.statements, None
+        return result, len(statements)
+    
+    def test_returns_media_info_with_related_data(self):
+        podcast = Podcast.query.first()
+        category = Category.example(name=u'Animals')
+        media = self.published_media(u'Hedgehog', podcast=podcast)
+        media.categories.append(category)
+        DBSession.commit()
+        self.add_comment(media)
+        self.add_comment(media, publishable=False)
+        
+        info, = self.index('id=%d' % media.id)['media']
+        assert_equals(u'Hedgehog', info['title'])
+        assert_equals(podcast.slug, info['podcast'])
+        assert_equals('http://mediadrop.example:80/podcasts/%s/hedgehog' % podcast.slug,
+                      info['url'])
+        assert_equals({u'animals': u'Animals'}, info['categories'])
+        assert_equals(1, info['comment_count'])
+        assert_equals(u'Joe', info['author'])
+        thumbs = info['thumbs']
+        assert_equals(set(self.pylons_config['thumb_sizes']['media']), set(thumbs))
+        assert_equals('http://mediadrop.example:80/images/media/%dl.jpg' % media.id,
+                      thumbs['l']['url'])
+        assert_equals(list(self.pylons_config['thumb_sizes']['media']['l']),
+                      [thumbs['l']['x'], thumbs['l']['y']])
+        
+        info, = self.index('id=%d' % self.published_media(u'Squirrel').id)['media']
+        assert_none(info['podcast'])
+        assert_equals('http://mediadrop.example:80/media/squirrel', info['url'])
+        assert_equals(0, info['comment_count'])
+    
+    def test_number_of_queries_does_not_depend_on_the_limit(self):
+        podcast = Podcast.query.first()
+        category = Category.example(name=u'Animals')
+        for i in range(12):
+            media = self.published_media(u'Hedgehog %d' % i,
+                podcast=(i % 2) and podcast or None)
+            media.categories.append(category)
+            DBSession.commit()
+            self.add_comment(media)
+        # the settings are only loaded by the first request
+        self.index('limit=1')
+        
+        result, few_queries = self.count_queries('limit=2')
+        assert_length(2, result['media'])
+        result, many_queries = self.count_queries('limit=12')
+        assert_length(12, result['media'])
+        assert_equals(few_queries, many_queries)
+        
+        result, embed_queries = self.count_queries('limit=12&include_embed=1')
+        assert_contains('<iframe', result['media'][0]['embed'])
+        assert_equals(embed_queries, self.count_queries('limit=2&include_embed=1')[1])
+    
+    def all_published_ids(self):
+        query = Media.query.published()\
+            .order_by(Media.publish_on.desc(), Media.id.desc())
+        return [media.id for media in query]
+    
+    def test_can_page_with_cursors(self):
+        now = datetime.now()
+        for i in range(5):
+            # two media share the same date so the id decides about the order
+            self.published_media(u'Hedgehog %d' % i,
+                publish_on=now - timedelta(days=min(i, 3) + 1))
+        expected_ids = self.all_published_ids()
+        
+        result = self.index('cursor=&limit=2&count=false')
+        assert_none(result['count'])
+        ids = [item['id'] for item in result['media']]
+        # media published in the meantime does not shift the next pages
+        self.published_media(u'Porcupine', publish_on=now - timedelta(hours=1))
+        while result['next_cursor']:
+            result = self.index('limit=2&cursor=' + str(result['next_cursor']))
+            assert_true(len(result['media']) <= 2)
+            ids.extend(item['id'] for item in result['media'])
+        assert_equals(expected_ids, ids)
+        assert_equals(len(expected_ids) + 1, result['count'])
+    
+    def test_can_order_by_comment_count(self):
+        quiet = self.published_media(u'Quiet')
+        busy = self.published_media(u'Busy')
+        self.add_comment(busy)
+        self.add_comment(busy)
+        self.add_comment(quiet)
+        ids = [quiet.id, busy.id]
+
+        result = self.index('order=comment_count+desc&limit=50')
+        assert_equals(ids[::-1], [item['id'] for item in result['media']
+                                  if item['id'] in ids])
+        result = self.index('order=comment_count+asc&limit=50')
+        assert_equals(ids, [item['id'] for item in result['media']
+                            if item['id'] in ids])
+
+    def test_rejects_invalid_cursors(self):
+        assert_contains('error', self.index('cursor=invalid'))
+        assert_contains('error', self.index('cursor=&order=random'))
+        assert_contains('error', self.index('cursor=&order=comment_count+desc'))
+        assert_contains('error', self.index('count=maybe'))
+    
+    def test_can_skip_or_estimate_the_count(self):
+        for i in range(3):
+            self.published_media(u'Hedgehog %d' % i)
+        total = Media.query.published().count()
+        self.index('limit=1')
+        
+        DBSession.expunge_all()
+        self.statements = []
+        result = self.index('limit=2&count=false')
+        assert_none(result['count'])
+        assert_length(2, result['media'])
+        assert_false(any('count(' in statement.lower() and 'media.id' in statement
+                         for statement in self.statements))
+        self.statements = None
+        
+        result = self.index('limit=2&count=estimate')
+        assert_equals((total, False), (result['count'], result['count_estimated']))
+        result = self.index('limit=%d&count=estimate' % (total + 5))
+        assert_equals((total, False), (result['count'], result['count_estimated']))
+        
+        from .. import media as media_module
+        original_limit = media_module.COUNT_ESTIMATE_LIMIT
+        media_module.COUNT_ESTIMATE_LIMIT = 2
+        try:
+            result = self.index('limit=1&offset=1&count=estimate')
+        finally:
+            media_module.COUNT_ESTIMATE_LIMIT = original_limit
+        assert_equals((2, True), (result['count'], result['count_estimated']))
+    
+    def test_can_return_random_media(self):
+        for i in range(4):
+            self.published_media(u'Hedgehog %d' % i)
+        total = Media.query.published().count()
+        
+        result = self.index('order=random&limit=3')
+        assert_equals(total, result['count'])
+        assert_length(3, result['media'])
+        assert_length(3, set(item['id'] for item in result['media']))
+    
+    def test_random_media_respect_filters(self):
+        media = self.published_media(u'Hedgehog')
+        other = self.published_media(u'Porcupine')
+        
+        result = self.index('order=random&limit=5&id=%d' % media.id)
+        assert_equals([media.id], [item['id'] for item in result['media']])
+
+
+def suite():
+    import unittest
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(MediaIndexTest))
+    return suite
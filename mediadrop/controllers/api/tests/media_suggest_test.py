@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+
+from datetime import datetime, timedelta
+
+from pylons import app_globals
+
+from mediadrop.lib.test import *
+from mediadrop.model import DBSession, Media
+
+
+__all__ = ['MediaSuggestTest']
+
+class MediaSuggestTest(ControllerTestCase, RequestMixin):
+    def tearDown(self):
+        self.remove_globals()
+        super(MediaSuggestTest, self).tearDown()
+    
+    def suggest(self, query_string):
+        app_globals.settings['api_secret_key_required'] = 'false'
+        request = self.init_fake_request(method='GET',
+            request_uri='/api/media/suggest?' + query_string)
+        # the module uses the translator on import
+        from ..media import MediaController
+        response = self.call_controller(MediaController, request)
+        assert_equals(200, response.status_int)
+        return response.json
+    
+    def test_returns_title_completions(self):
+        media = Media.example(title=u'Hedgehogs', reviewed=True, encoded=True,
+            publishable=True, publish_on=datetime.now() - timedelta(days=1))
+        DBSession.commit()
+        
+        result = self.suggest('q=hed')
+        assert_equals([dict(id=media.id, slug=u'hedgehogs', title=u'Hedgehogs')],
+            result['titles'])
+        assert_equals([], result['tags'])
+    
+    def test_returns_nothing_without_query(self):
+        assert_equals(dict(titles=[], tags=[]), self.suggest('q='))
+    
+    def test_rejects_invalid_limit(self):
+        assert_contains('error', self.suggest('q=hed&limit=many'))
+
+
+def suite():
+    import unittest
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(MediaSuggestTest))
+    return suite
@@ -10,8 +10,10 @@ from pylons.controllers.util import abort
 from sqlalchemy import orm
 
 from mediadrop.lib.base import BaseController
+from mediadrop.lib.conditional_get import conditional_get
 from mediadrop.lib.decorators import (beaker_cache, expose, observable, 
     paginate, validate)
+from mediadrop.lib.feed_files import serve_feed_file
 from mediadrop.lib.helpers import content_type_for_response, url_for, viewable_media
 from mediadrop.lib.i18n import _
 from mediadrop.model import Category, Media, fetch_row
@@ -21,6 +23,10 @@ from mediadrop.validation import LimitFeedItemsValidator
 import logging
 log = logging.getLogger(__name__)
 
+def _feed_media(self, **kwargs):
+    query = Media.query.published().in_category(c.category)
+    return (query, request.settings['rss_display'], c.category.name)
+
 class CategoriesController(BaseController):
     """
     Categories Controller
@@ -79,7 +85,7 @@ class CategoriesController(BaseController):
         )
 
     @expose('categories/more.html')
-    @paginate('media', items_per_page=20)
+    @paginate('media', items_per_page=20, seek=True)
     @observable(events.CategoriesController.more)
     def more(self, slug, order, page=1, **kwargs):
         media = Media.query.published()\
@@ -96,6 +102,8 @@ class CategoriesController(BaseController):
         )
 
     @validate(validators={'limit': LimitFeedItemsValidator()})
+    @serve_feed_file(['application/rss+xml', 'application/xml', 'text/xml'])
+    @conditional_get(_feed_media)
     @beaker_cache(expire=60 * 3, query_args=True)
     @expose('sitemaps/mrss.xml')
     @observable(events.CategoriesController.feed)
@@ -16,8 +16,7 @@ from paste.fileapp import FileApp
 from paste.util import mimeparse
 from pylons import config, request, response
 from pylons.controllers.util import abort, forward
-from sqlalchemy import orm, sql
-from sqlalchemy.exc import OperationalError
+from sqlalchemy import orm
 from webob.exc import HTTPNotAcceptable, HTTPNotFound
 
 from mediadrop import USER_AGENT
@@ -26,9 +25,12 @@ from mediadrop.lib import helpers
 from mediadrop.lib.base import BaseController
 from mediadrop.lib.decorators import expose, expose_xhr, observable, paginate, validate_xhr, autocommit
 from mediadrop.lib.email import send_comment_notification
+from mediadrop.lib.embed_cache import cached_player
 from mediadrop.lib.helpers import (filter_vulgarity, redirect, url_for, 
     viewable_media)
 from mediadrop.lib.i18n import _
+from mediadrop.lib.random_media import random_media
+from mediadrop.lib.search.result_cache import cached_search_results
 from mediadrop.lib.services import Facebook
 from mediadrop.lib.templating import render
 from mediadrop.model import (DBSession, fetch_row, Media, MediaFile, Comment, 
@@ -45,7 +47,7 @@ class MediaController(BaseController):
     """
 
     @expose('media/index.html')
-    @paginate('media', items_per_page=10)
+    @paginate('media', items_per_page=10, seek=True)
     @observable(events.MediaController.index)
     def index(self, page=1, show='latest', q=None, tag=None, **kwargs):
         """List media with pagination.
@@ -93,7 +95,14 @@ class MediaController(BaseController):
                     (url_for(controller='/sitemaps', action='featured'), _(u'Featured RSS')),
                 ])
 
-        media = viewable_media(media)
+        if q:
+            # flipping through the pages of a search should not run the
+            # search again for every page
+            query = media
+            media = cached_search_results(lambda: viewable_media(query), q,
+                show=show, tag=tag and tag.slug, perm=request.perm)
+        else:
+            media = viewable_media(media)
         return dict(
             media = media,
             result_count = media.count(),
@@ -166,13 +175,10 @@ class MediaController(BaseController):
     @expose()
     def random(self, **kwargs):
         """Redirect to a randomly selected media item."""
-        # TODO: Implement something more efficient than ORDER BY RAND().
-        #       This method does a full table scan every time.
-        random_query = Media.query.published().order_by(sql.func.random())
-        media = viewable_media(random_query).first()
-
-        if media is None:
+        media = random_media(Media.query, restrict=viewable_media)
+        if not media:
             redirect(action='explore')
+        media = media[0]
         if media.podcast_id:
             podcast_slug = DBSession.query(Podcast.slug).get(media.podcast_id)
         else:
@@ -218,11 +224,7 @@ class MediaController(BaseController):
             if url_for() != url_for(podcast_slug=media.podcast.slug):
                 redirect(podcast_slug=media.podcast.slug)
 
-        try:
-            media.increment_views()
-            DBSession.commit()
-        except OperationalError:
-            DBSession.rollback()
+        media.increment_views()
 
         if request.settings['comments_engine'] == 'facebook':
             response.facebook = Facebook(request.settings['facebook_appid'])
@@ -243,10 +245,13 @@ class MediaController(BaseController):
     def embed_player(self, slug, w=None, h=None, **kwargs):
         media = fetch_row(Media, slug=slug)
         request.perm.assert_permission(u'view', media.resource)
+        width = w and int(w) or None
+        height = h and int(h) or None
         return dict(
             media = media,
-            width = w and int(w) or None,
-            height = h and int(h) or None,
+            width = width,
+            height = height,
+            player = cached_player(media, width, height),
         )
 
     @expose(request_method="POST")
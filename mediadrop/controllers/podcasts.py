@@ -11,8 +11,10 @@ from sqlalchemy import orm
 from mediadrop.lib.auth.util import viewable_media
 from mediadrop.lib import helpers
 from mediadrop.lib.base import BaseController
+from mediadrop.lib.conditional_get import conditional_get
 from mediadrop.lib.decorators import (beaker_cache, expose, observable, 
     paginate, validate)
+from mediadrop.lib.feed_files import serve_feed_file
 from mediadrop.lib.helpers import content_type_for_response, url_for, redirect
 from mediadrop.model import Media, Podcast, fetch_row
 from mediadrop.plugin import events
@@ -21,6 +23,10 @@ from mediadrop.validation import LimitFeedItemsValidator
 import logging
 log = logging.getLogger(__name__)
 
+def _feed_episodes(self, slug, **kwargs):
+    podcast = fetch_row(Podcast, slug=slug)
+    return (podcast.media.published(), podcast.modified_on)
+
 class PodcastsController(BaseController):
     """
     Podcast Series Controller
@@ -59,7 +65,7 @@ class PodcastsController(BaseController):
 
 
     @expose('podcasts/view.html')
-    @paginate('episodes', items_per_page=10)
+    @paginate('episodes', items_per_page=10, seek=True)
     @observable(events.PodcastsController.view)
     def view(self, slug, page=1, show='latest', **kwargs):
         """View a podcast and the media that belongs to it.
@@ -98,6 +104,8 @@ class PodcastsController(BaseController):
         )
 
     @validate(validators={'limit': LimitFeedItemsValidator()})
+    @serve_feed_file(['application/rss+xml', 'application/xml', 'text/xml'])
+    @conditional_get(_feed_episodes)
     @beaker_cache(expire=60 * 20)
     @expose('podcasts/feed.xml')
     @observable(events.PodcastsController.feed)
@@ -9,7 +9,6 @@
 Sitemaps Controller
 """
 import logging
-import math
 import os
 
 from formencode import validators
@@ -20,9 +19,12 @@ from webob.exc import HTTPNotFound
 
 from mediadrop.plugin import events
 from mediadrop.lib.base import BaseController
+from mediadrop.lib.conditional_get import conditional_get
 from mediadrop.lib.decorators import expose, beaker_cache, observable, validate
+from mediadrop.lib.feed_files import feed_files, serve_feed_file
 from mediadrop.lib.helpers import (content_type_for_response, 
     get_featured_category, url_for, viewable_media)
+from mediadrop.lib.streaming import cursor_first_id, iter_media, page_cursors
 from mediadrop.model import Media
 from mediadrop.validation import LimitFeedItemsValidator
 
@@ -33,6 +35,19 @@ log = logging.getLogger(__name__)
 crossdomain_app = None
 
 
+def _sitemap_media(self, **kwargs):
+    return (Media.query.published(), request.settings['sitemaps_display'])
+
+def _latest_media(self, **kwargs):
+    return (Media.query.published(), request.settings['rss_display'])
+
+def _featured_media(self, **kwargs):
+    featured_category = get_featured_category()
+    query = Media.query.in_category(featured_category).published()
+    return (query, request.settings['rss_display'],
+            featured_category and featured_category.id)
+
+
 class SitemapsController(BaseController):
     """
     Sitemap generation
@@ -40,12 +55,14 @@ class SitemapsController(BaseController):
 
     @validate(validators={
         'page': validators.Int(if_empty=None, if_missing=None, if_invalid=None), 
-        'limit': validators.Int(if_empty=10000, if_missing=10000, if_invalid=10000)
+        'limit': validators.Int(if_empty=10000, if_missing=10000, if_invalid=10000),
+        'cursor': validators.String(if_empty=None, if_missing=None),
     })
-    @beaker_cache(expire=60 * 60 * 4)
-    @expose('sitemaps/google.xml')
+    @serve_feed_file(['application/xml', 'text/xml'])
+    @conditional_get(_sitemap_media)
+    @expose('sitemaps/google.xml', stream=True)
     @observable(events.SitemapsController.google)
-    def google(self, page=None, limit=10000, **kwargs):
+    def google(self, page=None, limit=10000, cursor=None, **kwargs):
         """Generate a sitemap which contains googles Video Sitemap information.
 
         This action may return a <sitemapindex> or a <urlset>, depending
@@ -56,6 +73,15 @@ class SitemapsController(BaseController):
         :type page: int
         :param page: max records to display on page, defaults to 10000.
         :type page: int
+        :param cursor: The (opaque) position of the page as linked from the
+            sitemap index. Pages without a cursor are located with an
+            OFFSET. The index links the pages without a cursor if the
+            feeds are pregenerated because only requests without query
+            parameters are served from the files.
+        :type cursor: str
+
+        The document is streamed, only a few hundred media items are loaded
+        at once.
 
         """
         if request.settings['sitemaps_display'] != 'True':
@@ -64,14 +90,32 @@ class SitemapsController(BaseController):
         response.content_type = \
             content_type_for_response(['application/xml', 'text/xml'])
 
-        media = viewable_media(Media.query.published())
-
+        query = Media.query.published()
         if page is None:
-            if media.count() > limit:
-                return dict(pages=math.ceil(media.count() / float(limit)))
+            # the validator does not see the page in '/sitemap{page}.xml'
+            page = request.environ['pylons.routes_dict'].get('page')
+        first_id = cursor and cursor_first_id(cursor)
+
+        if page is None and not first_id:
+            count = query.count()
+            if count > limit:
+                if feed_files.is_enabled():
+                    pages = [None] * ((count + limit - 1) // limit)
+                else:
+                    pages = page_cursors(query, limit)
+                return dict(pages=pages)
+            limit = None
         else:
-            page = int(page)
-            media = media.offset(page * limit).limit(limit)
+            page = int(page or 0)
+            if not first_id:
+                # Pages are cut by id so every page can be streamed with the
+                # same keyset batches.
+                first_id = query.with_entities(Media.id).order_by(Media.id)\
+                    .offset(page * limit).limit(1).scalar()
+            if first_id is None:
+                limit = 0
+        media = iter_media(query, restrict=viewable_media,
+                           first_id=first_id, limit=limit)
 
         if page:
             links = []
@@ -89,11 +133,16 @@ class SitemapsController(BaseController):
             links = links,
         )
 
-    @beaker_cache(expire=60 * 60, query_args=True)
-    @expose('sitemaps/mrss.xml')
+    @serve_feed_file(['application/rss+xml', 'application/xml', 'text/xml'])
+    @conditional_get(_sitemap_media)
+    @expose('sitemaps/mrss.xml', stream=True)
     @observable(events.SitemapsController.mrss)
     def mrss(self, **kwargs):
-        """Generate a media rss (mRSS) feed of all the sites media."""
+        """Generate a media rss (mRSS) feed of all the sites media.
+
+        The feed is streamed, only a few hundred media items are loaded at
+        once.
+        """
         if request.settings['sitemaps_display'] != 'True':
             abort(404)
 
@@ -101,7 +150,7 @@ class SitemapsController(BaseController):
         response.content_type = content_type_for_response(
             ['application/rss+xml', 'application/xml', 'text/xml'])
 
-        media = viewable_media(Media.query.published())
+        media = iter_media(Media.query.published(), restrict=viewable_media)
 
         return dict(
             media = media,
@@ -112,6 +161,8 @@ class SitemapsController(BaseController):
         'limit': LimitFeedItemsValidator(),
         'skip': validators.Int(if_empty=0, if_missing=0, if_invalid=0)
     })
+    @serve_feed_file(['application/rss+xml', 'application/xml', 'text/xml'])
+    @conditional_get(_latest_media)
     @beaker_cache(expire=60 * 3)
     @expose('sitemaps/mrss.xml')
     @observable(events.SitemapsController.latest)
@@ -140,6 +191,8 @@ class SitemapsController(BaseController):
         'limit': LimitFeedItemsValidator(),
         'skip': validators.Int(if_empty=0, if_missing=0, if_invalid=0)
     })
+    @serve_feed_file(['application/rss+xml', 'application/xml', 'text/xml'])
+    @conditional_get(_featured_media)
     @beaker_cache(expire=60 * 3)
     @expose('sitemaps/mrss.xml')
     @observable(events.SitemapsController.featured)
@@ -0,0 +1,127 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+"""
+Response cache for the JSON API
+
+API clients tend to repeat the same requests (e.g. the latest media of a
+podcast for a widget on another site). The results of API actions are
+cached for the normalized set of parameters and the catalog version (see
+:mod:`mediadrop.model.catalog`), so publishing, editing or deleting media,
+categories or tags makes all cached responses outdated immediately.
+
+The cache is a regular namespace of the Beaker ``CacheManager`` in
+``app_globals`` (memory by default, the ``beaker.cache.*`` options or
+``api_cache_type`` select file or shared backends).
+"""
+
+from hashlib import sha1
+
+from decorator import decorator
+from paste.deploy.converters import asbool
+from pylons import app_globals, config, request
+from pylons.decorators.cache import _make_dict_from_args
+
+from mediadrop.lib.conditional_get import (conditional_response,
+    response_validators)
+from mediadrop.model.catalog import current_catalog_state
+from mediadrop.model.meta import DBSession
+
+__all__ = ['api_cache_key', 'cached_api_response', 'normalize_api_params',
+    'API_CACHE_EXPIRE']
+
+# default lifetime of cached responses in seconds, media which is published
+# by reaching its 'publish_on' date does not change the catalog version
+API_CACHE_EXPIRE = 300
+
+IGNORED_PARAMS = ('self', 'api_key', 'pylons', 'environ', 'start_response')
+
+
+def normalize_api_params(params):
+    """Return a dict of unicode values for the given action parameters.
+
+    Empty parameters, the api key and variables passed by Pylons are
+    dropped, the order is lowercased so equivalent requests share one cache
+    entry.
+    """
+    normalized = {}
+    for name, value in params.items():
+        if name in IGNORED_PARAMS or value is None or value == '':
+            continue
+        if isinstance(value, str):
+            value = value.decode('utf-8', 'replace')
+        value = u' '.join(unicode(value).split())
+        if name == 'order':
+            value = value.lower()
+        normalized[name] = value
+    return normalized
+
+def api_cache_key(action, params, scope=u'', version=None):
+    """Return the cache key for an API response.
+
+    :param action: The name of the controller action.
+    :param params: The normalized parameters (see
+        :func:`normalize_api_params`).
+    :param scope: Access scope of the request (e.g. if a valid api key was
+        given).
+    :param version: The current catalog state.
+    """
+    parts = [action, scope, repr(version)] + \
+        [u'%s=%s' % item for item in sorted(params.items())]
+    return sha1(u'|'.join(parts).encode('utf-8')).hexdigest()
+
+def _is_cacheable(params):
+    # random results must differ and mrss results are rendered from
+    # Media instances which can not be cached
+    return params.get('order') != u'random' and \
+        params.get('format', u'json') == u'json'
+
+def _api_scope(kwargs):
+    api_key = kwargs.get('api_key')
+    if api_key and api_key == request.settings['api_secret_key']:
+        return u'key'
+    return u'public'
+
+def _api_cache():
+    options = dict(expire=int(config.get('api_cache_expire', API_CACHE_EXPIRE)))
+    if config.get('api_cache_type'):
+        options['type'] = config['api_cache_type']
+    return app_globals.cache.get_cache('api_responses', **options)
+
+@decorator
+def cached_api_response(func, *args, **kwargs):
+    """Cache the (JSON-ready) result of an API action.
+
+    Apply it below :func:`mediadrop.controllers.api.require_api_key_if_necessary`
+    so only authorized requests are answered from the cache. Responses
+    which were validated with
+    :func:`mediadrop.lib.conditional_get.conditional_response` keep their
+    ETag and Last-Modified date when they are served from the cache.
+
+    If cache_enabled is set to False in the .ini file, responses are not
+    cached.
+    """
+    params = kwargs.copy()
+    params.update(_make_dict_from_args(func, args))
+    params = normalize_api_params(params)
+    if not asbool(config.get('cache_enabled', 'True')) or \
+            not _is_cacheable(params):
+        return func(*args, **kwargs)
+
+    action = u'%s.%s' % (args[0].__class__.__name__, func.__name__)
+    version = current_catalog_state(DBSession.connection())
+    key = api_cache_key(action, params, _api_scope(kwargs), version)
+
+    created = []
+    def create_entry():
+        created.append(True)
+        result = func(*args, **kwargs)
+        return {'result': result, 'validators': response_validators()}
+    entry = _api_cache().get(key=key, createfunc=create_entry)
+    if not created and entry['validators'] is not None:
+        # the client might have the cached response already
+        conditional_response(*entry['validators'])
+    return entry['result']
@@ -5,6 +5,7 @@ from mediadrop.lib.auth.permission_system import *
 from mediadrop.lib.auth.pylons_glue import *
 from mediadrop.lib.auth.util import *
 
-# trigger self-registration of GroupBasedPermissionsPolicy
+# trigger self-registration of the built-in policies
 import mediadrop.lib.auth.group_based_policy
+import mediadrop.lib.auth.category_access_policy
 
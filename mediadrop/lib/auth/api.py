@@ -28,6 +28,15 @@ class IPermissionPolicy(object):
     
     def access_condition_for_query(self, query, permission, perm):
         return None
+    
+    def restrict_query(self, query, permission, perm):
+        """Return the query without the items this policy always denies.
+        
+        Called before :meth:`access_condition_for_query` for policies which
+        can restrict the query. Policies which only deny access (and leave
+        all other items to the following policies) filter the query here
+        and return None as access condition."""
+        return query
 
 
 class InsufficientPermissionsError(Exception):
@@ -0,0 +1,143 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+"""
+Restrict the media of some categories to certain groups
+
+A category is restricted as soon as access was granted to at least one
+group (see :func:`grant_category_access`). Media in a restricted category
+can only be viewed by members of the granted groups, all other media are
+left to the following policies. The policy only denies access so it must be
+listed before the GroupBasedPermissionsPolicy::
+
+    permission_policies = CategoryAccessPolicy, GroupBasedPermissionsPolicy
+
+Users with the 'admin' permission can view all categories. Grants apply to
+the category itself, not to its subcategories. Changing grants increments
+the permissions version so the grants cached by all processes are reloaded
+(see :mod:`mediadrop.lib.auth.permission_matrix`) and the catalog version
+so cached listings are outdated as well (see :mod:`mediadrop.model.catalog`).
+"""
+
+import threading
+
+from sqlalchemy import and_, not_, sql
+
+from mediadrop.lib.auth.api import IPermissionPolicy
+from mediadrop.lib.auth.permission_matrix import permission_matrix
+from mediadrop.lib.auth.permission_system import PermissionPolicies
+from mediadrop.model.catalog import increment_catalog_version
+from mediadrop.model.meta import DBSession
+from mediadrop.plugin import events
+from mediadrop.plugin.events import observes
+
+
+__all__ = ['CategoryAccessPolicy', 'grant_category_access',
+    'revoke_category_access']
+
+class CategoryGrants(object):
+    """Map restricted category ids to the ids of the granted groups."""
+
+    def __init__(self):
+        self._grants = {}
+        self._version = None
+        self._lock = threading.RLock()
+
+    def current(self):
+        version = permission_matrix.version()
+        if version != self._version:
+            # mediadrop.model imports mediadrop.lib.auth
+            from mediadrop.model.categories import category_access
+            select = sql.select([category_access.c.category_id,
+                                 category_access.c.group_id])
+            grants = {}
+            for category_id, group_id in DBSession.execute(select):
+                grants.setdefault(category_id, set()).add(group_id)
+            with self._lock:
+                self._grants = dict((category_id, frozenset(group_ids))
+                    for category_id, group_ids in grants.items())
+                self._version = version
+        return self._grants
+
+    def denied_categories(self, group_ids):
+        """Return the ids of the restricted categories which none of the
+        given groups may view."""
+        return frozenset(category_id
+            for category_id, granted in self.current().items()
+            if granted.isdisjoint(group_ids))
+
+    def invalidate(self):
+        with self._lock:
+            self._version = None
+
+category_grants = CategoryGrants()
+
+
+@observes(events.Environment.init_model)
+def _forget_grants():
+    category_grants.invalidate()
+
+
+def grant_category_access(category, group):
+    """Allow the group to view the media of the (restricted) category."""
+    from mediadrop.model.categories import category_access
+    DBSession.execute(category_access.insert().values(
+        category_id=category.id, group_id=group.group_id))
+    _grants_changed()
+
+def revoke_category_access(category, group):
+    """Remove the grant for the group, the category is not restricted
+    anymore if no grants are left."""
+    from mediadrop.model.categories import category_access
+    DBSession.execute(category_access.delete().where(and_(
+        category_access.c.category_id == category.id,
+        category_access.c.group_id == group.group_id)))
+    _grants_changed()
+
+def _grants_changed():
+    permission_matrix.record(DBSession())
+    # search results and validators of listings depend on the grants
+    increment_catalog_version(DBSession.connection())
+
+
+class CategoryAccessPolicy(IPermissionPolicy):
+    permissions = (u'view', )
+
+    def _denied_categories(self, perm):
+        if 'denied_categories' not in perm.data:
+            group_ids = frozenset(group.group_id for group in perm.groups or ())
+            if u'admin' in permission_matrix.permissions_for_groups(group_ids):
+                denied = frozenset()
+            else:
+                denied = category_grants.denied_categories(group_ids)
+            perm.data['denied_categories'] = denied
+        return perm.data['denied_categories']
+
+    def permits(self, permission, perm, resource):
+        media = resource and resource.data.get('media')
+        if media is None:
+            return None
+        denied = self._denied_categories(perm)
+        if denied and any(c.id in denied for c in media.categories):
+            return False
+        # there may be other policies still which can permit the access...
+        return None
+
+    def can_apply_access_restrictions_to_query(self, query, permission):
+        return True
+
+    def restrict_query(self, query, permission, perm):
+        denied = self._denied_categories(perm)
+        if not denied:
+            return query
+        from mediadrop.model.media import Media, media_categories
+        in_denied_category = sql.exists([media_categories.c.media_id],
+            and_(media_categories.c.media_id == Media.id,
+                 media_categories.c.category_id.in_(sorted(denied))))
+        # only removes items, the following policies decide about the rest
+        return query.filter(not_(in_denied_category))
+
+PermissionPolicies.register(CategoryAccessPolicy)
@@ -6,8 +6,8 @@
 # See LICENSE.txt in the main project directory, for more information.
 
 from mediadrop.lib.auth.api import IPermissionPolicy
+from mediadrop.lib.auth.permission_matrix import permission_matrix
 from mediadrop.lib.auth.permission_system import PermissionPolicies
-from mediadrop.model import DBSession, Permission
 
 
 __all__ = ['GroupBasedPermissionsPolicy']
@@ -15,17 +15,15 @@ __all__ = ['GroupBasedPermissionsPolicy']
 class GroupBasedPermissionsPolicy(IPermissionPolicy):
     @property
     def permissions(self):
-        db_permissions = DBSession.query(Permission).all()
-        return tuple([permission.permission_name for permission in db_permissions])
+        return permission_matrix.permission_names()
     
     def _permissions(self, perm):
         if 'permissions' not in perm.data:
             if perm.groups is None:
                 return ()
-            permissions = []
-            for group in perm.groups:
-                permissions.extend([p.permission_name for p in group.permissions])
-            perm.data['permissions'] = permissions
+            group_ids = set(group.group_id for group in perm.groups)
+            perm.data['permissions'] = \
+                permission_matrix.permissions_for_groups(group_ids)
         return perm.data['permissions']
     
     def permits(self, permission, perm, resource):
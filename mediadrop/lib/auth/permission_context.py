@@ -0,0 +1,148 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+"""
+Cache of the user and groups of logged in users across requests
+
+Every request needs the user and all groups of the user (including the
+'anonymous' and 'authenticated' meta groups). Detached copies of these
+instances are cached for every user id (and for anonymous users) and merged
+into the session of each request without any query.
+
+Entries expire after ``permission_context_expire`` seconds and when the
+permissions version changes (see :mod:`mediadrop.lib.auth.permission_matrix`),
+which happens whenever groups, their permissions or the groups of a user
+change. Only the ``permission_context_max_entries`` most recently used
+entries are kept.
+"""
+
+from collections import OrderedDict
+import threading
+import time
+
+from pylons import config
+from sqlalchemy.orm import attributes, object_session
+
+from mediadrop.lib.auth.permission_matrix import permission_matrix
+from mediadrop.model import DBSession, Group, User
+from mediadrop.model.meta import attributes_changed, maker
+from mediadrop.plugin import events
+from mediadrop.plugin.events import observes
+
+__all__ = ['permission_contexts', 'PermissionContextCache',
+    'PERMISSION_CONTEXT_EXPIRE', 'PERMISSION_CONTEXT_MAX_ENTRIES']
+
+# seconds until the user and groups are loaded from the database again
+PERMISSION_CONTEXT_EXPIRE = 60
+# number of users whose context is cached
+PERMISSION_CONTEXT_MAX_ENTRIES = 10000
+
+# key of the cache entry for anonymous users
+ANONYMOUS = None
+
+
+class PermissionContextCache(object):
+    """Detached (user, groups) tuples for user ids."""
+
+    def __init__(self):
+        # least recently used entries first
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+    def _expire(self):
+        return float(config.get('permission_context_expire',
+                                PERMISSION_CONTEXT_EXPIRE))
+
+    def _max_entries(self):
+        return int(config.get('permission_context_max_entries',
+                              PERMISSION_CONTEXT_MAX_ENTRIES))
+
+    def user_and_groups(self, user_id):
+        """Return the user and all groups of the user for the current
+        request, the instances belong to the current session.
+
+        :param user_id: The id of a user or None for anonymous users.
+        :returns: A (user, groups) tuple. The user is None for anonymous
+            users or if there is no such user.
+        """
+        version = permission_matrix.version()
+        with self._lock:
+            entry = self._entries.pop(user_id, None)
+            if entry is not None:
+                if entry[0] + self._expire() <= time.time() or \
+                        entry[1] != version:
+                    entry = None
+                else:
+                    self._entries[user_id] = entry
+        if entry is None:
+            entry = self._load(user_id, version)
+        user, groups = entry[2]
+        if user is not None:
+            user = _attach(user)
+        return user, [_attach(group) for group in groups]
+
+    def _load(self, user_id, version):
+        # The cached instances must not belong to the session of the request
+        # so they are loaded by a separate session (on the same connection).
+        session = maker(bind=DBSession.connection())
+        try:
+            user = None
+            if user_id is not None:
+                user = session.query(User).filter(User.id == user_id).first()
+            if user is None:
+                groups = session.query(Group)\
+                    .filter(Group.group_name == u'anonymous').all()
+            else:
+                meta_groups = session.query(Group).filter(
+                    Group.group_name.in_([u'anonymous', u'authenticated']))
+                groups = list(user.groups) + list(meta_groups)
+        finally:
+            # the instances keep their loaded attributes
+            session.close()
+        entry = (time.time(), version, (user, groups))
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._entries[user_id] = entry
+            while len(self._entries) > self._max_entries():
+                self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, user_id=ANONYMOUS, all=False):
+        with self._lock:
+            if all:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+permission_contexts = PermissionContextCache()
+
+
+def _attach(instance):
+    # merge() copies a loaded instance into the session without a query,
+    # instances which are in the session already are used as they are.
+    key = attributes.instance_state(instance).key
+    existing = DBSession.identity_map.get(key)
+    if existing is not None:
+        return existing
+    return DBSession.merge(instance, load=False)
+
+
+@observes(events.Environment.init_model)
+def _forget_contexts():
+    permission_contexts.invalidate(all=True)
+
+@observes(events.User.after_update)
+def _user_changed(instance):
+    if attributes_changed(instance, ['groups']):
+        _user_deleted(instance)
+    else:
+        # the user's name etc. are cached as well
+        permission_contexts.invalidate(instance.id)
+
+@observes(events.User.before_delete)
+def _user_deleted(instance):
+    permission_contexts.invalidate(instance.id)
+    permission_matrix.record(object_session(instance))
@@ -0,0 +1,142 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+"""
+Process-wide cache of the permissions of all groups
+
+Permissions are checked several times per request so the names of all
+permissions and the ids of the groups which have them are loaded once and
+kept in memory. Changes made by this process (Group/Permission mapper
+events) invalidate the matrix right away. They also increment the
+permissions version (see :func:`mediadrop.model.auth.increment_permissions_version`)
+which is compared at most every ``permissions_check_interval`` seconds
+so changes made by other processes are noticed as well.
+"""
+
+import threading
+import time
+
+from pylons import config
+from sqlalchemy import sql
+from sqlalchemy.orm import object_session
+
+from mediadrop.model.auth import (current_permissions_version,
+    groups_permissions, increment_permissions_version, permissions)
+from mediadrop.model.meta import apply_on_commit, DBSession, SessionChanges
+from mediadrop.plugin import events
+from mediadrop.plugin.events import observes
+
+__all__ = ['permission_matrix', 'PermissionMatrix',
+    'PERMISSIONS_CHECK_INTERVAL']
+
+# seconds until the permissions version in the database is checked again
+PERMISSIONS_CHECK_INTERVAL = 5
+
+
+class PermissionMatrix(SessionChanges):
+    """Map permission names to the ids of the groups which have them."""
+
+    def __init__(self):
+        super(PermissionMatrix, self).__init__()
+        self._groups = None
+        self._version = None
+        self._checked_on = None
+        self._lock = threading.RLock()
+
+    def _check_interval(self):
+        return float(config.get('permissions_check_interval',
+                                PERMISSIONS_CHECK_INTERVAL))
+
+    def load(self, connection):
+        """Load the permissions of all groups from the database."""
+        version = current_permissions_version(connection)
+        select = sql.select([permissions.c.permission_name,
+                groups_permissions.c.group_id],
+            from_obj=[permissions.outerjoin(groups_permissions)])
+        group_ids = {}
+        for name, group_id in connection.execute(select):
+            ids = group_ids.setdefault(name, set())
+            if group_id is not None:
+                ids.add(group_id)
+        matrix = dict((name, frozenset(ids)) for name, ids in group_ids.items())
+        with self._lock:
+            self._groups = matrix
+            self._version = version
+            self._checked_on = time.time()
+        return matrix
+
+    def current(self):
+        """Return a dict which maps all permission names to a frozenset of
+        group ids."""
+        matrix = self._groups
+        if matrix is None:
+            return self.load(DBSession.connection())
+        if self._checked_on + self._check_interval() <= time.time():
+            connection = DBSession.connection()
+            if current_permissions_version(connection) != self._version:
+                return self.load(connection)
+            self._checked_on = time.time()
+        return matrix
+
+    def version(self):
+        """Return the permissions version of the current matrix."""
+        self.current()
+        return self._version
+
+    def invalidate(self):
+        """Reload the matrix when it is used the next time."""
+        with self._lock:
+            self._groups = None
+
+    def permission_names(self):
+        return tuple(self.current())
+
+    def group_ids(self, permission_name):
+        """Return the ids of all groups which have the given permission."""
+        return self.current().get(permission_name, frozenset())
+
+    def permissions_for_groups(self, group_ids):
+        """Return the names of all permissions of the given groups.
+
+        :param group_ids: A set of group ids.
+        :rtype: frozenset
+        """
+        group_ids = frozenset(group_ids)
+        return frozenset(name for name, ids in self.current().items()
+                         if not ids.isdisjoint(group_ids))
+
+    # --- updates from the mapper events --------------------------------------
+    def record(self, session):
+        """Remember that the session changed groups or permissions (the
+        matrix is invalidated again when the session commits)."""
+        self.invalidate()
+        if session is not None:
+            self._changes[session] = True
+            increment_permissions_version(session.connection())
+
+    def apply_changes(self, session, changes):
+        # other threads may have loaded the matrix before the commit
+        self.invalidate()
+
+    def discard(self, session):
+        # the matrix may contain the changes which were rolled back
+        self.apply(session)
+
+permission_matrix = PermissionMatrix()
+
+
+@observes(events.Environment.init_model)
+def _forget_matrix():
+    permission_matrix.invalidate()
+
+@observes(events.Group.after_insert, events.Group.after_update,
+    events.Group.before_delete, events.Permission.after_insert,
+    events.Permission.after_update, events.Permission.before_delete)
+def _permissions_changed(instance):
+    permission_matrix.record(object_session(instance))
+
+
+apply_on_commit(permission_matrix)
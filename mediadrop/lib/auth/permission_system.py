@@ -11,6 +11,8 @@ from pylons.controllers.util import abort
 from sqlalchemy import or_
 
 from mediadrop.lib.auth.api import PermissionSystem, UserPermissions
+from mediadrop.lib.auth.permission_context import permission_contexts
+from mediadrop.lib.auth.permission_matrix import permission_matrix
 from mediadrop.lib.auth.query_result_proxy import QueryResultProxy, StaticQuery
 from mediadrop.model import DBSession, Group, User
 from mediadrop.plugin.abc import AbstractClass, abstractmethod
@@ -31,6 +33,10 @@ class PermissionPolicies(AbstractClass):
     def access_condition_for_query(self, query, permission, perm):
         pass
     
+    @abstractmethod
+    def restrict_query(self, query, permission, perm):
+        pass
+    
     @classmethod
     def configured_policies(cls, config):
         def policy_from_name(policy_name):
@@ -49,33 +55,67 @@ class MediaDropPermissionSystem(PermissionSystem):
     def __init__(self, config):
         policies = PermissionPolicies.configured_policies(config)
         super(MediaDropPermissionSystem, self).__init__(policies)
+        self._policies_by_permission = {}
+        self._compiled_for = None
+    
+    @classmethod
+    def for_config(cls, config):
+        """Return the permission system which is shared by all requests
+        (see :func:`mediadrop.config.environment.load_environment`)."""
+        app_globals = config.get('pylons.app_globals')
+        permission_system = getattr(app_globals, 'permission_system', None)
+        if permission_system is None:
+            permission_system = cls(config)
+        return permission_system
     
     @classmethod
     def permissions_for_request(cls, environ, config):
         identity = environ.get('repoze.who.identity', {})
         user_id = identity.get('repoze.who.userid')
-        user = None
-        if user_id is not None:
-            user = DBSession.query(User).filter(User.id==user_id).first()
-        return cls.permissions_for_user(user, config)
+        user, groups = permission_contexts.user_and_groups(user_id)
+        if user is None:
+            return cls.permissions_for_user(None, config, groups=groups)
+        return UserPermissions(user, cls.for_config(config), groups=groups)
     
     @classmethod
-    def permissions_for_user(cls, user, config):
+    def permissions_for_user(cls, user, config, groups=None):
         if user is None:
             user = User()
             user.display_name = u'Anonymous User'
             user.user_name = u'anonymous'
             user.email_address = 'invalid@mediadrop.example'
-            anonymous_group = Group.by_name(u'anonymous')
-            groups = filter(None, [anonymous_group])
+            if groups is None:
+                anonymous_group = Group.by_name(u'anonymous')
+                groups = filter(None, [anonymous_group])
         else:
             meta_groups = Group.query.filter(Group.group_name.in_([u'anonymous', u'authenticated']))
             groups = list(user.groups) + list(meta_groups)
-        return UserPermissions(user, cls(config), groups=groups)
+        return UserPermissions(user, cls.for_config(config), groups=groups)
+    
+    def policies_for_permission(self, permission):
+        # The applicable policies are looked up once per permission until
+        # the policies or the permissions in the database change.
+        compiled_for = (self.policies, permission_matrix.version())
+        if self._compiled_for != compiled_for:
+            self._policies_by_permission = {}
+            self._compiled_for = compiled_for
+        policies = self._policies_by_permission.get(permission)
+        if policies is None:
+            policies = super(MediaDropPermissionSystem, self)\
+                .policies_for_permission(permission)
+            self._policies_by_permission[permission] = policies
+        return policies
     
     def filter_restricted_items(self, query, permission_name, perm):
+        """Return only the items of the query which the user may access.
+        
+        If all policies can restrict the query the result is a query as well
+        so counting, slicing etc. is done by the database. Otherwise the
+        items are checked in Python (see :class:`QueryResultProxy`)."""
         if self._can_apply_access_restrictions_to_query(query, permission_name):
             return self._apply_access_restrictions_to_query(query, permission_name, perm)
+        if self._permits_all_items(query, permission_name, perm):
+            return query
         
         can_access_item = \
             lambda item: perm.contains_permission(permission_name, item.resource)
@@ -91,12 +131,29 @@ class MediaDropPermissionSystem(PermissionSystem):
                 return False
         return True
     
+    def _permits_all_items(self, query, permission_name, perm):
+        # The first policy with a decision wins so a policy can only permit
+        # all items if all policies before it can restrict the query.
+        for policy in self.policies_for_permission(permission_name):
+            if not policy.can_apply_access_restrictions_to_query(query, permission_name):
+                return False
+            if policy.restrict_query(query, permission_name, perm) is not query:
+                return False
+            result = policy.access_condition_for_query(query, permission_name, perm)
+            if result is True:
+                return True
+            elif result is False or isinstance(result, tuple):
+                # the policy restricts the query itself
+                return False
+        return False
+    
     def _apply_access_restrictions_to_query(self, query, permission_name, perm):
         conditions = []
         for policy in self.policies_for_permission(permission_name):
+            query = policy.restrict_query(query, permission_name, perm)
             result = policy.access_condition_for_query(query, permission_name, perm)
             if result == True:
-                return QueryResultProxy(query)
+                return query
             elif result == False:
                 return StaticQuery([])
             elif result is None:
@@ -111,6 +168,5 @@ class MediaDropPermissionSystem(PermissionSystem):
             # if there is no condition which can possibly allow the access, 
             # we should not return any items
             return StaticQuery([])
-        restricted_query = query.distinct().filter(or_(*conditions))
-        return QueryResultProxy(restricted_query)
+        return query.distinct().filter(or_(*conditions))
 
@@ -6,12 +6,24 @@
 # the GPLv3 or (at your option) any later version.
 # See LICENSE.txt in the main project directory, for more information.
 
+from mediadrop.lib.paginate import seek_order, seek_query, seek_values
+
 
 __all__ = ['QueryResultProxy', 'StaticQuery']
 
 class QueryResultProxy(object):
+    """Filter the results of a query in Python (for permission policies
+    which can not restrict the query itself).
+    
+    Items are fetched in chunks. If the query is ordered by (NOT NULL)
+    columns of the mapped class the chunks are fetched with keyset
+    pagination (see :func:`mediadrop.lib.paginate.seek_query`) so later
+    chunks do not become slower because of growing OFFSETs.
+    """
     def __init__(self, query, start=0, filter_=None, default_fetch=10):
         self.query = query
+        self._seek_order = _keyset_order(query)
+        self._last_values = None
         self._items_retrieved = start
         self._items_returned = 0
         self._limit = None
@@ -51,8 +63,17 @@ class QueryResultProxy(object):
         return items
     
     def _fetch(self, n):
-        fetched_items = self.query.offset(self._items_retrieved).limit(n).all()
+        if self._seek_order is None:
+            query = self.query.offset(self._items_retrieved)
+        elif self._last_values is not None:
+            query = seek_query(self.query, self._seek_order, self._last_values)
+        else:
+            query = seek_query(self.query, self._seek_order)\
+                .offset(self._items_retrieved)
+        fetched_items = query.limit(n).all()
         self._items_retrieved += len(fetched_items)
+        if self._seek_order is not None and fetched_items:
+            self._last_values = seek_values(fetched_items[-1], self._seek_order)
         return fetched_items
     
     def more_available(self):
@@ -84,7 +105,6 @@ class QueryResultProxy(object):
         raise StopIteration
     
     def _prefetch_all(self):
-        # yes, that's very inefficient but works for now
         prefetched_items = []
         def _prefetch():
             next_items = self.fetch(n=1000)
@@ -101,7 +121,13 @@ class QueryResultProxy(object):
         if self.more_available():
             self._prefetch_all()
         return self._items_returned + len(self._prefetched_items)
-    count = __len__
+    
+    def count(self):
+        if self._filter is None and self._limit is None and \
+                self._items_retrieved == 0:
+            # the database can count the items without loading them
+            return self.query.count()
+        return len(self)
     
     def __getitem__(self, key):
         def is_slice(item):
@@ -123,6 +149,18 @@ class QueryResultProxy(object):
         self._limit = n
         return self
     
+    # --- keyset pagination support -------------------------------------------
+    
+    @property
+    def has_filter(self):
+        "Returns True if some items of the query are filtered in Python."
+        return self._filter is not None
+    
+    def with_query(self, query):
+        "Returns a new proxy for the given query which uses the same filter."
+        return QueryResultProxy(query, filter_=self._filter,
+            default_fetch=self._default_fetch)
+    
     def offset(self, n):
         n = int(n)
         assert n >= 0
@@ -132,6 +170,18 @@ class QueryResultProxy(object):
         return self
 
 
+def _keyset_order(query):
+    # NULL values can not be compared and the databases sort them
+    # differently so keyset pagination is only used for NOT NULL columns.
+    order = seek_order(query)
+    if order is None:
+        return None
+    for column, descending in order:
+        if getattr(column, 'nullable', True):
+            return None
+    return order
+
+
 class StaticQuery(object):
     def __init__(self, items):
         self._all_items = items
@@ -0,0 +1,100 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+
+from pythonic_testcase import *
+from sqlalchemy import orm
+
+from mediadrop.lib.auth.api import UserPermissions
+from mediadrop.lib.auth.category_access_policy import (CategoryAccessPolicy,
+    grant_category_access, revoke_category_access)
+from mediadrop.lib.auth.group_based_policy import GroupBasedPermissionsPolicy
+from mediadrop.lib.auth.permission_system import (MediaDropPermissionSystem,
+    PermissionPolicies)
+from mediadrop.lib.test.db_testcase import DBTestCase
+from mediadrop.model import (Category, current_catalog_version, DBSession,
+    Group, Media, User)
+
+
+class CategoryAccessPolicyTest(DBTestCase):
+    def setUp(self):
+        super(CategoryAccessPolicyTest, self).setUp()
+        PermissionPolicies.register(GroupBasedPermissionsPolicy)
+        PermissionPolicies.register(CategoryAccessPolicy)
+        self.pylons_config['permission_policies'] = \
+            'CategoryAccessPolicy, GroupBasedPermissionsPolicy'
+        self.permission_system = MediaDropPermissionSystem(self.pylons_config)
+
+        Media.query.delete()
+        self.secret = Category.example(name=u'Secret')
+        self.public = Category.example(name=u'Public')
+        self.secret_media = Media.example(title=u'Secret Plan')
+        self.secret_media.categories = [self.secret, self.public]
+        self.public_media = Media.example(title=u'Press Release')
+        self.public_media.categories = [self.public]
+        self.members = Group.example(name=u'members')
+        self.member = User.example(user_name=u'joe')
+        self.member.groups = [self.members]
+        DBSession.commit()
+        grant_category_access(self.secret, self.members)
+        DBSession.commit()
+
+    def perm(self, user=None):
+        return MediaDropPermissionSystem.permissions_for_user(user,
+            self.pylons_config)
+
+    def viewable(self, perm):
+        return self.permission_system.filter_restricted_items(Media.query,
+            u'view', perm)
+
+    def can_view(self, perm, media):
+        return self.permission_system.has_permission(u'view', perm,
+            media.resource)
+
+    def test_hides_media_of_restricted_categories(self):
+        anonymous = self.perm()
+        results = self.viewable(anonymous)
+        assert_isinstance(results, orm.Query)
+        assert_equals([self.public_media], results.all())
+        assert_equals(1, results.count())
+        assert_false(self.can_view(anonymous, self.secret_media))
+        assert_true(self.can_view(anonymous, self.public_media))
+
+    def test_granted_groups_can_view_restricted_categories(self):
+        member = self.perm(self.member)
+        assert_equals(set([self.public_media, self.secret_media]),
+                      set(self.viewable(member)))
+        assert_true(self.can_view(member, self.secret_media))
+
+        admin = User.query.filter(User.user_name == u'admin').one()
+        assert_equals(2, self.viewable(self.perm(admin)).count())
+
+    def test_grant_changes_apply_immediately(self):
+        version = current_catalog_version(DBSession.connection())
+        revoke_category_access(self.secret, self.members)
+        DBSession.commit()
+        assert_equals(2, self.viewable(self.perm()).count())
+
+        grant_category_access(self.public, self.members)
+        DBSession.commit()
+        assert_equals([], self.viewable(self.perm()).all())
+        # cached search results are outdated
+        assert_equals(version + 2, current_catalog_version(DBSession.connection()))
+
+    def test_still_requires_the_view_permission(self):
+        perm = UserPermissions(self.member, self.permission_system, groups=[])
+        assert_equals(0, self.viewable(perm).count())
+        assert_false(self.can_view(perm, self.public_media))
+
+
+import unittest
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(CategoryAccessPolicyTest))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite')
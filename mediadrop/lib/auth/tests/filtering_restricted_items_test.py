@@ -6,6 +6,7 @@
 # See LICENSE.txt in the main project directory, for more information.
 
 from pythonic_testcase import *
+from sqlalchemy import orm
 
 from mediadrop.lib.auth.api import IPermissionPolicy, UserPermissions
 from mediadrop.lib.auth.group_based_policy import GroupBasedPermissionsPolicy
@@ -59,6 +60,8 @@ class FilteringRestrictedItemsTest(DBTestCase):
             self._fake_view_policy_with_query_conditions()
         ]
         results = self._media_query_results(u'view')
+        # counting and slicing is done by the database
+        assert_isinstance(results, orm.Query)
         assert_equals(1, results.count())
         assert_equals(self.private_media, list(results)[0])
         
@@ -87,6 +90,24 @@ class FilteringRestrictedItemsTest(DBTestCase):
         results = self._media_query_results(u'view')
         assert_equals(2, results.count())
     
+    def test_does_not_filter_in_python_if_a_previous_policy_permits_all_items(self):
+        class FakePolicy(IPermissionPolicy):
+            permissions = (u'view', )
+            
+            def can_apply_access_restrictions_to_query(self, query, permission):
+                return True
+            
+            def access_condition_for_query(self, query, permission, perm):
+                return True
+        python_policy = self._fake_view_policy(lambda media: False)
+        self.permission_system.policies = [FakePolicy(), python_policy]
+        results = self._media_query_results(u'view')
+        assert_isinstance(results, orm.Query)
+        assert_equals(2, results.count())
+        
+        self.permission_system.policies = [python_policy, FakePolicy()]
+        assert_equals(0, self._media_query_results(u'view').count())
+    
     def test_policies_can_return_false_to_suppress_all_items(self):
         class FakePolicy(IPermissionPolicy):
             permissions = (u'view', )
@@ -139,7 +160,49 @@ class FilteringRestrictedItemsTest(DBTestCase):
         assert_equals(1, results.count())
         assert_equals(self.private_media, results.first())
     
-    # --- helpers -------------------------------------------------------------
+    def test_policies_can_only_deny_access(self):
+        test_self = self
+        class DenyingPolicy(IPermissionPolicy):
+            permissions = (u'view', )
+    
+            def permits(self, permission, user_permissions, resource):
+                if resource.data['media'].id == test_self.private_media.id:
+                    return False
+                return None
+    
+            def can_apply_access_restrictions_to_query(self, query, permission):
+                return True
+    
+            def restrict_query(self, query, permission, perm):
+                return query.filter(Media.id != test_self.private_media.id)
+        class AllowingPolicy(IPermissionPolicy):
+            permissions = (u'view', )
+    
+            def can_apply_access_restrictions_to_query(self, query, permission):
+                return True
+    
+            def access_condition_for_query(self, query, permission, perm):
+                return True
+    
+        self.permission_system.policies = [DenyingPolicy()]
+        assert_equals(0, self._media_query_results(u'view').count())
+    
+        self.permission_system.policies = [DenyingPolicy(), AllowingPolicy()]
+        results = self._media_query_results(u'view')
+        assert_isinstance(results, orm.Query)
+        assert_equals([self.public_media], results.all())
+    
+        self.permission_system.policies = [
+            DenyingPolicy(),
+            self._fake_view_policy_with_query_conditions()
+        ]
+        assert_equals(0, self._media_query_results(u'view').count())
+    
+        python_policy = self._fake_view_policy(lambda media: True)
+        self.permission_system.policies = [DenyingPolicy(), python_policy]
+        assert_equals([self.public_media], list(self._media_query_results(u'view')))
+    
+        # --- helpers -------------------------------------------------------------
     
     def _media_query_results(self, permission):
         return self.permission_system.filter_restricted_items(self.media_query, permission, self.perm)
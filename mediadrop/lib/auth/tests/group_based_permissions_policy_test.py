@@ -9,10 +9,13 @@ from pythonic_testcase import *
 
 from mediadrop.lib.auth.api import UserPermissions
 from mediadrop.lib.auth.group_based_policy import GroupBasedPermissionsPolicy
+from mediadrop.lib.auth.permission_matrix import permission_matrix
 from mediadrop.lib.auth.permission_system import (MediaDropPermissionSystem,
     PermissionPolicies)
 from mediadrop.lib.test.db_testcase import DBTestCase
-from mediadrop.model import DBSession, Media, Permission, User
+from mediadrop.model import DBSession, Group, Media, Permission, User
+from mediadrop.model.auth import (groups_permissions,
+    increment_permissions_version)
 
 
 class GroupBasedPermissionsPolicyTest(DBTestCase):
@@ -51,6 +54,32 @@ class GroupBasedPermissionsPolicyTest(DBTestCase):
         DBSession.flush()
         
         assert_none(self.policy.access_condition_for_query(query, permission, perm))
+    
+    # --- cached permissions --------------------------------------------------
+    def test_caches_permissions_of_all_groups(self):
+        editors = Group.by_name(u'editors')
+        assert_contains(editors.group_id, permission_matrix.group_ids(u'edit'))
+        assert_contains(u'edit', self.policy._permissions(self.perm()))
+        
+        # other processes change the database without the mapper events
+        DBSession.execute(groups_permissions.delete())
+        assert_contains(editors.group_id, permission_matrix.group_ids(u'edit'))
+        
+        increment_permissions_version(DBSession.connection())
+        self.pylons_config['permissions_check_interval'] = '0'
+        assert_equals(frozenset(), permission_matrix.group_ids(u'edit'))
+        assert_false(self.perm().contains_permission(u'edit'))
+    
+    def test_permission_changes_invalidate_cached_permissions(self):
+        assert_not_contains(u'custom', self.policy.permissions)
+        custom = Permission.example(name=u'custom')
+        assert_contains(u'custom', self.policy.permissions)
+        
+        editors = Group.by_name(u'editors')
+        editors.permissions.append(custom)
+        DBSession.commit()
+        assert_equals(frozenset([editors.group_id]),
+                      permission_matrix.group_ids(u'custom'))
 
 
 import unittest
@@ -35,6 +35,23 @@ class MediaDropPermissionSystemTest(DBTestCase):
         user = User.example()
         self.assert_user_groups([], user)
     
+    def test_all_requests_share_one_permission_system(self):
+        permission_system = self.pylons_config['pylons.app_globals'].permission_system
+        assert_isinstance(permission_system, MediaDropPermissionSystem)
+        perm = MediaDropPermissionSystem.permissions_for_request({}, self.pylons_config)
+        assert_equals(permission_system, perm.permission_system)
+        assert_equals(permission_system,
+            MediaDropPermissionSystem.for_config(self.pylons_config))
+    
+    def test_looks_up_policies_once_per_permission(self):
+        permission_system = MediaDropPermissionSystem(self.pylons_config)
+        policies = permission_system.policies_for_permission(u'view')
+        assert_length(1, policies)
+        assert_true(policies is permission_system.policies_for_permission(u'view'))
+        
+        permission_system.policies = []
+        assert_equals([], permission_system.policies_for_permission(u'view'))
+    
     # --- helpers -------------------------------------------------------------
     
     def assert_user_groups(self, groups, user):
@@ -0,0 +1,103 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+
+from pythonic_testcase import *
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
+
+from mediadrop.lib.auth.permission_context import permission_contexts
+from mediadrop.lib.auth.permission_system import MediaDropPermissionSystem
+from mediadrop.lib.test.db_testcase import DBTestCase
+from mediadrop.model import DBSession, Group, User
+from mediadrop.model.auth import users
+
+
+class PermissionContextCacheTest(DBTestCase):
+    def setUp(self):
+        super(PermissionContextCacheTest, self).setUp()
+        self.statements = None
+        event.listen(DBSession.bind, 'before_cursor_execute', self._record)
+        self.user_id = User.query.filter(User.user_name == u'admin').one().id
+        DBSession.remove()
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if self.statements is not None:
+            self.statements.append(statement)
+
+    def perm(self, user_id):
+        environ = {}
+        if user_id is not None:
+            environ['repoze.who.identity'] = {'repoze.who.userid': user_id}
+        perm = MediaDropPermissionSystem.permissions_for_request(environ,
+            self.pylons_config)
+        # the session is removed at the end of each request
+        DBSession.remove()
+        return perm
+
+    def group_names(self, perm):
+        return sorted(group.group_name for group in perm.groups)
+
+    def test_caches_user_and_groups(self):
+        perm = self.perm(self.user_id)
+        assert_equals(u'admin', perm.user.user_name)
+        assert_equals([u'admins', u'anonymous', u'authenticated'],
+                      self.group_names(perm))
+
+        self.statements = []
+        environ = {'repoze.who.identity': {'repoze.who.userid': self.user_id}}
+        perm = MediaDropPermissionSystem.permissions_for_request(environ,
+            self.pylons_config)
+        assert_equals([], self.statements)
+        # the instances belong to the session of the request
+        assert_equals(DBSession(), object_session(perm.user))
+        assert_true(perm.contains_permission(u'admin'))
+
+    def test_user_changes_invalidate_the_cached_context(self):
+        self.perm(self.user_id)
+        user = User.query.get(self.user_id)
+        user.display_name = u'Root'
+        user.groups = []
+        DBSession.commit()
+        DBSession.remove()
+
+        perm = self.perm(self.user_id)
+        assert_equals(u'Root', perm.user.display_name)
+        assert_equals([u'anonymous', u'authenticated'], self.group_names(perm))
+        assert_false(perm.contains_permission(u'admin'))
+
+    def test_caches_anonymous_context(self):
+        perm = self.perm(None)
+        assert_equals(u'anonymous', perm.user.user_name)
+        assert_equals([u'anonymous'], self.group_names(perm))
+        assert_equals(u'anonymous', self.perm(None).user.user_name)
+
+    def test_notices_changes_of_other_processes_when_the_cache_expired(self):
+        self.perm(self.user_id)
+        DBSession.execute(users.update().where(users.c.user_id == self.user_id)\
+            .values(display_name=u'Root'))
+        DBSession.commit()
+        assert_not_equals(u'Root', self.perm(self.user_id).user.display_name)
+        self.pylons_config['permission_context_expire'] = '0'
+        assert_equals(u'Root', self.perm(self.user_id).user.display_name)
+
+    def test_keeps_only_the_most_recently_used_entries(self):
+        self.pylons_config['permission_context_max_entries'] = '2'
+        self.perm(None)
+        self.perm(self.user_id)
+        self.perm(None)
+        self.perm(-1)
+        # the anonymous entry was used more recently
+        assert_equals([None, -1], list(permission_contexts._entries))
+
+import unittest
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(PermissionContextCacheTest))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite')
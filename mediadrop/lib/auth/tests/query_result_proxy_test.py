@@ -30,6 +30,17 @@ class User(Base):
     def __repr__(self):
         return 'User(name=%s, activity=%s)' % (repr(self.name), repr(self.activity))
 
+class Score(Base):
+    __tablename__ = 'test_queryresultproxy_scores'
+    
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    points = Column(Integer, nullable=False)
+    
+    def __init__(self, name, points):
+        self.name = name
+        self.points = points
+
 
 
 class QueryResultProxyTest(PythonicTestCase):
@@ -182,11 +193,53 @@ class QueryResultProxyTest(PythonicTestCase):
         self.proxy = QueryResultProxy(self.query, filter_=filter_)
         assert_length(3, self.proxy)
     
+    def test_counts_unfiltered_items_in_the_database(self):
+        assert_equals(5, self.proxy.count())
+        assert_length(0, self.proxy._prefetched_items)
+        
+        filter_ = lambda item: item.activity >= 2
+        self.proxy = QueryResultProxy(self.query, filter_=filter_)
+        assert_equals(3, self.proxy.count())
+    
+    def test_can_wrap_another_query_with_the_same_filter(self):
+        filter_ = lambda item: item.activity != 3
+        self.proxy = QueryResultProxy(self.query, filter_=filter_)
+        assert_true(self.proxy.has_filter)
+        proxy = self.proxy.with_query(self.query.filter(User.id > 2))
+        assert_equals(['baz', 'quuux'], self._names(proxy.fetch(n=5)))
+        assert_false(QueryResultProxy(self.query).has_filter)
+    
     def test_can_specify_how_many_items_should_be_fetched_by_default(self):
         self.proxy = QueryResultProxy(self.query, default_fetch=3)
         self.proxy.more_available()
         assert_equals(3, len(self.proxy._prefetched_items))
     
+    # --- keyset chunks --------------------------------------------------------
+    
+    def test_fetches_chunks_after_the_last_item_of_ordered_queries(self):
+        for i, name in enumerate(('foo', 'bar', 'baz', 'quux', 'quuux')):
+            self.session.add(Score(name, i))
+        self.session.add(Score('quuuux', 3))
+        self.session.commit()
+        query = self.session.query(Score).order_by(Score.points.desc())
+        filter_ = lambda item: item.name != 'baz'
+        self.proxy = QueryResultProxy(query, filter_=filter_, default_fetch=2)
+        
+        assert_equals(['quuux', 'quuuux'], self._next_names(n=2))
+        # the primary key makes the order unambiguous
+        assert_equals([3, 4], self.proxy._last_values)
+        expected = [score.name for score in query.order_by(Score.id.desc())
+                    if filter_(score)]
+        assert_equals(expected[2:], self._names(self.proxy))
+    
+    def test_uses_offsets_for_nullable_columns(self):
+        self.session.add(User(None, 9))
+        self.session.commit()
+        query = self.session.query(User).order_by(User.name)
+        self.proxy = QueryResultProxy(query, default_fetch=2)
+        assert_equals([user.name for user in query], self._names(self.proxy))
+        assert_none(self.proxy._last_values)
+    
     # --- slicing --------------------------------------------------------------
     
     def test_supports_simple_slicing(self):
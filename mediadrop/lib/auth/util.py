@@ -5,14 +5,12 @@
 # (at your option) any later version.
 # See LICENSE.txt in the main project directory, for more information.
 
-from pylons import config, request
-
-from mediadrop.lib.auth.permission_system import MediaDropPermissionSystem
+from pylons import request
 
 
 __all__ = ['viewable_media']
 
 def viewable_media(query):
-    permission_system = MediaDropPermissionSystem(config)
-    return permission_system.filter_restricted_items(query, u'view', request.perm)
+    perm = request.perm
+    return perm.permission_system.filter_restricted_items(query, u'view', perm)
 
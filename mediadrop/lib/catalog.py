@@ -0,0 +1,67 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+"""
+Track changes of the public media catalog
+
+The catalog version (see :mod:`mediadrop.model.catalog`) is incremented
+when media is published, unpublished or deleted, when the public data of
+published media changes and when categories or tags are added, changed or
+deleted. The increment happens in the same transaction as the change so it
+is rolled back together with it.
+
+Counters (views, likes) are not tracked, they change far too often.
+"""
+
+from sqlalchemy.orm import object_session
+
+from mediadrop.model.catalog import increment_catalog_version
+from mediadrop.model.meta import attributes_changed
+from mediadrop.plugin import events
+from mediadrop.plugin.events import observes
+
+__all__ = ['CONTENT_ATTRIBUTES', 'PUBLICATION_ATTRIBUTES', 'content_changed',
+    'publication_changed']
+
+# Media attributes which decide if a media item is published.
+PUBLICATION_ATTRIBUTES = ('reviewed', 'encoded', 'publishable', 'publish_on',
+    'publish_until')
+
+# Media attributes which are displayed in public listings (and the API).
+CONTENT_ATTRIBUTES = ('slug', 'type', 'title', 'subtitle', 'description',
+    'description_plain', 'author_name', 'author_email', 'duration',
+    'podcast_id', 'podcast', 'categories', 'tags')
+
+
+def publication_changed(media):
+    return attributes_changed(media, PUBLICATION_ATTRIBUTES)
+
+def content_changed(media):
+    return attributes_changed(media, CONTENT_ATTRIBUTES)
+
+def _increment(instance):
+    increment_catalog_version(object_session(instance).connection())
+
+@observes(events.Media.after_insert)
+def _media_added(instance):
+    if instance.is_published:
+        _increment(instance)
+
+@observes(events.Media.after_update)
+def _media_changed(instance):
+    if publication_changed(instance) or \
+            (instance.is_published and content_changed(instance)):
+        _increment(instance)
+
+@observes(events.Media.before_delete)
+def _media_deleted(instance):
+    _increment(instance)
+
+@observes(events.Category.after_insert, events.Category.after_update,
+    events.Category.before_delete, events.Tag.after_insert,
+    events.Tag.after_update, events.Tag.before_delete)
+def _taxonomy_changed(instance):
+    _increment(instance)
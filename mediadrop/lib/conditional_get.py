@@ -0,0 +1,176 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+"""
+Conditional GET (ETag, Last-Modified and 304 Not Modified)
+
+Feed readers and API clients poll the same URLs over and over. The
+validators for these responses are derived from one aggregate query over
+the media in the scope of the response (latest modification, number of
+media, total views) plus the catalog version (see
+:mod:`mediadrop.model.catalog`), which changes when any media item is
+published, unpublished or deleted. If the client already has the current
+response it gets a '304 Not Modified' before anything is rendered.
+
+View counts are written in bulk (see :mod:`mediadrop.lib.view_counter`) so
+the validators change when buffered views were flushed.
+"""
+
+from calendar import timegm
+from datetime import datetime
+from hashlib import md5
+import time
+
+from decorator import decorator
+from pylons import request, response
+from sqlalchemy import sql
+from webob.exc import HTTPNotModified
+
+from mediadrop.model.catalog import current_catalog_state
+from mediadrop.model.media import Media
+from mediadrop.model.meta import DBSession
+
+__all__ = ['aggregate_validators', 'conditional_get', 'conditional_response',
+    'media_aggregate', 'media_validators', 'page_validators',
+    'response_validators']
+
+VALIDATORS_KEY = 'mediadrop.response_validators'
+
+
+def media_aggregate(query):
+    """Return the latest modification and publishing date, the number of
+    media and the total views of the given query.
+
+    :param query: A :class:`mediadrop.model.media.MediaQuery`.
+    :returns: A (modified_on, published_on, count, views) tuple.
+    """
+    return tuple(query.order_by(None)\
+        .with_entities(sql.func.max(Media.modified_on),
+                       sql.func.max(Media.publish_on),
+                       sql.func.count(Media.id),
+                       sql.func.sum(Media.views))\
+        .one())
+
+def media_validators(query, *extra):
+    """Return an ETag and the Last-Modified date for a response which
+    displays media of the given query.
+
+    The ETag also depends on the requested URL and the current user.
+
+    :param query: A :class:`mediadrop.model.media.MediaQuery`.
+    :param extra: Further values which change the response (e.g. the
+        modification date of a podcast). Dates are also considered for the
+        Last-Modified date.
+    :returns: An (etag, last_modified) tuple.
+    """
+    return aggregate_validators(media_aggregate(query), *extra)
+
+def aggregate_validators(aggregate, *extra):
+    """Return the validators (see :func:`media_validators`) for the result
+    of :func:`media_aggregate`, callers which need the number of media
+    anyway do not have to count them twice."""
+    modified_on, published_on, count, views = aggregate
+    return _validators((count, views or 0, modified_on, published_on) + extra,
+                       [modified_on, published_on] + list(extra))
+
+def page_validators(media, *extra):
+    """Return the validators (see :func:`media_validators`) for a response
+    which displays exactly the given media items.
+
+    This does not need an aggregate query over all matching media but the
+    items must be loaded before a '304 Not Modified' can be sent.
+
+    :param media: A list of :class:`mediadrop.model.media.Media`.
+    """
+    state = tuple((item.id, item.modified_on, item.views, item.likes)
+                  for item in media)
+    return _validators((state, ) + extra,
+                       [item.modified_on for item in media] + list(extra))
+
+def _validators(parts, dates):
+    version, catalog_modified_on = current_catalog_state(DBSession.connection())
+    dates = [value for value in dates + [catalog_modified_on]
+             if isinstance(value, datetime)]
+    last_modified = dates and max(dates) or None
+
+    perm = getattr(request, 'perm', None)
+    user_id = perm and getattr(perm.user, 'id', None)
+    parts = (request.path_qs, user_id, version) + tuple(parts)
+    etag = 'W/"%s"' % md5(repr(parts)).hexdigest()
+    return etag, last_modified
+
+def _timestamp(value):
+    # the database stores local times
+    return int(time.mktime(value.timetuple()))
+
+def _is_not_modified(etag, last_modified):
+    if request.if_none_match:
+        # If-Modified-Since must be ignored if there is an ETag
+        return etag[2:].strip('"') in request.if_none_match
+    if_modified_since = request.if_modified_since
+    if if_modified_since and last_modified is not None:
+        return _timestamp(last_modified) <= timegm(if_modified_since.utctimetuple())
+    return False
+
+def _validator_headers(etag, last_modified):
+    headers = [('ETag', etag)]
+    if last_modified is not None:
+        headers.append(('Last-Modified', _http_date(last_modified)))
+    return headers
+
+def _http_date(value):
+    return time.strftime('%a, %d %b %Y %H:%M:%S GMT',
+                         time.gmtime(_timestamp(value)))
+
+def conditional_response(etag, last_modified=None):
+    """Add the validators to the response or raise a 304 Not Modified if
+    the client's copy is still current.
+
+    :param etag: The (weak) ETag of the response.
+    :param last_modified: An optional (local) datetime.
+    :raises webob.exc.HTTPNotModified: If the client sent matching
+        If-None-Match or If-Modified-Since headers.
+    """
+    # kept so cached responses can be validated again (see
+    # mediadrop.lib.api_cache)
+    request.environ[VALIDATORS_KEY] = (etag, last_modified)
+    headers = _validator_headers(etag, last_modified)
+    if _is_not_modified(etag, last_modified):
+        raise HTTPNotModified(headers=headers)
+    for name, value in headers:
+        response.headers[name] = value
+
+def response_validators():
+    """Return the (etag, last_modified) tuple which was passed to
+    :func:`conditional_response` in the current request (or None)."""
+    return request.environ.get(VALIDATORS_KEY)
+
+def conditional_get(scope):
+    """Answer conditional requests before the action is called.
+
+    Apply it outside of :func:`mediadrop.lib.decorators.beaker_cache` (and
+    inside of :func:`mediadrop.lib.feed_files.serve_feed_file`, the
+    pregenerated files are validated by their modification time).
+
+    :param scope: A callable which is passed the arguments of the action
+        and returns the query of the displayed media (or a tuple with the
+        query and further values for :func:`media_validators`).
+    :returns: A decorator function.
+    """
+    def wrapper(func, *args, **kwargs):
+        validators = scope(*args, **kwargs)
+        if not isinstance(validators, tuple):
+            validators = (validators, )
+        etag, last_modified = media_validators(*validators)
+        headers = _validator_headers(etag, last_modified)
+        if _is_not_modified(etag, last_modified):
+            raise HTTPNotModified(headers=headers)
+        result = func(*args, **kwargs)
+        # set afterwards, beaker_cache replaces the headers of cached responses
+        for name, value in headers:
+            response.headers[name] = value
+        return result
+    return decorator(wrapper)
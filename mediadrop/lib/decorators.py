@@ -21,7 +21,7 @@ from pylons.decorators.util import get_pylons
 from webob.exc import HTTPException, HTTPMethodNotAllowed
 
 from mediadrop.lib.paginate import paginate
-from mediadrop.lib.templating import render
+from mediadrop.lib.templating import render, render_streamed
 
 __all__ = [
     'ValidationState',
@@ -67,7 +67,8 @@ def _get_func_attrs(f):
         result[x] = getattr(f, x, (None,))
     return result
 
-def _expose_wrapper(f, template, request_method=None, permission=None):
+def _expose_wrapper(f, template, request_method=None, permission=None,
+                    stream=False):
     """Returns a function that will render the passed in function according
     to the passed in template"""
     f.exposed = True
@@ -117,6 +118,8 @@ def _expose_wrapper(f, template, request_method=None, permission=None):
             if response.content_type == 'text/html':
                 response.content_type = 'application/xhtml+xml'
 
+        if stream:
+            return render_streamed(tmpl, tmpl_vars=result)
         return render(tmpl, tmpl_vars=result, method='auto')
 
     if permission:
@@ -125,7 +128,8 @@ def _expose_wrapper(f, template, request_method=None, permission=None):
 
     return wrapped_f
 
-def expose(template='string', request_method=None, permission=None):
+def expose(template='string', request_method=None, permission=None,
+           stream=False):
     """Simple expose decorator for controller actions.
 
     Transparently wraps a method in a function that will render the method's
@@ -155,9 +159,14 @@ def expose(template='string', request_method=None, permission=None):
         POST is given and the method of the current request does not match,
         a 405 Method Not Allowed error is raised.
 
+    :param stream: If true, the genshi template is rendered while the
+        response is sent, see :func:`mediadrop.lib.templating.render_streamed`.
+        Use this for documents which may become very large.
+
     """
     def wrap(f):
-        wrapped_f = _expose_wrapper(f, template, request_method, permission)
+        wrapped_f = _expose_wrapper(f, template, request_method, permission,
+            stream)
         _copy_func_attrs(f, wrapped_f)
         if request_method:
             f._request_method = request_method
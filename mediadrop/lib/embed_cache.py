@@ -0,0 +1,110 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+"""
+Cache for rendered player and embed markup
+
+Embedded players are loaded far more often than media or the player
+settings change. The rendered markup is cached for the media item (and the
+modification dates of the item and its files), the requested size and the
+version of the player configuration (see :func:`players_version`), so
+editing media, their files or the players makes the cached markup
+unreachable. The site URL, language and
+settings of the request are part of the key as well because the markup
+depends on them.
+
+The lifetime of cached markup can be configured with ``embed_cache_expire``
+(in seconds) and the Beaker backend with ``embed_cache_type``.
+"""
+
+from hashlib import sha1
+
+from genshi import Markup
+from paste.deploy.converters import asbool
+from pylons import app_globals, config, request, translator
+from sqlalchemy import sql
+
+from mediadrop.model.meta import DBSession
+from mediadrop.model.players import players
+
+__all__ = ['cached_embed_code', 'cached_player', 'embed_cache_key',
+    'players_version', 'EMBED_CACHE_EXPIRE']
+
+# default lifetime of cached markup in seconds
+EMBED_CACHE_EXPIRE = 3600
+
+# the player markup of the iframe page (see players/iframe.html)
+IFRAME_PLAYER_OPTIONS = dict(show_playerbar=False,
+    js_init='function(ctrlr){ ctrlr.setFillScreen(true); }')
+
+
+def players_version():
+    """Return a value which changes whenever the player configuration
+    changes (players are added, removed, enabled, reordered or edited).
+
+    :rtype: tuple
+    """
+    select = sql.select([sql.func.count(players.c.id),
+                         sql.func.max(players.c.modified_on)])
+    return tuple(DBSession.execute(select).first())
+
+def _request_context():
+    settings = sorted(request.settings.items())
+    return (request.application_url, str(translator.locale),
+            sha1(repr(settings)).hexdigest())
+
+def _files_fingerprint(media):
+    # editing files does not change the modification date of the media
+    return tuple(sorted((f.id, f.modified_on) for f in media.files))
+
+def embed_cache_key(kind, media, width, height, version):
+    """Return the cache key for the markup of one media item.
+
+    :param kind: The kind of markup, e.g. 'player' or 'embed'.
+    :param media: A :class:`~mediadrop.model.media.Media` instance.
+    :param version: The result of :func:`players_version`.
+    """
+    parts = (kind, media.id, media.modified_on, _files_fingerprint(media),
+        width, height, version) + _request_context()
+    return sha1(repr(parts)).hexdigest()
+
+def _cached_markup(kind, media, width, height, version, create):
+    if not asbool(config.get('cache_enabled', 'True')):
+        return Markup(create())
+    if version is None:
+        version = players_version()
+    options = dict(expire=int(config.get('embed_cache_expire', EMBED_CACHE_EXPIRE)))
+    if config.get('embed_cache_type'):
+        options['type'] = config['embed_cache_type']
+    cache = app_globals.cache.get_cache('embed_markup', **options)
+    key = embed_cache_key(kind, media, width, height, version)
+    return Markup(cache.get(key=key, createfunc=lambda: unicode(create())))
+
+def cached_player(media, width=None, height=None, version=None):
+    """Return the player markup for the iframe player page.
+
+    :param media: A :class:`~mediadrop.model.media.Media` instance.
+    :param version: The current :func:`players_version` if it is known.
+    :rtype: :class:`genshi.Markup`
+    """
+    from mediadrop.lib.helpers import media_player
+    from mediadrop.lib.templating import render_stream
+    def create():
+        return render_stream(media_player(media, width=width, height=height,
+            **IFRAME_PLAYER_OPTIONS))
+    return _cached_markup('player', media, width, height, version, create)
+
+def cached_embed_code(media, width=400, height=225, version=None):
+    """Return the HTML to embed the player of the given media on other
+    sites (see :func:`mediadrop.lib.helpers.embed_player`).
+
+    :param version: The current :func:`players_version` if it is known.
+    :rtype: :class:`genshi.Markup`
+    """
+    from mediadrop.lib.helpers import embed_player
+    def create():
+        return embed_player(media, width=width, height=height)
+    return _cached_markup('embed', media, width, height, version, create)
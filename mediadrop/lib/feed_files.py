@@ -0,0 +1,326 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+"""
+Pregenerated feed and sitemap files
+
+Rendering a feed or sitemap on request makes every cache miss expensive.
+When ``pregenerate_feeds`` is enabled all public feeds (and every page of
+the Google sitemap) are written to ``feeds_dir`` instead and the feed
+actions only serve these files, using the configured ``file_serve_method``
+(X-Sendfile, X-Accel-Redirect or a plain file iterator).
+
+The files are generated by dispatching internal requests to the WSGI
+application so they contain exactly what the actions would render for an
+anonymous visitor. Every file is written to a temporary file first and
+renamed so clients never see partial files. Requests which are answered
+with anything but '200 OK' (e.g. because the feeds were disabled or a
+podcast redirects to feedburner) remove the file, so these are rendered
+on request again.
+
+Files are regenerated in a background thread shortly after media was
+published or unpublished (or categories/podcasts changed). Other changes
+are picked up by ``batch-scripts/generate_feeds.py`` which should run
+periodically (e.g. from cron).
+"""
+
+import errno
+import logging
+import os
+import tempfile
+import threading
+import time
+import urllib
+
+from decorator import decorator
+from paste.deploy.converters import asbool
+from paste.fileapp import FileApp
+from pylons import config, request, response
+from pylons.controllers.util import forward
+from sqlalchemy.orm import object_session
+from webob import Request
+
+from mediadrop.lib.catalog import PUBLICATION_ATTRIBUTES, publication_changed
+from mediadrop.lib.streaming import page_cursors
+from mediadrop.model import Category, Media, Podcast
+from mediadrop.model.meta import (apply_on_commit, attributes_changed,
+    DBSession, SessionChanges)
+from mediadrop.plugin import events
+from mediadrop.plugin.events import observes
+
+__all__ = ['feed_files', 'serve_feed_file', 'FeedFiles',
+    'GENERATING_ENVIRON_KEY']
+
+log = logging.getLogger(__name__)
+
+# seconds to wait for further changes before the files are regenerated
+REGENERATE_DELAY = 10
+# number of media per sitemap page, the default limit of
+# SitemapsController.google
+SITEMAP_PAGE_SIZE = 10000
+
+# set in the WSGI environ of internal requests so the actions render the
+# feed instead of serving the (outdated) file
+GENERATING_ENVIRON_KEY = 'mediadrop.feed_files.generating'
+TEMP_PREFIX = '.tmp-'
+
+# Media attributes which are displayed in feeds.
+FEED_ATTRIBUTES = PUBLICATION_ATTRIBUTES + ('slug', 'title', 'description',
+    'duration', 'podcast_id', 'tags', 'categories')
+
+
+class FeedFiles(SessionChanges):
+    """Generate and locate the pregenerated feed files."""
+
+    def __init__(self):
+        super(FeedFiles, self).__init__()
+        # the WSGI application which renders the feeds, set by make_app()
+        self.app = None
+        self._lock = threading.Lock()
+        self._worker = None
+        self._base_url = None
+
+    def is_enabled(self):
+        return asbool(config.get('pregenerate_feeds', 'false'))
+
+    def directory(self):
+        directory = config.get('feeds_dir') or \
+            os.path.join(config['cache_dir'], 'feeds')
+        return os.path.abspath(directory)
+
+    def path_for(self, path):
+        """Return the absolute file name for the feed at the given path (as
+        in PATH_INFO).
+
+        :returns: A file name or None if the path is outside of the feeds
+            directory.
+        """
+        directory = self.directory()
+        name = path.strip('/')
+        if isinstance(name, unicode):
+            name = name.encode('utf-8')
+        file_path = os.path.normpath(os.path.join(directory, name))
+        if not file_path.startswith(directory + os.sep):
+            return None
+        return file_path
+
+    def feeds(self):
+        """Return (path, query params) tuples of all feeds to generate.
+
+        The query parameters are only used to render the feed, the file is
+        served for requests to the path without any parameters.
+        """
+        feeds = [('/sitemap.xml', {})]
+        cursors = page_cursors(Media.query.published(), SITEMAP_PAGE_SIZE)
+        if len(cursors) > 1:
+            # the pages linked from the sitemap index
+            feeds.extend(('/sitemap%d.xml' % page, dict(page=page, cursor=cursor))
+                         for page, cursor in enumerate(cursors))
+        feeds.extend([('/mrss.xml', {}), ('/latest.xml', {}),
+                      ('/featured.xml', {})])
+        for slug, in DBSession.query(Category.slug).order_by(Category.id):
+            feeds.append(('/categories/feed/%s.xml' % slug, {}))
+        for slug, in DBSession.query(Podcast.slug).order_by(Podcast.id):
+            feeds.append(('/podcasts/feed/%s.xml' % slug, {}))
+        return feeds
+
+    def generate(self, base_url, app=None):
+        """Generate all feed files and remove files of feeds which do not
+        exist anymore.
+
+        :param base_url: The URL of the site (including the SCRIPT_NAME),
+            used for all absolute links in the feeds.
+        :param app: The WSGI application, defaults to :attr:`app`.
+        :returns: The number of written files.
+        """
+        app = app or self.app
+        feeds = self.feeds()
+        written = set()
+        for path, params in feeds:
+            file_path = self.generate_feed(app, base_url, path, params)
+            if file_path:
+                written.add(file_path)
+        self._remove_other_files(written)
+        return len(written)
+
+    def generate_feed(self, app, base_url, path, params=None):
+        """Render the feed at the given path and write it to its file.
+
+        :returns: The file name or None if the feed is not available.
+        """
+        file_path = self.path_for(path)
+        if file_path is None:
+            return None
+        if isinstance(path, unicode):
+            path = path.encode('utf-8')
+        url = urllib.quote(path)
+        if params:
+            url += '?' + urllib.urlencode(sorted(params.items()))
+        feed_request = Request.blank(url, base_url=base_url)
+        feed_request.environ[GENERATING_ENVIRON_KEY] = True
+        status, headers, app_iter = feed_request.call_application(app)
+        try:
+            if not status.startswith('200'):
+                _remove(file_path)
+                return None
+            _write_atomically(file_path, app_iter)
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+        return file_path
+
+    def _remove_other_files(self, file_paths):
+        for dirpath, dirnames, filenames in os.walk(self.directory()):
+            for filename in filenames:
+                file_path = os.path.join(dirpath, filename)
+                # temporary files might be written by another process
+                if file_path not in file_paths and \
+                        not filename.startswith(TEMP_PREFIX):
+                    _remove(file_path)
+
+    # --- regeneration after changes ------------------------------------------
+    def record(self, session):
+        """Regenerate the files when the given session commits."""
+        if session is not None:
+            self._changes[session] = _base_url()
+
+    def apply_changes(self, session, base_url):
+        self.schedule(base_url)
+
+    def schedule(self, base_url=None):
+        """Regenerate all files in a background thread.
+
+        Changes are collected for ``REGENERATE_DELAY`` seconds so a bulk
+        edit triggers only one regeneration.
+        """
+        if not self.is_enabled() or self.app is None:
+            return
+        base_url = config.get('feeds_base_url') or base_url
+        if not base_url:
+            log.warn('Unable to regenerate feeds: feeds_base_url is not set.')
+            return
+        with self._lock:
+            self._base_url = base_url
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._regenerate)
+                self._worker.daemon = True
+                self._worker.start()
+
+    def _regenerate(self):
+        while True:
+            time.sleep(REGENERATE_DELAY)
+            with self._lock:
+                base_url, self._base_url = self._base_url, None
+                if base_url is None:
+                    self._worker = None
+                    return
+            try:
+                self.generate(base_url)
+            except Exception:
+                log.exception('Unable to regenerate feeds')
+            finally:
+                DBSession.remove()
+
+feed_files = FeedFiles()
+
+
+def _remove(file_path):
+    try:
+        os.remove(file_path)
+    except OSError, e:
+        if e.errno != errno.ENOENT:
+            raise
+
+def _write_atomically(file_path, chunks):
+    directory = os.path.dirname(file_path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=TEMP_PREFIX)
+    try:
+        with os.fdopen(fd, 'wb') as fp:
+            for chunk in chunks:
+                fp.write(chunk)
+        os.chmod(temp_path, 0644)
+        os.rename(temp_path, file_path)
+    except:
+        _remove(temp_path)
+        raise
+
+def _base_url():
+    try:
+        return request.application_url
+    except TypeError:
+        # no request (e.g. in a batch script)
+        return None
+
+
+def serve_feed_file(content_types):
+    """Serve the pregenerated file of the requested feed if there is one.
+
+    The action is called if feeds are not pregenerated, the request has
+    query parameters (e.g. a custom limit) or there is no file.
+
+    :param content_types: The content types the action can return, see
+        :func:`mediadrop.lib.helpers.content_type_for_response`.
+    :returns: A decorator function.
+    """
+    def wrapper(func, *args, **kwargs):
+        if not feed_files.is_enabled() or request.GET or \
+                request.environ.get(GENERATING_ENVIRON_KEY):
+            return func(*args, **kwargs)
+        file_path = feed_files.path_for(request.path_info)
+        if file_path is None or not os.path.isfile(file_path):
+            return func(*args, **kwargs)
+        from mediadrop.lib.helpers import content_type_for_response
+        return _serve_file(file_path, content_type_for_response(content_types))
+    return decorator(wrapper)
+
+def _serve_file(file_path, content_type):
+    method = config.get('file_serve_method', None)
+    if method == 'apache_xsendfile':
+        response.headers['X-Sendfile'] = file_path
+    elif method == 'nginx_redirect':
+        # Requires an "internal" NGINX location block with an alias from
+        # the nginx_feeds_serve_path to the feeds_dir.
+        serve_path = config.get('nginx_feeds_serve_path', '__mediadrop_feeds__')
+        relative_path = file_path[len(feed_files.directory()):]
+        response.headers['X-Accel-Redirect'] = '/%s%s' % (
+            serve_path.strip('/'), urllib.quote(relative_path))
+    else:
+        return forward(FileApp(file_path, content_type=content_type))
+    response.headers['Content-Type'] = content_type
+    response.body = ''
+    return ''
+
+
+def _feed_changed(media):
+    if not (media.is_published or publication_changed(media)):
+        return False
+    return attributes_changed(media, FEED_ATTRIBUTES)
+
+@observes(events.Media.after_insert)
+def _media_added(instance):
+    if instance.is_published:
+        feed_files.record(object_session(instance))
+
+@observes(events.Media.after_update)
+def _media_changed(instance):
+    if _feed_changed(instance):
+        feed_files.record(object_session(instance))
+
+@observes(events.Media.before_delete)
+def _media_deleted(instance):
+    if instance.is_published:
+        feed_files.record(object_session(instance))
+
+@observes(events.Category.after_insert, events.Category.after_update,
+          events.Category.before_delete, events.Podcast.after_insert,
+          events.Podcast.after_update, events.Podcast.before_delete)
+def _feed_source_changed(instance):
+    feed_files.record(object_session(instance))
+
+
+apply_on_commit(feed_files)
@@ -0,0 +1,114 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+"""
+Export of the published catalog as newline delimited JSON
+
+Every line contains one **media_info** dict (see
+:meth:`mediadrop.controllers.api.media.MediaController._info`). The media
+are read in (modified_on, id) order with keyset batches, so only one batch
+is held in memory at any time and incremental exports only need to pass the
+time of the previous export.
+"""
+
+from datetime import datetime
+import urllib
+
+import simplejson
+from webob import Request
+
+from mediadrop.lib.media_info import MediaInfoSerializer
+from mediadrop.lib.paginate import seek_query
+from mediadrop.model.media import Media
+
+__all__ = ['export_lines', 'export_to_file', 'iter_export',
+    'parse_modified_since', 'EXPORT_BATCH_SIZE', 'EXPORT_CONTENT_TYPE']
+
+# number of media loaded from the database at once
+EXPORT_BATCH_SIZE = 500
+
+EXPORT_CONTENT_TYPE = 'application/x-ndjson'
+
+MODIFIED_SINCE_FORMATS = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S',
+    '%Y-%m-%d')
+
+
+def parse_modified_since(value):
+    """Return a datetime for a 'YYYY-MM-DD HH:MM:SS' (or 'YYYY-MM-DD')
+    string or None if the value is invalid."""
+    for format in MODIFIED_SINCE_FORMATS:
+        try:
+            return datetime.strptime(value.strip(), format)
+        except ValueError:
+            continue
+    return None
+
+def iter_export(query, modified_since=None, batch_size=None):
+    """Iterate over the **media_info** dicts of the media of the query in
+    (modified_on, id) order.
+
+    :param query: A :class:`mediadrop.model.media.MediaQuery`.
+    :param modified_since: Only export media which were modified at or
+        after this datetime.
+    :param batch_size: The number of media loaded at once, defaults to
+        :data:`EXPORT_BATCH_SIZE`.
+    """
+    batch_size = batch_size or EXPORT_BATCH_SIZE
+    query = query.order_by(None)
+    if modified_since is not None:
+        query = query.filter(Media.modified_on >= modified_since)
+    order = [(Media.modified_on, False), (Media.id, False)]
+    keys_query = query.with_entities(Media.modified_on, Media.id)
+    serializer = MediaInfoSerializer()
+    last_key = None
+    while True:
+        keys = seek_query(keys_query, order, last_key).limit(batch_size).all()
+        if not keys:
+            break
+        last_key = list(keys[-1])
+        media_ids = [media_id for modified_on, media_id in keys]
+        by_id = dict((media.id, media) for media in
+                     query.filter(Media.id.in_(media_ids)))
+        # media which were deleted in the meantime are skipped
+        batch = [by_id[media_id] for media_id in media_ids if media_id in by_id]
+        for info in serializer.serialize(batch):
+            yield info
+
+def export_lines(query, modified_since=None, batch_size=None):
+    """Iterate over the lines of the export (unicode strings with a
+    trailing newline), see :func:`iter_export`."""
+    for info in iter_export(query, modified_since, batch_size):
+        yield simplejson.dumps(info) + u'\n'
+
+def export_to_file(app, base_url, fileobj, api_key, modified_since=None):
+    """Request the export from the given application and write it to the
+    file.
+
+    :param app: The MediaDrop WSGI application.
+    :param base_url: The URL of the site (including the SCRIPT_NAME), used
+        for all links in the export.
+    :param fileobj: A file-like object opened for writing.
+    :param api_key: The API key of the site.
+    :param modified_since: An optional 'YYYY-MM-DD HH:MM:SS' string.
+    :returns: The number of exported media.
+    """
+    params = dict(api_key=api_key)
+    if modified_since:
+        params['modified_since'] = modified_since
+    url = '/api/media/export?' + urllib.urlencode(params)
+    export_request = Request.blank(url, base_url=base_url)
+    status, headers, app_iter = export_request.call_application(app)
+    try:
+        if not status.startswith('200'):
+            raise ValueError('Export failed: %s' % status)
+        lines = 0
+        for chunk in app_iter:
+            fileobj.write(chunk)
+            lines += chunk.count('\n')
+    finally:
+        if hasattr(app_iter, 'close'):
+            app_iter.close()
+    return lines
@@ -0,0 +1,163 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+"""
+Batch serialization of media for the JSON API
+
+Serializing every media item on its own loads the podcast, the categories
+and the comment count of each item lazily and generates several URLs per
+item with Routes. :class:`MediaInfoSerializer` loads the related data for
+all items of a page with a fixed number of queries and builds the URLs from
+templates which are generated only once per page.
+"""
+
+import urllib
+
+from pylons import config
+from sqlalchemy import orm, sql
+
+from mediadrop.lib.embed_cache import cached_embed_code, players_version
+from mediadrop.lib.thumbnails import thumb_url
+from mediadrop.lib.util import url_for
+from mediadrop.model import Media
+from mediadrop.model.comments import comments
+from mediadrop.model.meta import DBSession
+
+__all__ = ['MediaInfoSerializer']
+
+# Placeholders which are replaced with the actual values in URL templates.
+# Only characters which are not escaped by Routes are used.
+SLUG_PLACEHOLDER = 'MEDIADROP-SLUG'
+PODCAST_SLUG_PLACEHOLDER = 'MEDIADROP-PODCAST-SLUG'
+ID_PLACEHOLDER = 'MEDIADROP-ID'
+
+
+class MediaInfoSerializer(object):
+    """Build **media_info** dicts (see
+    :meth:`mediadrop.controllers.api.media.MediaController._info`) for many
+    media items at once.
+
+    :param include_embed: Include the HTML to embed the player.
+    """
+
+    def __init__(self, include_embed=False):
+        self.include_embed = include_embed
+        self._url_templates = None
+        self._players_version = None
+
+    def serialize(self, media):
+        """Return a list of **media_info** dicts for the given media.
+
+        :param media: A list of :class:`~mediadrop.model.media.Media`
+            instances.
+        :rtype: list
+        """
+        media = list(media)
+        self.prefetch(media)
+        comment_counts = self.published_comment_counts(media)
+        return [self.info(item, comment_counts.get(item.id, 0)) for item in media]
+
+    def prefetch(self, media):
+        """Load the podcasts and categories of all given media items with
+        one query each (and the files if the embed code is included)."""
+        media_ids = [item.id for item in media]
+        if not media_ids:
+            return
+        options = [orm.subqueryload(Media.categories),
+                   orm.subqueryload(Media.podcast)]
+        if self.include_embed:
+            options.append(orm.subqueryload(Media.files))
+        # the already loaded instances are populated by the subqueries
+        Media.query.filter(Media.id.in_(media_ids)).options(*options).all()
+
+    def published_comment_counts(self, media):
+        """Return a dict which maps the media ids to the number of published
+        comments."""
+        media_ids = [item.id for item in media]
+        if not media_ids:
+            return {}
+        query = sql.select([comments.c.media_id, sql.func.count(comments.c.id)],
+            sql.and_(comments.c.media_id.in_(media_ids),
+                     comments.c.publishable == True))\
+            .group_by(comments.c.media_id)
+        return dict(DBSession.execute(query).fetchall())
+
+    def info(self, media, comment_count):
+        """Return the **media_info** dict for a single (prefetched) media
+        item."""
+        podcast_slug = media.podcast_id and media.podcast.slug or None
+        info = dict(
+            id = media.id,
+            slug = media.slug,
+            url = self.media_url(media.slug, podcast_slug),
+            title = media.title,
+            author = media.author.name,
+            type = media.type,
+            podcast = podcast_slug,
+            description = media.description,
+            description_plain = media.description_plain,
+            comment_count = comment_count,
+            publish_on = unicode(media.publish_on),
+            likes = media.likes,
+            views = media.views,
+            thumbs = self.thumbs(media.id),
+            categories = dict((c.slug, c.name) for c in media.categories),
+        )
+        if self.include_embed:
+            info['embed'] = unicode(self.embed_code(media))
+        return info
+
+    def embed_code(self, media):
+        """Return the (cached) embed code, the player configuration is only
+        checked once per serializer."""
+        if self._players_version is None:
+            self._players_version = players_version()
+        return cached_embed_code(media, version=self._players_version)
+
+    # --- URL templates -------------------------------------------------------
+    def url_templates(self):
+        """Return the URL templates for the current request.
+
+        Routes is only called once per serializer, the URLs of the actual
+        media are built by replacing the placeholders.
+        """
+        if self._url_templates is None:
+            thumb_sizes = config['thumb_sizes'][Media._thumb_dir]
+            self._url_templates = dict(
+                media=url_for(controller='/media', action='view',
+                    slug=SLUG_PLACEHOLDER, qualified=True),
+                podcast_media=url_for(controller='/media', action='view',
+                    slug=SLUG_PLACEHOLDER,
+                    podcast_slug=PODCAST_SLUG_PLACEHOLDER, qualified=True),
+                thumbs=dict(
+                    (size, (thumb_url((Media._thumb_dir, ID_PLACEHOLDER),
+                                      size, qualified=True), dimensions))
+                    for size, dimensions in thumb_sizes.iteritems()),
+            )
+        return self._url_templates
+
+    def media_url(self, slug, podcast_slug=None):
+        templates = self.url_templates()
+        if podcast_slug:
+            url = templates['podcast_media'].replace(PODCAST_SLUG_PLACEHOLDER,
+                _quote(podcast_slug))
+        else:
+            url = templates['media']
+        return url.replace(SLUG_PLACEHOLDER, _quote(slug))
+
+    def thumbs(self, media_id):
+        thumbs = {}
+        for size, (template, (width, height)) in \
+                self.url_templates()['thumbs'].iteritems():
+            url = template.replace(ID_PLACEHOLDER, str(media_id))
+            thumbs[size] = dict(url=url, x=width, y=height)
+        return thumbs
+
+
+def _quote(value):
+    if isinstance(value, unicode):
+        value = value.encode('utf-8')
+    return urllib.quote(value)
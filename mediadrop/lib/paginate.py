@@ -5,10 +5,16 @@
 # (at your option) any later version.
 # See LICENSE.txt in the main project directory, for more information.
 
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
 import inspect
 import warnings
 
+import simplejson
 from pylons import request, tmpl_context
+from sqlalchemy import orm, sql
+from sqlalchemy.sql import operators
+from sqlalchemy.types import DateTime, Integer
 from webhelpers.paginate import get_wrapper
 from webob.multidict import MultiDict
 from webhelpers.paginate import Page
@@ -83,7 +89,8 @@ def partial(*args, **create_time_kwds):
         return func(*args, **kwds)
     return curried_function
 
-def paginate(name, items_per_page=10, use_prefix=False, items_first_page=None):
+def paginate(name, items_per_page=10, use_prefix=False, items_first_page=None,
+             seek=False):
     """Paginate a given collection.
 
     Duplicates and extends the functionality of :func:`tg.decorators.paginate` to:
@@ -91,7 +98,7 @@ def paginate(name, items_per_page=10, use_prefix=False, items_first_page=None):
         * Copy the docstring of the exposed method to the decorator, allowing
           :mod:`sphinx.ext.autodoc` to read docstring.
         * Support our :class:`CustomPage` extension -- used any time
-          ``items_first_page`` is provided.
+          ``items_first_page`` is provided or ``seek`` is enabled.
 
     This decorator is mainly exposing the functionality
     of :func:`webhelpers.paginate`.
@@ -129,6 +136,10 @@ def paginate(name, items_per_page=10, use_prefix=False, items_first_page=None):
       items_first_page
         the number of items to be rendered on the first page. Defaults to the
         value of ``items_per_page``
+      seek
+        if True, the links to the previous and next page contain a cursor
+        so these pages are fetched with keyset pagination instead of an
+        OFFSET (see :class:`CustomPage`).
 
     """
     prefix = ""
@@ -138,6 +149,9 @@ def paginate(name, items_per_page=10, use_prefix=False, items_first_page=None):
         page="%spage" % prefix,
         items_per_page="%sitems_per_page" % prefix
         )
+    if seek:
+        own_parameters.update(after="%safter" % prefix,
+            before="%sbefore" % prefix)
     #@decorator
     def _d(f):
         @wraps(f)
@@ -147,6 +161,14 @@ def paginate(name, items_per_page=10, use_prefix=False, items_first_page=None):
                     kwargs.pop(
                             own_parameters['items_per_page'],
                             items_per_page))
+            cursors = {}
+            if seek:
+                cursors = dict(
+                    after=kwargs.pop(own_parameters['after'], None),
+                    before=kwargs.pop(own_parameters['before'], None),
+                    after_param=own_parameters['after'],
+                    before_param=own_parameters['before'],
+                )
 
             # Iterate over all of the named arguments expected by the function f
             # if any of those arguments have values present in the kwargs dict,
@@ -170,24 +192,24 @@ def paginate(name, items_per_page=10, use_prefix=False, items_first_page=None):
             if isinstance(res, dict) and name in res:
                 additional_parameters = MultiDict()
                 for key, value in request.params.iteritems():
-                    if key not in own_parameters:
+                    if key not in own_parameters.values():
                         additional_parameters.add(key, value)
 
                 collection = res[name]
 
-                # Use CustomPage if our extra custom arg was provided
-                if items_first_page is not None:
+                page_args = additional_parameters.dict_of_lists()
+                page_args.update(items_per_page=real_items_per_page,
+                    items_first_page=items_first_page)
+                # Use CustomPage if our extra custom args were provided
+                if seek:
+                    page_class = CustomPage
+                    page_args.update(seek=True, **cursors)
+                elif items_first_page is not None:
                     page_class = CustomPage
                 else:
                     page_class = Page
 
-                page = page_class(
-                    collection,
-                    page,
-                    items_per_page=real_items_per_page,
-                    items_first_page=items_first_page,
-                    **additional_parameters.dict_of_lists()
-                    )
+                page = page_class(collection, page, **page_args)
                 # wrap the pager so that it will render
                 # the proper page-parameter
                 page.pager = partial(page.pager,
@@ -206,6 +228,135 @@ def paginate(name, items_per_page=10, use_prefix=False, items_first_page=None):
     return _d
 
 
+# --- keyset pagination --------------------------------------------------------
+# Deep pages of a listing are expensive with OFFSET because the database has
+# to skip all preceding rows. Keyset ("seek") pagination fetches the rows
+# following the last item of the previous page instead, e.g.
+#     WHERE publish_on < :last_publish_on
+#        OR (publish_on = :last_publish_on AND id < :last_id)
+# which can use an index on the ordered columns. The values of the last item
+# are passed around as an opaque cursor token.
+
+CURSOR_DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+def seek_order(query):
+    """Return the ordering of the given query as a list of
+    (column, descending) tuples which is suitable for keyset pagination.
+
+    The primary key is appended so the ordering is unambiguous.
+
+    :param query: A :class:`sqlalchemy.orm.Query` for a single mapped class.
+    :returns: A list or None if the query is not ordered by plain columns of
+        the mapped class (e.g. by search relevance).
+    """
+    criteria = getattr(query, '_order_by', None)
+    if not criteria:
+        return None
+    mapper = query._mapper_zero()
+    order = []
+    for criterion in criteria:
+        descending = False
+        if isinstance(criterion, sql.expression._UnaryExpression):
+            if criterion.modifier not in (operators.asc_op, operators.desc_op):
+                return None
+            descending = (criterion.modifier is operators.desc_op)
+            criterion = criterion.element
+        try:
+            mapper.get_property_by_column(criterion)
+        except orm.exc.UnmappedColumnError:
+            return None
+        order.append((criterion, descending))
+    order_keys = [_property_key(mapper, column) for column, descending in order]
+    for column in mapper.primary_key:
+        if _property_key(mapper, column) not in order_keys:
+            order.append((column, order[-1][1]))
+    return order
+
+def _property_key(mapper, column):
+    return mapper.get_property_by_column(column).key
+
+def seek_query(query, order, values=None, reverse=False):
+    """Order the query by the given columns and only return rows after the
+    given values.
+
+    :param query: A :class:`sqlalchemy.orm.Query`.
+    :param order: A list of (column, descending) tuples, see
+        :func:`seek_order`.
+    :param values: The values of the ordered columns of the last row of the
+        previous page. If None the query starts with the first row.
+    :param reverse: Return the rows before the given values instead (in
+        reverse order).
+    :returns: A :class:`sqlalchemy.orm.Query`.
+    """
+    if values is not None:
+        conditions = []
+        for i, (column, descending) in enumerate(order):
+            if descending != reverse:
+                condition = column < values[i]
+            else:
+                condition = column > values[i]
+            equal = [c == v for (c, d), v in zip(order[:i], values[:i])]
+            conditions.append(sql.and_(*(equal + [condition])))
+        query = query.filter(sql.or_(*conditions))
+    order_by = []
+    for column, descending in order:
+        if descending != reverse:
+            order_by.append(column.desc())
+        else:
+            order_by.append(column.asc())
+    return query.order_by(None).order_by(*order_by)
+
+def seek_values(item, order):
+    """Return the values of the ordered columns for the given item."""
+    mapper = orm.object_mapper(item)
+    return [getattr(item, _property_key(mapper, column))
+            for column, descending in order]
+
+def encode_cursor(values):
+    """Return an opaque (URL-safe) cursor token for the given values."""
+    values = [isinstance(value, datetime) and
+              value.strftime(CURSOR_DATETIME_FORMAT) or value
+              for value in values]
+    return urlsafe_b64encode(simplejson.dumps(values)).rstrip('=')
+
+def decode_cursor(token, order):
+    """Return the values of the given cursor token.
+
+    :param token: A token created by :func:`encode_cursor`.
+    :param order: The ordering the cursor was created for.
+    :returns: A list of values or None if the token is invalid.
+    """
+    try:
+        token = str(token)
+        values = simplejson.loads(urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        if not isinstance(values, list) or len(values) != len(order):
+            return None
+        for i, (column, descending) in enumerate(order):
+            if values[i] is None:
+                return None
+            if isinstance(column.type, DateTime):
+                values[i] = datetime.strptime(values[i], CURSOR_DATETIME_FORMAT)
+            elif isinstance(column.type, Integer):
+                if not isinstance(values[i], (int, long)):
+                    return None
+            elif not isinstance(values[i], (int, long, float, basestring)):
+                return None
+        return values
+    except (TypeError, ValueError, UnicodeError):
+        return None
+
+def _seekable(collection):
+    # Returns the query of a collection and a function which wraps a query
+    # like the collection (e.g. in a QueryResultProxy with the same filter).
+    if hasattr(collection, 'with_query'):
+        if not collection.has_filter:
+            return collection.query, lambda query: query
+        return collection.query, collection.with_query
+    if isinstance(collection, orm.Query):
+        return collection, lambda query: query
+    return None, None
+
+
 class CustomPage(Page):
     """A list/iterator of items representing one page in a larger
     collection.
@@ -263,7 +414,9 @@ class CustomPage(Page):
     """
     def __init__(self, collection, page=1, items_per_page=20,
         items_first_page=None,
-        item_count=None, sqlalchemy_session=None, *args, **kwargs):
+        item_count=None, sqlalchemy_session=None, seek=False, after=None,
+        before=None, after_param='after', before_param='before',
+        *args, **kwargs):
         """Create a "Page" instance.
 
         Parameters:
@@ -291,6 +444,21 @@ class CustomPage(Page):
             Select objects do not have a database connection attached so it
             would not be able to execute the SELECT query.
 
+        seek (optional)
+            Use keyset pagination if the collection is an SQLAlchemy
+            ORM-query (or a QueryResultProxy) which is ordered by columns of
+            the mapped class. The collection is ordered by the primary key
+            as well so the order is unambiguous.
+
+        after, before (optional)
+            Cursor tokens (see :meth:`cursor_args`) of the previous/next
+            page. The items of the requested page are fetched with keyset
+            pagination then. Without a (valid) cursor the page is fetched
+            with an OFFSET.
+
+        after_param, before_param (optional)
+            The names of the link arguments for the cursors.
+
         Further keyword arguments are used as link arguments in the pager().
         """
         # 'page_nr' is deprecated.
@@ -311,6 +479,17 @@ class CustomPage(Page):
         # Save a reference to the collection
         self.original_collection = collection
 
+        self.seek_order = None
+        self.after_param = after_param
+        self.before_param = before_param
+        if seek:
+            query, wrap = _seekable(collection)
+            order = (query is not None) and seek_order(query)
+            if order:
+                self.seek_order = order
+                self._seek_query, self._seek_wrap = query, wrap
+                collection = wrap(seek_query(query, order))
+
         # Decorate the ORM/sequence object with __getitem__ and __len__
         # functions to be able to get slices.
         if collection:
@@ -325,6 +504,7 @@ class CustomPage(Page):
             self.page = int(page) # make it int() if we get it as a string
         except ValueError:
             self.page = 1
+        requested_page = self.page
 
         self.items_per_page = items_per_page
         self.items_first_page = items_first_page # Adddddd
@@ -378,7 +558,11 @@ class CustomPage(Page):
             # We use list() so that the items on the current page are retrieved
             # only once. Otherwise it would run the actual SQL query everytime
             # .items would be accessed.
-            self.items = list(self.collection[self.first_item-1:self.last_item])
+            self.items = None
+            if self.seek_order and self.page == requested_page:
+                self.items = self._seek_items(after, before)
+            if self.items is None:
+                self.items = list(self.collection[self.first_item-1:self.last_item])
 
             # Links to previous and next page
             if self.page > self.first_page:
@@ -405,3 +589,40 @@ class CustomPage(Page):
         # This is a subclass of the 'list' type. Initialise the list now.
         list.__init__(self, self.items)
 
+    def _seek_items(self, after, before):
+        if after:
+            token, reverse = after, False
+        elif before:
+            token, reverse = before, True
+        else:
+            return None
+        values = decode_cursor(token, self.seek_order)
+        if values is None:
+            return None
+        query = seek_query(self._seek_query, self.seek_order, values,
+            reverse=reverse)
+        number_of_items = self.last_item - self.first_item + 1
+        items = list(self._seek_wrap(query).limit(number_of_items))
+        if reverse:
+            items.reverse()
+        return items
+
+    def cursor_args(self, page):
+        """Return the link arguments for the given page which let the next
+        request use keyset pagination.
+
+        Only the previous and the next page can be fetched this way, links
+        to all other pages fall back to an OFFSET.
+
+        :param page: A page number.
+        :rtype: dict
+        """
+        if not (self.seek_order and self.items):
+            return {}
+        if page == self.next_page:
+            values = seek_values(self.items[-1], self.seek_order)
+            return {self.after_param: encode_cursor(values)}
+        if page == self.previous_page:
+            values = seek_values(self.items[0], self.seek_order)
+            return {self.before_param: encode_cursor(values)}
+        return {}
@@ -0,0 +1,134 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+"""
+Bulk (re)computation of the media popularity scores
+
+:meth:`mediadrop.model.media.Media.update_popularity` only runs when a
+media item is liked, disliked or edited. Scores of media which became
+published because their ``publish_on`` date was reached (or which were
+unpublished by ``publish_until``) and scores computed with previous decay
+settings are only fixed by recomputing them here.
+
+The functions work on a plain connection and read the decay settings from
+the database so they can be used outside of a request (see
+``batch-scripts/update_popularity.py``).
+"""
+
+from datetime import datetime
+
+from sqlalchemy import sql
+
+from mediadrop.lib.util import calculate_popularity
+from mediadrop.model.media import media as media_table
+from mediadrop.model.settings import settings as settings_table
+
+__all__ = ['popularity_settings', 'update_popularity', 'recompute_popularity']
+
+# number of media loaded/updated at once
+BATCH_SIZE = 1000
+
+POPULARITY_COLUMNS = ('popularity_points', 'popularity_likes',
+    'popularity_dislikes')
+
+
+def popularity_settings(connection):
+    """Return the decay exponent and lifetime (in hours) from the settings.
+
+    :rtype: tuple
+    """
+    select = sql.select([settings_table.c.key, settings_table.c.value],
+        settings_table.c.key.in_([u'popularity_decay_exponent',
+                                  u'popularity_decay_lifetime']))
+    values = dict(connection.execute(select).fetchall())
+    return (int(values[u'popularity_decay_exponent']),
+            int(values[u'popularity_decay_lifetime']))
+
+def _is_published(row, now):
+    return row.reviewed and row.encoded and row.publishable and \
+        row.publish_on is not None and row.publish_on <= now and \
+        (row.publish_until is None or row.publish_until >= now)
+
+def _select_media(whereclause):
+    c = media_table.c
+    return sql.select([c.id, c.reviewed, c.encoded, c.publishable,
+        c.publish_on, c.publish_until, c.likes, c.dislikes,
+        c.popularity_points, c.popularity_likes, c.popularity_dislikes],
+        whereclause)
+
+def _update_scores(connection, rows, decay, now):
+    log_base, base_life_hours = decay
+    changes = []
+    for row in rows:
+        if _is_published(row, now):
+            scores = [calculate_popularity(row.publish_on, score,
+                          log_base, base_life_hours)
+                      for score in (row.likes - row.dislikes, row.likes,
+                                    row.dislikes)]
+        else:
+            scores = [0, 0, 0]
+        current = [row.popularity_points, row.popularity_likes,
+                   row.popularity_dislikes]
+        if scores != current:
+            values = dict(zip(POPULARITY_COLUMNS, scores))
+            values['media_id'] = row.id
+            changes.append(values)
+    if changes:
+        update = media_table.update()\
+            .where(media_table.c.id == sql.bindparam('media_id'))\
+            .values(dict((name, sql.bindparam(name))
+                         for name in POPULARITY_COLUMNS))
+        connection.execute(update, changes)
+    return len(changes)
+
+def update_popularity(connection, media_ids, decay=None, now=None):
+    """Recompute the popularity scores of the given media.
+
+    Only rows whose scores actually change are updated, all of them with
+    a single (executemany) UPDATE statement.
+
+    :param connection: A :class:`sqlalchemy.engine.base.Connection`.
+    :param media_ids: A list of media ids.
+    :param decay: A (decay exponent, decay lifetime in hours) tuple,
+        defaults to the values returned by :func:`popularity_settings`.
+    :param now: The time which decides if media is published.
+    :returns: The number of updated media.
+    """
+    if not media_ids:
+        return 0
+    if decay is None:
+        decay = popularity_settings(connection)
+    if now is None:
+        now = datetime.now()
+    select = _select_media(media_table.c.id.in_(media_ids))
+    return _update_scores(connection, connection.execute(select).fetchall(),
+        decay, now)
+
+def recompute_popularity(connection, decay=None, batch_size=BATCH_SIZE,
+                         progress=None):
+    """Recompute the popularity scores of all media.
+
+    :param progress: An optional callable which is passed the number of
+        processed media after every batch.
+    :returns: The number of updated media.
+    """
+    if decay is None:
+        decay = popularity_settings(connection)
+    now = datetime.now()
+    updated = processed = 0
+    last_id = 0
+    while True:
+        select = _select_media(media_table.c.id > last_id)\
+            .order_by(media_table.c.id).limit(batch_size)
+        rows = connection.execute(select).fetchall()
+        if not rows:
+            break
+        updated += _update_scores(connection, rows, decay, now)
+        processed += len(rows)
+        last_id = rows[-1].id
+        if progress is not None:
+            progress(processed)
+    return updated
@@ -0,0 +1,137 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+"""
+Random media selection without ORDER BY RANDOM()
+
+Every process keeps a compact array with the ids of all published media.
+Random candidates are drawn from that array and then loaded with the
+caller's query so filters (and permission checks) still apply. The array
+is rebuilt when the catalog version changes (media was published,
+unpublished or deleted) and after ``RANDOM_MEDIA_EXPIRE`` seconds so media
+published by reaching their ``publish_on`` date are found as well.
+"""
+
+from array import array
+from datetime import datetime
+import random
+import threading
+import time
+
+from sqlalchemy import sql
+
+from mediadrop.model.catalog import current_catalog_version
+from mediadrop.model.media import Media, media as media_table
+from mediadrop.model.meta import DBSession
+
+__all__ = ['random_media', 'random_media_sampler', 'RandomMediaSampler']
+
+# seconds until the id array is rebuilt even if the catalog did not change
+RANDOM_MEDIA_EXPIRE = 300
+# number of rounds to find matching media before falling back to the
+# database (ORDER BY RANDOM())
+RANDOM_ATTEMPTS = 3
+# number of candidates drawn per requested media item
+OVERSAMPLING = 4
+
+
+class RandomMediaSampler(object):
+    """Draw random ids from an in-memory array of published media ids."""
+
+    def __init__(self):
+        self._media_ids = array('l')
+        self._version = None
+        self._built_on = None
+        self._lock = threading.Lock()
+
+    def _is_outdated(self, version):
+        return self._version != version or \
+            self._built_on + RANDOM_MEDIA_EXPIRE < time.time()
+
+    def media_ids(self, connection=None):
+        """Return the (current) array of published media ids."""
+        if connection is None:
+            connection = DBSession.connection()
+        version = current_catalog_version(connection)
+        if self._is_outdated(version):
+            self.rebuild(connection, version)
+        return self._media_ids
+
+    def rebuild(self, connection, version=None):
+        if version is None:
+            version = current_catalog_version(connection)
+        now = datetime.now()
+        c = media_table.c
+        select = sql.select([c.id], sql.and_(
+            c.reviewed == True,
+            c.encoded == True,
+            c.publishable == True,
+            c.publish_on <= now,
+            sql.or_(c.publish_until == None, c.publish_until >= now),
+        ))
+        media_ids = array('l', (row[0] for row in connection.execute(select)))
+        with self._lock:
+            self._media_ids = media_ids
+            self._version = version
+            self._built_on = time.time()
+
+    def sample(self, n, connection=None):
+        """Return up to ``n`` distinct random media ids."""
+        media_ids = self.media_ids(connection)
+        if n >= len(media_ids):
+            sample = list(media_ids)
+            random.shuffle(sample)
+            return sample
+        # random.sample() picks by index, so this does not depend on the
+        # number of published media.
+        return random.sample(media_ids, n)
+
+random_media_sampler = RandomMediaSampler()
+
+
+def random_media(query, count=1, restrict=None, sampler=None):
+    """Return up to ``count`` random media items which match the query.
+
+    Candidates are drawn from the published media ids and loaded with
+    ``query`` so its filters still apply. Rejected candidates are replaced
+    by new ones a few times, then the remaining items are selected by the
+    database with ORDER BY RANDOM() (only if the query is very selective).
+
+    :param query: A :class:`mediadrop.model.media.MediaQuery`. Media which
+        are not published are never returned.
+    :param restrict: An optional callable which is passed the query for
+        the candidates and returns a query (or query proxy) for the allowed
+        media, e.g. :func:`mediadrop.lib.auth.util.viewable_media`.
+    :rtype: list
+    """
+    if sampler is None:
+        sampler = random_media_sampler
+    restrict = restrict or (lambda query: query)
+    # the id array may contain media which were unpublished by their
+    # 'publish_until' date recently
+    query = query.published()
+    found = []
+    seen = set()
+    for attempt in range(RANDOM_ATTEMPTS):
+        needed = count - len(found)
+        candidates = [media_id for media_id in
+            sampler.sample(len(seen) + needed * OVERSAMPLING)
+            if media_id not in seen]
+        if not candidates:
+            return found
+        seen.update(candidates)
+        loaded = restrict(query.filter(Media.id.in_(candidates)))
+        by_id = dict((media.id, media) for media in loaded)
+        found.extend(by_id[media_id] for media_id in candidates
+                     if media_id in by_id)
+        if len(found) >= count:
+            return found[:count]
+
+    remaining = query.order_by(sql.func.random())
+    if seen:
+        remaining = remaining.filter(sql.not_(Media.id.in_(seen)))
+    found.extend(restrict(remaining).limit(count - len(found)))
+    return found[:count]
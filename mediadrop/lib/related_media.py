@@ -0,0 +1,203 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+"""
+Precomputed related media lists
+
+Finding related media with a full text search on every page view is
+expensive so the best matches of every media item are stored in the
+``media_related`` table. :meth:`mediadrop.model.media.MediaQuery.related`
+reads from that table and only uses a live query for media which were not
+computed yet (``media_related_status``).
+
+The lists are updated when a media item is created or its title, tags or
+categories change. Like the search index (see
+:mod:`mediadrop.lib.search.indexer`) the ids of changed media are collected
+per session and every list is computed once when the session commits. The
+changed item is also offered to its new neighbours so their lists stay
+current without recomputing everything. Use
+``batch-scripts/update_related_media.py`` to (re)compute all lists.
+"""
+
+from datetime import datetime
+
+from sqlalchemy import sql
+from sqlalchemy.orm import object_session
+
+from mediadrop.lib.compat import defaultdict
+from mediadrop.lib.search import search_backend
+from mediadrop.model.media import (media, media_categories, media_related,
+    media_related_status, media_tags, Media)
+from mediadrop.model.meta import (apply_on_commit, attributes_changed,
+    SessionChanges)
+from mediadrop.plugin import events
+from mediadrop.plugin.events import observes
+
+__all__ = ['compute_related_media', 'remove_related_media',
+    'update_related_media']
+
+# maximum number of related media stored per media item, more than shown on
+# the page because unpublished/restricted media are only filtered later
+RELATED_LIMIT = 24
+# score per shared tag/category
+TAG_WEIGHT = 2.0
+CATEGORY_WEIGHT = 1.0
+# score for the best text match, it decreases linearly for the other matches
+TEXT_WEIGHT = 3.0
+TEXT_CANDIDATES = 50
+
+# changes to these attributes require a recomputation
+RELATED_ATTRIBUTES = ('title', 'tags', 'categories')
+
+
+def compute_related_media(connection, media_id, title, tag_ids, category_ids):
+    """Return a dict which maps related media ids to their score.
+
+    The score is based on the number of shared tags and categories plus
+    the text similarity of the titles (if the search backend ranks its
+    results).
+
+    :param connection: A :class:`sqlalchemy.engine.base.Connection`.
+    :param media_id: The id of the media item.
+    :param title: The media title.
+    :param tag_ids: A list of tag ids of the media item.
+    :param category_ids: A list of category ids of the media item.
+    """
+    scores = defaultdict(float)
+    overlaps = (
+        (media_tags.c.media_id, media_tags.c.tag_id, tag_ids, TAG_WEIGHT),
+        (media_categories.c.media_id, media_categories.c.category_id,
+            category_ids, CATEGORY_WEIGHT),
+    )
+    for media_col, fk_col, ids, weight in overlaps:
+        if not ids:
+            continue
+        select = sql.select([media_col, sql.func.count(fk_col)], sql.and_(
+            fk_col.in_(ids),
+            media_col != media_id,
+        )).group_by(media_col)
+        for related_id, shared in connection.execute(select):
+            scores[related_id] += weight * shared
+
+    if title and search_backend(connection).ranks_results:
+        query = Media.query.filter(Media.id != media_id).search(title)
+        for rank, (related_id, ) in enumerate(query.limit(TEXT_CANDIDATES).values(Media.id)):
+            scores[related_id] += TEXT_WEIGHT * (TEXT_CANDIDATES - rank) / TEXT_CANDIDATES
+    return scores
+
+def _store_related_media(connection, media_id, scores):
+    best = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+    connection.execute(media_related.delete().\
+        where(media_related.c.media_id == media_id))
+    if best:
+        connection.execute(media_related.insert(), [
+            {'media_id': media_id, 'related_id': related_id, 'score': score}
+            for related_id, score in best[:RELATED_LIMIT]
+        ])
+    connection.execute(media_related_status.delete().\
+        where(media_related_status.c.media_id == media_id))
+    connection.execute(media_related_status.insert().\
+        values(media_id=media_id, computed_on=datetime.now()))
+    return best[:RELATED_LIMIT]
+
+def _offer_related_media(connection, media_id, related_id, score):
+    """Add ``related_id`` to the list of ``media_id`` if it scores high enough."""
+    connection.execute(media_related.delete().where(sql.and_(
+        media_related.c.media_id == media_id,
+        media_related.c.related_id == related_id,
+    )))
+    connection.execute(media_related.insert().values(
+        media_id=media_id, related_id=related_id, score=score))
+    surplus = sql.select([media_related.c.related_id],
+        media_related.c.media_id == media_id,
+    ).order_by(media_related.c.score.desc(), media_related.c.related_id).\
+        offset(RELATED_LIMIT)
+    surplus_ids = [row[0] for row in connection.execute(surplus)]
+    if surplus_ids:
+        connection.execute(media_related.delete().where(sql.and_(
+            media_related.c.media_id == media_id,
+            media_related.c.related_id.in_(surplus_ids),
+        )))
+
+def update_related_media(connection, media_ids, update_neighbours=False):
+    """Recompute the related media lists for the given media ids.
+
+    :param connection: A :class:`sqlalchemy.engine.base.Connection`.
+    :param media_ids: A list of media ids.
+    :param update_neighbours: Also add the updated media to the lists of
+        their related media (and remove them from outdated lists). This is
+        not necessary if all lists are recomputed anyway.
+    """
+    if not media_ids:
+        return
+    titles = dict(connection.execute(sql.select([media.c.id, media.c.title],
+        media.c.id.in_(media_ids))).fetchall())
+    tag_ids = defaultdict(list)
+    for media_id, tag_id in connection.execute(sql.select(
+            [media_tags.c.media_id, media_tags.c.tag_id],
+            media_tags.c.media_id.in_(media_ids))):
+        tag_ids[media_id].append(tag_id)
+    category_ids = defaultdict(list)
+    for media_id, category_id in connection.execute(sql.select(
+            [media_categories.c.media_id, media_categories.c.category_id],
+            media_categories.c.media_id.in_(media_ids))):
+        category_ids[media_id].append(category_id)
+
+    for media_id, title in titles.items():
+        scores = compute_related_media(connection, media_id, title,
+            tag_ids[media_id], category_ids[media_id])
+        _update(connection, media_id, scores, update_neighbours)
+
+def _update(connection, media_id, scores, update_neighbours):
+    if update_neighbours:
+        connection.execute(media_related.delete().\
+            where(media_related.c.related_id == media_id))
+    best = _store_related_media(connection, media_id, scores)
+    if update_neighbours:
+        for related_id, score in best:
+            _offer_related_media(connection, related_id, media_id, score)
+
+def remove_related_media(connection, media_id):
+    """Remove the given media from all related media lists."""
+    connection.execute(media_related.delete().where(sql.or_(
+        media_related.c.media_id == media_id,
+        media_related.c.related_id == media_id,
+    )))
+    connection.execute(media_related_status.delete().\
+        where(media_related_status.c.media_id == media_id))
+
+
+class RelatedMediaUpdater(SessionChanges):
+    """Collect changed media per session and update their lists on commit."""
+
+    def media_changed(self, session, media_ids):
+        if session is not None:
+            self._changes.setdefault(session, set()).update(media_ids)
+
+    def apply_changes(self, session, media_ids):
+        update_related_media(session.connection(), sorted(media_ids),
+            update_neighbours=True)
+
+related_media_updater = RelatedMediaUpdater()
+
+
+@observes(events.Media.after_insert)
+def _compute_for_new_media(instance):
+    related_media_updater.media_changed(object_session(instance), [instance.id])
+
+@observes(events.Media.after_update)
+def _recompute_for_changed_media(instance):
+    if attributes_changed(instance, RELATED_ATTRIBUTES):
+        related_media_updater.media_changed(object_session(instance),
+            [instance.id])
+
+@observes(events.Media.before_delete)
+def _remove_deleted_media(instance):
+    # the lists reference the media row so this can not wait for the commit
+    remove_related_media(object_session(instance).connection(), instance.id)
+
+
+apply_on_commit(related_media_updater, before_commit=True)
@@ -0,0 +1,20 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+
+from mediadrop.lib.search.api import *
+
+from mediadrop.lib.search.like import LikeSearch
+from mediadrop.lib.search.mysql import MySQLFullTextSearch
+from mediadrop.lib.search.inverted_index import InvertedIndexSearch
+from mediadrop.lib.search.postgresql import PostgreSQLFullTextSearch
+
+from mediadrop.lib.search.capabilities import (search_capabilities,
+    SearchCapabilities, SearchCapabilityRegistry)
+from mediadrop.lib.search.indexer import (search_indexer, update_search_index,
+    SearchIndexer)
+from mediadrop.lib.search.suggest import (suggestions, PrefixIndex,
+    SuggestionIndex)
@@ -0,0 +1,307 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+
+import logging
+import re
+
+from pylons import config
+from sqlalchemy import sql
+
+from mediadrop.lib.compat import defaultdict
+from mediadrop.model.categories import categories
+from mediadrop.model.media import (media, media_categories, media_tags,
+    _fulltext_indexes)
+from mediadrop.model.meta import DBSession
+from mediadrop.model.search import TERM_LENGTH
+from mediadrop.model.tags import tags
+from mediadrop.plugin import events
+from mediadrop.plugin.abc import (AbstractClass, abstractmethod,
+    abstractproperty)
+from mediadrop.plugin.events import observes
+
+__all__ = ['backend_instance', 'iter_searchable_fields',
+    'load_searchable_fields', 'parse_search_query', 'search_backend',
+    'tokenize', 'SearchBackend', 'SearchTerm', 'PUBLIC_FIELDS',
+    'SEARCHABLE_FIELDS',
+]
+
+log = logging.getLogger(__name__)
+
+MIN_WORD_LENGTH = 2
+
+# Fields which are passed to the search backends (see load_searchable_fields).
+# Not every backend uses all of them (e.g. only MySQL stores the author).
+SEARCHABLE_FIELDS = ('title', 'subtitle', 'description_plain', 'notes',
+    'author_name', 'tags', 'categories')
+
+# Same fields as the public MySQL FULLTEXT index (everything but the notes).
+PUBLIC_FIELDS = frozenset(col.name for col in _fulltext_indexes['public'])
+
+STOPWORDS = frozenset(u"""
+    a an and are as at be but by for from has have in is it its of on or
+    that the this to was were will with
+""".split())
+
+_word_pattern = re.compile(r'\w+', re.UNICODE)
+_query_pattern = re.compile(r'([+\-]?)(?:"([^"]*)"?|([^\s"]+))', re.UNICODE)
+
+
+def tokenize(text):
+    """Split the given text into a list of normalized, indexable words.
+
+    Words are lowercased, very short words and common english stopwords
+    are dropped and overly long words are truncated so they fit into the
+    index.
+
+    :param text: A unicode string or None.
+    :rtype: list of unicode strings, in the order they appear in the text.
+    """
+    if not text:
+        return []
+    words = []
+    for word in _word_pattern.findall(text.lower()):
+        if len(word) < MIN_WORD_LENGTH or word in STOPWORDS:
+            continue
+        words.append(word[:TERM_LENGTH])
+    return words
+
+
+def _names_by_media(connection, media_col, fk_col, table, media_ids):
+    names = defaultdict(list)
+    select = sql.select([media_col, table.c.name], sql.and_(
+        fk_col == table.c.id,
+        media_col.in_(media_ids),
+    )).order_by(table.c.name)
+    for media_id, name in connection.execute(select):
+        names[media_id].append(name)
+    return names
+
+def load_searchable_fields(connection, media_ids):
+    """Return the searchable text of the given media.
+
+    The fields are fetched with plain SQL so (re)indexing does not need to
+    load the media through the ORM. Tags and categories are given as a
+    comma separated string of their names. Unknown media ids are ignored.
+
+    :param connection: A :class:`sqlalchemy.engine.base.Connection`.
+    :param media_ids: A list of media ids.
+    :returns: A dict which maps media ids to a dict of their fields (the
+        keys are the names from :attr:`SEARCHABLE_FIELDS`).
+    """
+    if not media_ids:
+        return {}
+    text_columns = [media.c.title, media.c.subtitle,
+        media.c.description_plain, media.c.notes, media.c.author_name]
+    select = sql.select([media.c.id] + text_columns, media.c.id.in_(media_ids))
+    rows = connection.execute(select).fetchall()
+    if not rows:
+        return {}
+    tag_names = _names_by_media(connection, media_tags.c.media_id,
+        media_tags.c.tag_id, tags, media_ids)
+    category_names = _names_by_media(connection,
+        media_categories.c.media_id, media_categories.c.category_id,
+        categories, media_ids)
+
+    documents = {}
+    for row in rows:
+        media_id = row[0]
+        fields = dict((col.name, row[col.name]) for col in text_columns)
+        fields['tags'] = u', '.join(tag_names[media_id])
+        fields['categories'] = u', '.join(category_names[media_id])
+        documents[media_id] = fields
+    return documents
+
+def iter_searchable_fields(connection, batch_size=500):
+    """Yield the searchable text of all media in batches.
+
+    :param connection: A :class:`sqlalchemy.engine.base.Connection`.
+    :param batch_size: The maximum number of media per batch.
+    :returns: An iterator of dicts as returned by
+        :func:`load_searchable_fields`.
+    """
+    last_id = 0
+    while True:
+        select = sql.select([media.c.id], media.c.id > last_id).\
+            order_by(media.c.id).limit(batch_size)
+        media_ids = [row[0] for row in connection.execute(select)]
+        if not media_ids:
+            break
+        yield load_searchable_fields(connection, media_ids)
+        last_id = media_ids[-1]
+
+
+class SearchTerm(object):
+    """A single word from a parsed search query."""
+
+    def __init__(self, word, required=False, excluded=False, prefix=False):
+        self.word = word
+        self.required = required
+        self.excluded = excluded
+        self.prefix = prefix
+
+    def __eq__(self, other):
+        return isinstance(other, SearchTerm) and \
+            (self.word, self.required, self.excluded, self.prefix) == \
+            (other.word, other.required, other.excluded, other.prefix)
+
+    def __ne__(self, other):
+        return not (self == other)
+
+    def __repr__(self):
+        return 'SearchTerm(%r, required=%r, excluded=%r, prefix=%r)' % \
+            (self.word, self.required, self.excluded, self.prefix)
+
+
+def parse_search_query(search, bool=False):
+    """Parse the user's search string into a list of :class:`SearchTerm`.
+
+    In natural language mode every word is optional. In boolean mode the
+    subset of the MySQL boolean syntax that makes sense for a word index
+    is understood: ``+word`` (required), ``-word`` (excluded), ``word*``
+    (prefix match) and ``"some phrase"`` (all words get the operator of
+    the phrase). Other MySQL operators are ignored.
+
+    :param search: The search string as entered by the user.
+    :param bool: Interpret operators as in MySQL's boolean mode.
+    :rtype: list of :class:`SearchTerm`
+    """
+    terms = []
+    seen = set()
+    for operator, phrase, word in _query_pattern.findall(search or u''):
+        text = phrase or word
+        prefix = False
+        if not bool:
+            operator = u''
+        elif word and word.endswith(u'*'):
+            prefix = True
+        for token in tokenize(text):
+            term = SearchTerm(token,
+                required=(operator == u'+'),
+                excluded=(operator == u'-'),
+                prefix=prefix,
+            )
+            key = (term.word, term.required, term.excluded, term.prefix)
+            if key not in seen:
+                seen.add(key)
+                terms.append(term)
+    return terms
+
+
+class SearchBackend(AbstractClass):
+    """
+    Base class for all search backends.
+
+    A backend turns the user's search string into filter (and ordering)
+    criteria for a :class:`mediadrop.model.media.MediaQuery`. Backends
+    which keep their own index are notified about changed media via
+    :meth:`index_media` and :meth:`remove_media` (see
+    :mod:`mediadrop.lib.search.indexer`).
+    """
+
+    name = abstractproperty()
+    """A unique identifying string, used for the ``search_backend`` setting."""
+
+    priority = 0
+    """Backends with a higher priority are preferred by :func:`search_backend`."""
+
+    ranks_results = True
+    """A flag that indicates whether results are ordered by relevance."""
+
+    @abstractmethod
+    def is_available(self, connection):
+        """Return True if this backend can be used with the given connection.
+
+        :param connection: A :class:`sqlalchemy.engine.base.Connection`.
+        :rtype: bool
+        """
+
+    @abstractmethod
+    def search(self, query, scope, search, bool=False, order_by=True):
+        """Filter the given query so it returns only matching media.
+
+        :param query: A :class:`mediadrop.model.media.MediaQuery`.
+        :param scope: ``'public'`` or ``'admin'``, the admin scope also
+            searches the administrative notes.
+        :param search: The search string as entered by the user.
+        :param bool: Use boolean mode, see :func:`parse_search_query`.
+        :param order_by: Order the results by relevance.
+        :returns: The filtered query.
+        """
+
+    def index_media(self, connection, documents):
+        """Add the given media to the index (or replace their entries).
+
+        :param connection: A :class:`sqlalchemy.engine.base.Connection`.
+        :param documents: A dict which maps media ids to their fields as
+            returned by :func:`load_searchable_fields`.
+        """
+
+    def remove_media(self, connection, media_ids):
+        """Remove the media with the given ids from the index."""
+
+    def clear_index(self, connection):
+        """Remove all media from the index."""
+
+    def rebuild_index(self, connection, batch_size=500, progress=None):
+        """Rebuild the complete index from scratch.
+
+        :param batch_size: The number of media indexed at once.
+        :param progress: An optional callable which is called with the
+            number of indexed media after every batch.
+        :returns: The number of indexed media.
+        """
+        self.clear_index(connection)
+        indexed = 0
+        for documents in iter_searchable_fields(connection, batch_size):
+            self.index_media(connection, documents)
+            indexed += len(documents)
+            if progress is not None:
+                progress(indexed)
+        return indexed
+
+    def is_empty(self, connection):
+        """Return True if the backend has its own index which is empty."""
+        return False
+
+
+_backend_instances = {}
+
+def backend_instance(backend_class):
+    """Return the shared instance of the given backend class."""
+    if backend_class not in _backend_instances:
+        _backend_instances[backend_class] = backend_class()
+    return _backend_instances[backend_class]
+
+def search_backend(connection):
+    """Return the search backend which should be used for the connection.
+
+    The ``search_backend`` setting in the ini file selects a backend by
+    name. Without it the available backend with the highest priority is
+    used (see :class:`mediadrop.lib.search.SearchCapabilityRegistry`).
+
+    :param connection: A :class:`sqlalchemy.engine.base.Connection`.
+    :rtype: :class:`SearchBackend` instance
+    """
+    backend_name = config.get('search_backend', '').strip()
+    if backend_name:
+        for backend_class in SearchBackend:
+            if backend_class.name == backend_name:
+                return backend_instance(backend_class)
+        raise AssertionError('No such search backend: %s' % repr(backend_name))
+
+    from mediadrop.lib.search.capabilities import search_capabilities
+    return search_capabilities.for_connection(connection).backend
+
+
+@observes(events.Environment.database_migrated)
+def _build_index_after_upgrade():
+    # Existing installations start with an empty index after the upgrade.
+    connection = DBSession.connection()
+    backend = search_backend(connection)
+    if backend.is_empty(connection):
+        log.info('Building the search index, this may take a while...')
+        backend.rebuild_index(connection)
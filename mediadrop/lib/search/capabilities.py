@@ -0,0 +1,113 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+
+import logging
+from weakref import WeakKeyDictionary
+
+from mediadrop.lib.search.api import backend_instance, SearchBackend
+from mediadrop.model.meta import DBSession
+from mediadrop.plugin import events
+from mediadrop.plugin.events import observes
+
+__all__ = ['search_capabilities', 'SearchCapabilities', 'SearchCapabilityRegistry']
+
+log = logging.getLogger(__name__)
+
+
+class SearchCapabilities(object):
+    """The search features which are available for one database engine.
+
+    .. attribute:: backend
+
+        The available :class:`mediadrop.lib.search.SearchBackend` instance
+        with the highest priority.
+
+    .. attribute:: available_backends
+
+        Names of all backends which can be used with this engine.
+    """
+
+    def __init__(self, backend, available_backends):
+        self.backend = backend
+        self.available_backends = frozenset(available_backends)
+
+    @property
+    def ranks_results(self):
+        return self.backend.ranks_results
+
+    def supports(self, backend_name):
+        return backend_name in self.available_backends
+
+
+class SearchCapabilityRegistry(object):
+    """
+    Detect the search features of each database engine only once.
+
+    Probing for features can require extra queries (e.g. to check for
+    tables or database extensions) so the result is kept until
+    :meth:`refresh` is called. This happens automatically when the model is
+    initialized and when the database was set up or migrated (see the
+    observers below).
+    """
+
+    def __init__(self):
+        self._capabilities = WeakKeyDictionary()
+
+    def for_connection(self, connection):
+        """Return the :class:`SearchCapabilities` for the connection's engine.
+
+        :param connection: A :class:`sqlalchemy.engine.base.Connection`.
+        """
+        engine = connection.engine
+        capabilities = self._capabilities.get(engine)
+        if capabilities is None:
+            capabilities = self._detect(connection)
+            self._capabilities[engine] = capabilities
+        return capabilities
+
+    def _detect(self, connection):
+        by_priority = sorted(SearchBackend, key=lambda b: b.priority, reverse=True)
+        available = []
+        for backend_class in by_priority:
+            backend = backend_instance(backend_class)
+            if backend.is_available(connection):
+                available.append(backend)
+        if not available:
+            raise AssertionError('No search backend available.')
+        log.debug('Available search backends for %s: %s', connection.engine,
+            ', '.join(backend.name for backend in available))
+        return SearchCapabilities(available[0],
+            [backend.name for backend in available])
+
+    def refresh(self, connection=None):
+        """Forget the detected capabilities.
+
+        :param connection: Only refresh the capabilities for this
+            connection's engine (and detect them again immediately).
+            By default the capabilities of all engines are dropped.
+        """
+        if connection is None:
+            self._capabilities.clear()
+            return None
+        self._capabilities.pop(connection.engine, None)
+        return self.for_connection(connection)
+
+search_capabilities = SearchCapabilityRegistry()
+
+
+@observes(events.Environment.init_model)
+def _forget_capabilities():
+    search_capabilities.refresh()
+
+# Setup and migrations can create tables which change the
+# available features. Run before all other observers so they already see
+# the updated capabilities.
+@observes(events.Environment.database_initialized,
+    events.Environment.database_migrated,
+    events.Environment.database_ready, run_before=True)
+def _refresh_capabilities():
+    search_capabilities.refresh(DBSession.connection())
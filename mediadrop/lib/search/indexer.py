@@ -0,0 +1,144 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+"""
+Keep the search index in sync with the media table
+
+The indexer collects the ids of all media which were changed in a session
+(including changes to their tags and categories, or renamed/deleted tags
+and categories). When the session is committed every media row is indexed
+once with its final content, no matter how often it was changed in that
+transaction.
+
+Use ``batch-scripts/reindex_search.py`` to rebuild the complete index.
+"""
+
+from sqlalchemy import event, sql
+from sqlalchemy.orm import object_session
+
+from mediadrop.lib.search.api import load_searchable_fields, search_backend
+from mediadrop.model.categories import Category
+from mediadrop.model.media import media_categories, media_tags
+from mediadrop.model.meta import (apply_on_commit, attributes_changed,
+    maker, SessionChanges)
+from mediadrop.model.tags import Tag
+from mediadrop.plugin import events
+from mediadrop.plugin.events import observes
+
+__all__ = ['search_indexer', 'update_search_index', 'SearchIndexer']
+
+# Media attributes which are copied to the index, changes to any other
+# attribute do not require a reindex.
+INDEXED_ATTRIBUTES = ('title', 'subtitle', 'description_plain', 'notes',
+    'author', 'tags', 'categories')
+
+# number of media loaded/indexed at once
+BATCH_SIZE = 200
+
+
+def update_search_index(connection, media_ids, backend=None):
+    """Index the current content of the given media.
+
+    Media which do not exist (anymore) are removed from the index.
+
+    :param connection: A :class:`sqlalchemy.engine.base.Connection`.
+    :param media_ids: A list of media ids.
+    :param backend: The :class:`mediadrop.lib.search.SearchBackend` to
+        update, defaults to the backend returned by
+        :func:`mediadrop.lib.search.search_backend`.
+    """
+    if backend is None:
+        backend = search_backend(connection)
+    media_ids = sorted(media_ids)
+    for i in range(0, len(media_ids), BATCH_SIZE):
+        batch = media_ids[i:i+BATCH_SIZE]
+        documents = load_searchable_fields(connection, batch)
+        missing = set(batch).difference(documents)
+        if missing:
+            backend.remove_media(connection, missing)
+        if documents:
+            backend.index_media(connection, documents)
+
+
+class SearchIndexer(SessionChanges):
+    """
+    Collect changed media per session and index them on commit.
+
+    Indexing is deferred so a media item which is saved several times in
+    one unit of work (e.g. when tags are added one by one) results in a
+    single update of its index entry which also sees the final tags and
+    categories.
+    """
+
+    def media_changed(self, session, media_ids):
+        """Mark the given media ids for reindexing when the session commits."""
+        if session is None:
+            return
+        self._changes.setdefault(session, set()).update(media_ids)
+
+    def pending(self, session):
+        """Return the ids of all media which will be indexed on commit."""
+        return frozenset(self._changes.get(session, ()))
+
+    def apply_changes(self, session, media_ids):
+        """Index all changed media of the session.
+
+        :returns: The number of (re)indexed media.
+        """
+        if not media_ids:
+            return 0
+        update_search_index(session.connection(), media_ids)
+        return len(media_ids)
+
+search_indexer = SearchIndexer()
+
+
+def _reindex_media_of(instance, media_col, fk_col):
+    session = object_session(instance)
+    select = sql.select([media_col], fk_col == instance.id)
+    media_ids = [row[0] for row in session.connection().execute(select)]
+    search_indexer.media_changed(session, media_ids)
+
+@observes(events.Media.after_insert)
+def _index_new_media(instance):
+    search_indexer.media_changed(object_session(instance), [instance.id])
+
+@observes(events.Media.after_update)
+def _reindex_changed_media(instance):
+    if attributes_changed(instance, INDEXED_ATTRIBUTES):
+        search_indexer.media_changed(object_session(instance), [instance.id])
+
+@observes(events.Media.before_delete)
+def _remove_deleted_media(instance):
+    # The index references the media row so it can not wait for the commit.
+    connection = object_session(instance).connection()
+    search_backend(connection).remove_media(connection, [instance.id])
+
+@observes(events.Tag.after_update)
+def _reindex_media_with_renamed_tag(instance):
+    if attributes_changed(instance, ['name']):
+        _reindex_media_of(instance, media_tags.c.media_id, media_tags.c.tag_id)
+
+@observes(events.Category.after_update)
+def _reindex_media_in_renamed_category(instance):
+    if attributes_changed(instance, ['name']):
+        _reindex_media_of(instance, media_categories.c.media_id,
+            media_categories.c.category_id)
+
+
+def _reindex_media_of_deleted_tags(session, flush_context, instances):
+    # The media_tags/media_categories rows of a deleted tag or category are
+    # already gone when its 'before_delete' event fires.
+    for instance in session.deleted:
+        if isinstance(instance, Tag):
+            _reindex_media_of(instance, media_tags.c.media_id,
+                media_tags.c.tag_id)
+        elif isinstance(instance, Category):
+            _reindex_media_of(instance, media_categories.c.media_id,
+                media_categories.c.category_id)
+
+apply_on_commit(search_indexer, before_commit=True)
+event.listen(maker, 'before_flush', _reindex_media_of_deleted_tags)
@@ -0,0 +1,289 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+
+import math
+import time
+
+from sqlalchemy import sql
+from sqlalchemy.types import Float
+
+from mediadrop.lib.compat import defaultdict
+from mediadrop.lib.search.api import (parse_search_query, tokenize,
+    SearchBackend, PUBLIC_FIELDS)
+from mediadrop.model.media import Media
+from mediadrop.model.search import (search_documents, search_postings,
+    search_terms)
+
+__all__ = ['InvertedIndexSearch']
+
+# A word in the title is worth more than the same word in the description.
+FIELD_WEIGHTS = {
+    'title': 3,
+    'subtitle': 2,
+    'tags': 2,
+    'categories': 2,
+    'description_plain': 1,
+    'notes': 1,
+}
+
+# BM25 parameters: term frequency saturation and length normalization
+K1 = 1.2
+B = 0.75
+
+# maximum number of index terms a single prefix search ('foo*') matches
+MAX_PREFIX_EXPANSION = 100
+# SQLite does not accept more than 999 parameters per statement
+IN_CLAUSE_CHUNK_SIZE = 500
+# seconds to cache the document count and average document length
+STATISTICS_TTL = 300
+
+
+def _chunks(items, size=IN_CLAUSE_CHUNK_SIZE):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i+size]
+
+
+class InvertedIndexSearch(SearchBackend):
+    """
+    A database agnostic search backend based on a word index.
+
+    Every media item is split into words (see
+    :func:`mediadrop.lib.search.tokenize`) which are stored in the
+    ``search_terms``/``search_postings`` tables together with their
+    weighted frequency. Searching only touches the postings of the words
+    in the search string and the results are ranked with Okapi BM25.
+    """
+
+    name = 'inverted_index'
+    priority = 10
+
+    def __init__(self):
+        self._statistics = {}
+
+    def is_available(self, connection):
+        return True
+
+    def _scope_columns(self, scope):
+        if scope == 'admin':
+            return search_postings.c.admin_weight, search_documents.c.admin_length
+        return search_postings.c.public_weight, search_documents.c.public_length
+
+    # --- searching -----------------------------------------------------------
+    def search(self, query, scope, search, bool=False, order_by=True):
+        connection = query.session.connection()
+        weight_col, length_col = self._scope_columns(scope)
+        terms = parse_search_query(search, bool)
+        term_ids = self._lookup_terms(connection, terms)
+
+        # SQLAlchemy complains about an empty IN-predicate
+        no_results = query.filter(Media.id == -1)
+        included_ids = set()
+        excluded_ids = set()
+        required_ids = []
+        for term, ids in zip(terms, term_ids):
+            if term.excluded:
+                excluded_ids.update(ids)
+                continue
+            if term.required:
+                if not ids:
+                    return no_results
+                required_ids.append(ids)
+            included_ids.update(ids)
+        if not included_ids:
+            return no_results
+
+        frequencies = self._inverse_document_frequencies(connection, scope, included_ids)
+        if not frequencies:
+            # the terms are known but not used by any media
+            return no_results
+        idf = sql.case(
+            [(search_postings.c.term_id == term_id, value)
+             for term_id, value in frequencies],
+            else_=0,
+        )
+        avg_length = self._statistics_for(connection, scope)[1]
+        tf = sql.cast(weight_col, Float)
+        length_norm = K1 * (1 - B + B * sql.cast(length_col, Float) / avg_length)
+        score = idf * tf * (K1 + 1) / (tf + length_norm)
+
+        ranking = sql.select(
+            [search_postings.c.media_id, sql.func.sum(score).label('relevance')],
+            sql.and_(
+                search_postings.c.term_id.in_(included_ids),
+                search_postings.c.media_id == search_documents.c.media_id,
+                weight_col > 0,
+            ),
+        ).group_by(search_postings.c.media_id)
+        for ids in required_ids:
+            has_term = sql.case([(search_postings.c.term_id.in_(ids), 1)], else_=0)
+            ranking = ranking.having(sql.func.max(has_term) == 1)
+        ranking = ranking.alias('search_ranking')
+
+        query = query.join(ranking, ranking.c.media_id == Media.id)
+        if excluded_ids:
+            query = query.filter(sql.not_(Media.id.in_(sql.select(
+                [search_postings.c.media_id],
+                sql.and_(search_postings.c.term_id.in_(excluded_ids),
+                         weight_col > 0),
+            ))))
+        if order_by:
+            query = query.order_by(None).order_by(ranking.c.relevance.desc())
+        return query
+
+    def _lookup_terms(self, connection, terms):
+        """Return a list of matching term ids for every given search term."""
+        exact_words = set(term.word for term in terms if not term.prefix)
+        ids_by_word = {}
+        for words in _chunks(exact_words):
+            select = sql.select([search_terms.c.id, search_terms.c.term],
+                search_terms.c.term.in_(words))
+            for term_id, word in connection.execute(select):
+                ids_by_word[word] = term_id
+
+        term_ids = []
+        for term in terms:
+            if not term.prefix:
+                term_id = ids_by_word.get(term.word)
+                term_ids.append(term_id is not None and [term_id] or [])
+                continue
+            # The range condition can use the unique index on 'term', LIKE
+            # ensures correct results regardless of the column's collation.
+            pattern = term.word.replace('_', '\\_') + '%'
+            select = sql.select([search_terms.c.id], sql.and_(
+                search_terms.c.term >= term.word,
+                search_terms.c.term < term.word + u'\uffff',
+                search_terms.c.term.like(pattern, escape='\\'),
+            )).limit(MAX_PREFIX_EXPANSION)
+            term_ids.append([row[0] for row in connection.execute(select)])
+        return term_ids
+
+    def _inverse_document_frequencies(self, connection, scope, term_ids):
+        document_count = self._statistics_for(connection, scope)[0]
+        # Counting all postings (regardless of the scope) is a bit less
+        # precise but can be answered from the primary key index alone.
+        frequencies = []
+        for ids in _chunks(term_ids):
+            select = sql.select(
+                [search_postings.c.term_id, sql.func.count(search_postings.c.media_id)],
+                search_postings.c.term_id.in_(ids),
+            ).group_by(search_postings.c.term_id)
+            for term_id, df in connection.execute(select):
+                n = max(document_count, df)
+                idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+                frequencies.append((term_id, idf))
+        return frequencies
+
+    def _statistics_for(self, connection, scope):
+        """Return the number of indexed documents and their average length."""
+        cached = self._statistics.get(scope)
+        if cached is not None and cached[0] > time.time():
+            return cached[1]
+        length_col = self._scope_columns(scope)[1]
+        select = sql.select([sql.func.count(search_documents.c.media_id),
+                             sql.func.avg(length_col)])
+        document_count, avg_length = connection.execute(select).first()
+        statistics = (document_count or 0, float(avg_length or 0) or 1.0)
+        self._statistics[scope] = (time.time() + STATISTICS_TTL, statistics)
+        return statistics
+
+    # --- indexing ------------------------------------------------------------
+    def index_media(self, connection, documents):
+        self._write_documents(connection, documents)
+
+    def remove_media(self, connection, media_ids):
+        self._delete_documents(connection, media_ids)
+
+    def clear_index(self, connection):
+        self._statistics.clear()
+        connection.execute(search_postings.delete())
+        connection.execute(search_documents.delete())
+        connection.execute(search_terms.delete())
+
+    def is_empty(self, connection):
+        select = sql.select([search_documents.c.media_id]).limit(1)
+        return connection.execute(select).first() is None
+
+    def _term_weights(self, fields):
+        public_weights = defaultdict(int)
+        admin_weights = defaultdict(int)
+        for field, text in fields.items():
+            weight = FIELD_WEIGHTS.get(field)
+            if weight is None:
+                continue
+            for word in tokenize(text):
+                admin_weights[word] += weight
+                if field in PUBLIC_FIELDS:
+                    public_weights[word] += weight
+        return public_weights, admin_weights
+
+    def _term_ids(self, connection, words):
+        """Return a dict which maps all given words to their term id.
+
+        Words which are not yet part of the index are added."""
+        term_ids = {}
+        def fetch_ids(words):
+            for chunk in _chunks(words):
+                select = sql.select([search_terms.c.id, search_terms.c.term],
+                    search_terms.c.term.in_(chunk))
+                for term_id, word in connection.execute(select):
+                    term_ids[word] = term_id
+        fetch_ids(words)
+        new_words = [word for word in words if word not in term_ids]
+        if new_words:
+            connection.execute(search_terms.insert(),
+                [{'term': word} for word in new_words])
+            fetch_ids(new_words)
+        return term_ids
+
+    def _write_documents(self, connection, documents):
+        """Replace the index entries of the given documents.
+
+        :param documents: A dict which maps media ids to a dict of their
+            field values (fields not in :attr:`FIELD_WEIGHTS` are ignored).
+        """
+        self._delete_documents(connection, documents.keys())
+        if not documents:
+            return
+
+        weights = {}
+        words = set()
+        for media_id, fields in documents.items():
+            weights[media_id] = self._term_weights(fields)
+            words.update(weights[media_id][1])
+        term_ids = self._term_ids(connection, words)
+
+        postings = []
+        lengths = []
+        for media_id, (public_weights, admin_weights) in weights.items():
+            for word, admin_weight in admin_weights.items():
+                postings.append({
+                    'term_id': term_ids[word],
+                    'media_id': media_id,
+                    'public_weight': public_weights.get(word, 0),
+                    'admin_weight': admin_weight,
+                })
+            lengths.append({
+                'media_id': media_id,
+                'public_length': sum(public_weights.values()),
+                'admin_length': sum(admin_weights.values()),
+            })
+        if postings:
+            connection.execute(search_postings.insert(), postings)
+        connection.execute(search_documents.insert(), lengths)
+
+    def _delete_documents(self, connection, media_ids):
+        # the cached document count and average length are outdated now
+        self._statistics.clear()
+        for ids in _chunks(media_ids):
+            connection.execute(search_postings.delete().\
+                where(search_postings.c.media_id.in_(ids)))
+            connection.execute(search_documents.delete().\
+                where(search_documents.c.media_id.in_(ids)))
+
+SearchBackend.register(InvertedIndexSearch)
+
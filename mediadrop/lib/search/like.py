@@ -0,0 +1,37 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+
+from sqlalchemy import sql
+
+from mediadrop.lib.search.api import SearchBackend
+from mediadrop.model.media import Media
+
+__all__ = ['LikeSearch']
+
+
+class LikeSearch(SearchBackend):
+    """
+    A very rudimentary fallback which uses substring matching.
+
+    This requires a full table scan for every search and does not rank the
+    results so it should only be used if no other backend is available.
+    """
+
+    name = 'like'
+    priority = 0
+    ranks_results = False
+
+    def is_available(self, connection):
+        return True
+
+    def search(self, query, scope, search, bool=False, order_by=True):
+        return query.filter(sql.or_(
+            Media.title.ilike("%%%s%%" % search),
+            Media.description_plain.ilike("%%%s%%" % search),
+        ))
+
+SearchBackend.register(LikeSearch)
@@ -0,0 +1,74 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+
+from sqlalchemy import sql
+
+from mediadrop.lib.search.api import SearchBackend
+from mediadrop.model import MatchAgainstClause
+from mediadrop.model.media import (media_fulltext, MediaFullText,
+    _fulltext_indexes)
+
+__all__ = ['MySQLFullTextSearch']
+
+
+class MySQLFullTextSearch(SearchBackend):
+    """
+    Search the ``media_fulltext`` table with MySQL's FULLTEXT indexes.
+
+    The table is a MyISAM copy of the searchable media fields, it is kept up
+    to date by the :mod:`mediadrop.lib.search.indexer`.
+    """
+
+    name = 'mysql_fulltext'
+    priority = 20
+
+    def is_available(self, connection):
+        return connection.dialect.name == 'mysql'
+
+    def search(self, query, scope, search, bool=False, order_by=True):
+        search_cols = _fulltext_indexes[scope]
+
+        filter = MatchAgainstClause(search_cols, search, bool)
+        query = query.join(MediaFullText).filter(filter)
+        if order_by:
+            # MySQL automatically orders natural lang searches by relevance,
+            # so override any existing ordering
+            query = query.order_by(None)
+            if bool:
+                # To mimic the same behaviour in boolean mode, we must do an
+                # extra natural language search on our boolean-filtered results
+                relevance = MatchAgainstClause(search_cols, search, bool=False)
+                query = query.order_by(relevance)
+        return query
+
+    # --- indexing ------------------------------------------------------------
+    def index_media(self, connection, documents):
+        self.remove_media(connection, documents.keys())
+        if not documents:
+            return
+        rows = []
+        for media_id, fields in documents.items():
+            row = dict((col.name, fields.get(col.name))
+                for col in media_fulltext.c if col.name != 'media_id')
+            row['media_id'] = media_id
+            rows.append(row)
+        connection.execute(media_fulltext.insert(), rows)
+
+    def remove_media(self, connection, media_ids):
+        if not media_ids:
+            return
+        connection.execute(media_fulltext.delete().\
+            where(media_fulltext.c.media_id.in_(list(media_ids))))
+
+    def clear_index(self, connection):
+        connection.execute(media_fulltext.delete())
+
+    def is_empty(self, connection):
+        select = sql.select([media_fulltext.c.media_id]).limit(1)
+        return connection.execute(select).first() is None
+
+SearchBackend.register(MySQLFullTextSearch)
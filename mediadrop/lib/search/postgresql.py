@@ -0,0 +1,150 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+
+from pylons import config
+from sqlalchemy import sql
+
+from mediadrop.lib.search.api import (parse_search_query, SearchBackend,
+    PUBLIC_FIELDS)
+from mediadrop.model.media import Media
+from mediadrop.model.search import search_vectors
+
+__all__ = ['build_tsqueries', 'PostgreSQLFullTextSearch']
+
+# tsvector weight labels: 'A' is the most important one
+FIELD_WEIGHTS = (
+    ('title', 'A'),
+    ('subtitle', 'B'),
+    ('tags', 'B'),
+    ('categories', 'B'),
+    ('description_plain', 'C'),
+    ('notes', 'D'),
+)
+
+
+def _lexeme(term):
+    # the tokenizer only returns word characters so quoting is safe here
+    return u"'%s'%s" % (term.word, term.prefix and u':*' or u'')
+
+def build_tsqueries(terms):
+    """Translate parsed search terms into PostgreSQL ``tsquery`` strings.
+
+    Same as with MySQL's boolean mode, optional terms do not restrict the
+    results if there are required terms, they only influence the ranking.
+
+    :param terms: A list of :class:`mediadrop.lib.search.SearchTerm`.
+    :returns: A tuple of ``(filter_query, rank_query)``, both are None if
+        the terms can not match anything.
+    """
+    included = [_lexeme(term) for term in terms if not term.excluded]
+    if not included:
+        return None, None
+    required = [_lexeme(term) for term in terms if term.required]
+    excluded = [u'!' + _lexeme(term) for term in terms if term.excluded]
+    if required:
+        filter_query = u' & '.join(required + excluded)
+    else:
+        optional = u'(%s)' % u' | '.join(included)
+        filter_query = u' & '.join([optional] + excluded)
+    return filter_query, u' | '.join(included)
+
+
+class PostgreSQLFullTextSearch(SearchBackend):
+    """
+    Search with PostgreSQL's built-in full text search.
+
+    Every media item has a weighted ``tsvector`` (title > subtitle, tags,
+    categories > description > notes) in the ``search_vectors`` table which
+    is covered by GIN indexes. Results are ranked with ``ts_rank_cd``.
+
+    The text search configuration (e.g. 'english' for stemming) can be set
+    with the ``search_postgresql_config`` option. Changing it requires a
+    rebuild of the index (``batch-scripts/reindex_search.py``).
+    """
+
+    name = 'postgresql_fulltext'
+    priority = 30
+
+    def is_available(self, connection):
+        return connection.dialect.name == 'postgresql'
+
+    def _text_config(self):
+        return config.get('search_postgresql_config', 'simple')
+
+    def _vector_column(self, scope):
+        if scope == 'admin':
+            return search_vectors.c.admin_vector
+        return search_vectors.c.public_vector
+
+    # --- searching -----------------------------------------------------------
+    def search(self, query, scope, search, bool=False, order_by=True):
+        filter_query, rank_query = build_tsqueries(parse_search_query(search, bool))
+        if filter_query is None:
+            # SQLAlchemy complains about an empty IN-predicate
+            return query.filter(Media.id == -1)
+
+        text_config = self._text_config()
+        vector = self._vector_column(scope)
+        query = query.join(search_vectors, search_vectors.c.media_id == Media.id).\
+            filter(vector.op('@@')(sql.func.to_tsquery(text_config, filter_query)))
+        if order_by:
+            rank = sql.func.ts_rank_cd(vector,
+                sql.func.to_tsquery(text_config, rank_query))
+            query = query.order_by(None).order_by(rank.desc())
+        return query
+
+    # --- indexing ------------------------------------------------------------
+    def _vector(self, scope):
+        text_config = self._text_config()
+        vector = None
+        for field, weight in FIELD_WEIGHTS:
+            if scope == 'public' and field not in PUBLIC_FIELDS:
+                continue
+            text = sql.func.coalesce(sql.bindparam(field), u'')
+            part = sql.func.setweight(sql.func.to_tsvector(text_config, text), weight)
+            if vector is None:
+                vector = part
+            else:
+                vector = vector.op('||')(part)
+        return vector
+
+    def _write_vectors(self, connection, documents):
+        self._delete_vectors(connection, documents.keys())
+        if not documents:
+            return
+        insert = search_vectors.insert().values(
+            media_id=sql.bindparam('id'),
+            public_vector=self._vector('public'),
+            admin_vector=self._vector('admin'),
+        )
+        params = []
+        for media_id, fields in documents.items():
+            values = dict((field, fields.get(field)) for field, weight in FIELD_WEIGHTS)
+            values['id'] = media_id
+            params.append(values)
+        connection.execute(insert, params)
+
+    def _delete_vectors(self, connection, media_ids):
+        if not media_ids:
+            return
+        connection.execute(search_vectors.delete().\
+            where(search_vectors.c.media_id.in_(list(media_ids))))
+
+    def index_media(self, connection, documents):
+        self._write_vectors(connection, documents)
+
+    def remove_media(self, connection, media_ids):
+        self._delete_vectors(connection, media_ids)
+
+    def clear_index(self, connection):
+        connection.execute(search_vectors.delete())
+
+    def is_empty(self, connection):
+        select = sql.select([search_vectors.c.media_id]).limit(1)
+        return connection.execute(select).first() is None
+
+SearchBackend.register(PostgreSQLFullTextSearch)
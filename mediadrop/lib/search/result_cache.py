@@ -0,0 +1,147 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+
+from hashlib import sha1
+from itertools import islice
+
+from paste.deploy.converters import asbool
+from pylons import app_globals, config
+from sqlalchemy import orm
+
+from mediadrop.model.catalog import current_catalog_version
+from mediadrop.model.media import Media
+from mediadrop.model.meta import DBSession
+
+__all__ = ['cached_search_results', 'normalize_search_query',
+    'search_cache_key', 'CachedSearchResults', 'SEARCH_CACHE_EXPIRE',
+    'SEARCH_CACHE_MAX_RESULTS']
+
+# default lifetime of cached search results in seconds, the results do
+# not include media which were published by reaching their 'publish_on'
+# date in the meantime
+SEARCH_CACHE_EXPIRE = 300
+# only the ids of the first results are cached, later pages are loaded
+# from the search query
+SEARCH_CACHE_MAX_RESULTS = 1000
+
+
+def normalize_search_query(search):
+    """Return the search string in lowercase with collapsed whitespace."""
+    return u' '.join((search or u'').lower().split())
+
+def _permission_key(perm):
+    if perm is None:
+        return u''
+    group_ids = sorted(group.group_id for group in perm.groups)
+    return u'%s:%s' % (perm.user.id, u','.join(map(unicode, group_ids)))
+
+def search_cache_key(search, show=None, tag=None, perm=None, version=0):
+    """Return the cache key for one search result listing.
+
+    :param search: The search string as entered by the user.
+    :param show: The ordering ('latest', 'popular' or 'featured').
+    :param tag: The slug of the tag the results are filtered by.
+    :param perm: The :class:`mediadrop.lib.auth.UserPermissions` of the
+        user, results depend on the media the user may view.
+    :param version: The current catalog version.
+    """
+    parts = [normalize_search_query(search), show or u'', tag or u'',
+        _permission_key(perm), unicode(version)]
+    return sha1(u'|'.join(parts).encode('utf-8')).hexdigest()
+
+
+def _result_ids(results, limit):
+    if isinstance(results, orm.Query):
+        # the media are loaded page by page, only select their ids here
+        results = results.with_entities(Media.id).limit(limit)
+        return [media_id for media_id, in results]
+    return [media.id for media in islice(results, limit)]
+
+def _result_count(results, media_ids, limit):
+    if len(media_ids) < limit:
+        return len(media_ids)
+    if isinstance(results, orm.Query):
+        return results.count()
+    return len(results)
+
+
+class CachedSearchResults(object):
+    """
+    A list of search results backed by the ordered ids of the matches.
+
+    Only the media on the requested page (slice) are loaded from the
+    database, so this can be passed to the paginator instead of a query.
+    Pages past the cached ids are loaded from the results returned by
+    ``create_results``.
+    """
+
+    def __init__(self, media_ids, count=None, create_results=None):
+        self.media_ids = list(media_ids)
+        if count is None:
+            count = len(self.media_ids)
+        self._count = count
+        self._create_results = create_results
+
+    def __len__(self):
+        return self._count
+    count = __len__
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key+1 or None][0]
+        start, stop, step = key.indices(self._count)
+        if stop > len(self.media_ids) and self._create_results is not None:
+            return list(self._create_results()[start:stop:step])
+        media_ids = self.media_ids[key]
+        if not media_ids:
+            return []
+        by_id = dict((media.id, media) for media in
+            Media.query.filter(Media.id.in_(media_ids)))
+        # media which were deleted in the meantime are skipped
+        return [by_id[media_id] for media_id in media_ids if media_id in by_id]
+
+
+def cached_search_results(create_results, search, show=None, tag=None,
+                          perm=None, cache=None):
+    """Return cached search results or create and cache them.
+
+    The ids and the total count of the results are stored for every
+    (normalized) search string, ordering, tag and set of user permissions.
+    The key includes the catalog version so publishing, unpublishing or
+    deleting media makes all cached results outdated. Only the ids of the
+    first ``search_cache_max_results`` results are kept, later pages run
+    the search again.
+
+    :param create_results: A callable which returns a query or an iterable
+        of :class:`~mediadrop.model.media.Media` (all results, in order).
+    :param cache: A beaker cache, by default the ``search_results`` cache
+        of the application is used.
+    :rtype: :class:`CachedSearchResults`
+    """
+    limit = int(config.get('search_cache_max_results', SEARCH_CACHE_MAX_RESULTS))
+    if not asbool(config.get('cache_enabled', 'True')):
+        results = create_results()
+        media_ids = _result_ids(results, limit)
+        return CachedSearchResults(media_ids,
+            _result_count(results, media_ids, limit), create_results)
+    if cache is None:
+        expire = int(config.get('search_cache_expire', SEARCH_CACHE_EXPIRE))
+        cache = app_globals.cache.get_cache('search_results', expire=expire)
+    version = current_catalog_version(DBSession.connection())
+    key = search_cache_key(search, show, tag, perm, version)
+
+    def create_entry():
+        results = create_results()
+        media_ids = _result_ids(results, limit)
+        return {'media_ids': media_ids,
+                'count': _result_count(results, media_ids, limit)}
+    entry = cache.get(key=key, createfunc=create_entry)
+    return CachedSearchResults(entry['media_ids'], entry['count'],
+        create_results)
@@ -0,0 +1,275 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+"""
+In-process prefix index for search suggestions (typeahead)
+
+Completions for media titles and tag names must be fast enough to be
+requested on every keystroke, so they are answered from a sorted list in
+memory instead of a LIKE query. The index is built when the first
+suggestion is requested and kept up to date by the Media/Tag mapper events
+of this process; changes are applied when the session commits. Changes
+made by other processes are picked up when the index is rebuilt after
+``suggest_index_expire`` seconds. Only one thread rebuilds the index, the
+other requests use the outdated index in the meantime.
+"""
+
+from bisect import bisect_left, insort
+from datetime import datetime
+import re
+import threading
+import time
+
+from pylons import config
+from sqlalchemy import sql
+from sqlalchemy.orm import object_session
+
+from mediadrop.model.media import media as media_table
+from mediadrop.model.meta import apply_on_commit, DBSession, SessionChanges
+from mediadrop.model.tags import tags as tags_table
+from mediadrop.plugin import events
+from mediadrop.plugin.events import observes
+
+__all__ = ['suggestions', 'PrefixIndex', 'SuggestionIndex']
+
+# seconds until the index is rebuilt from the database
+SUGGEST_INDEX_EXPIRE = 3600
+# only this many characters of every key are stored
+KEY_LENGTH = 48
+# maximum number of matching keys which are examined for one prefix
+MAX_SCAN = 500
+
+_word_start = re.compile(r'\b\w', re.UNICODE)
+
+
+def _normalize(text):
+    return u' '.join(text.lower().split())
+
+
+class PrefixIndex(object):
+    """
+    A sorted list of keys which finds all entries starting with a prefix.
+
+    Every entry is reachable by the start of each word in its text, so
+    'live' completes 'Joe Smith: Live Performance'.
+    """
+
+    def __init__(self):
+        self._keys = []
+        self._entries = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _keys_for(self, text):
+        text = _normalize(text)
+        return [(text[m.start():m.start()+KEY_LENGTH], m.start())
+                for m in _word_start.finditer(text)]
+
+    def add(self, ref, text, data=None):
+        """Add (or replace) the entry ``ref`` which is found by ``text``."""
+        self.remove(ref)
+        keys = [(key, position, ref) for key, position in self._keys_for(text)]
+        for key in keys:
+            insort(self._keys, key)
+        self._entries[ref] = (text, data, keys)
+
+    def add_all(self, entries):
+        """Add many entries at once (faster than calling :meth:`add` for
+        each one as the keys are sorted only once).
+
+        :param entries: An iterable of (ref, text, data) tuples.
+        """
+        new_keys = []
+        for ref, text, data in entries:
+            self.remove(ref)
+            keys = [(key, position, ref)
+                    for key, position in self._keys_for(text)]
+            new_keys.extend(keys)
+            self._entries[ref] = (text, data, keys)
+        self._keys.extend(new_keys)
+        self._keys.sort()
+
+    def remove(self, ref):
+        entry = self._entries.pop(ref, None)
+        if entry is None:
+            return
+        for key in entry[2]:
+            index = bisect_left(self._keys, key)
+            if index < len(self._keys) and self._keys[index] == key:
+                del self._keys[index]
+
+    def complete(self, prefix, limit=10, accept=None):
+        """Return up to ``limit`` (ref, text, data) tuples for the prefix.
+
+        Entries whose text starts with the prefix are returned first,
+        otherwise the results are sorted alphabetically.
+
+        :param accept: An optional callable which is passed the data of an
+            entry and returns False for entries which should be skipped.
+        """
+        prefix = _normalize(prefix)[:KEY_LENGTH]
+        if not prefix:
+            return []
+        matches = {}
+        index = bisect_left(self._keys, (prefix, ))
+        for key, position, ref in self._keys[index:index+MAX_SCAN]:
+            if not key.startswith(prefix):
+                break
+            best = matches.get(ref)
+            if best is None or position < best:
+                matches[ref] = position
+
+        results = []
+        for ref, position in matches.items():
+            text, data, keys = self._entries[ref]
+            if accept is not None and not accept(data):
+                continue
+            results.append((position > 0, text.lower(), ref, text, data))
+        results.sort()
+        return [(ref, text, data) for _, _, ref, text, data in results[:limit]]
+
+
+class SuggestionIndex(SessionChanges):
+    """Title and tag completions, rebuilt from the database periodically."""
+
+    def __init__(self):
+        super(SuggestionIndex, self).__init__()
+        self.titles = None
+        self.tags = None
+        self._built_on = None
+        self._lock = threading.RLock()
+        self._rebuild_lock = threading.Lock()
+
+    def _expire(self):
+        return int(config.get('suggest_index_expire', SUGGEST_INDEX_EXPIRE))
+
+    def _is_outdated(self):
+        return self._built_on is None or \
+            self._built_on + self._expire() < time.time()
+
+    def rebuild(self, connection):
+        """Build both indexes from scratch."""
+        titles = PrefixIndex()
+        select = sql.select([media_table.c.id, media_table.c.slug,
+                media_table.c.title, media_table.c.publish_on,
+                media_table.c.publish_until],
+            _publishable_condition())
+        titles.add_all((media_id, title, (slug, publish_on, publish_until))
+            for media_id, slug, title, publish_on, publish_until
+            in connection.execute(select))
+        tags = PrefixIndex()
+        select = sql.select([tags_table.c.id, tags_table.c.slug, tags_table.c.name])
+        tags.add_all((tag_id, name, slug)
+            for tag_id, slug, name in connection.execute(select))
+        with self._lock:
+            self.titles, self.tags = titles, tags
+            self._built_on = time.time()
+
+    def _ensure_current(self):
+        if not self._is_outdated():
+            return
+        if self.titles is None:
+            # nothing to serve yet, wait until the index was built
+            self._rebuild_lock.acquire()
+        elif not self._rebuild_lock.acquire(False):
+            # another thread is rebuilding the index already
+            return
+        try:
+            if self._is_outdated():
+                self.rebuild(DBSession.connection())
+        finally:
+            self._rebuild_lock.release()
+
+    def invalidate(self):
+        """Rebuild the indexes on the next request."""
+        with self._lock:
+            self._built_on = None
+
+    def suggest(self, prefix, limit=10):
+        """Return completions for the given prefix.
+
+        :returns: A dict with a list of ``titles`` (dicts with the id, slug
+            and title of published media) and of ``tags`` (dicts with name
+            and slug).
+        """
+        self._ensure_current()
+        now = datetime.now()
+        def is_published(data):
+            slug, publish_on, publish_until = data
+            return publish_on is not None and publish_on <= now and \
+                (publish_until is None or publish_until >= now)
+        with self._lock:
+            titles = self.titles.complete(prefix, limit, accept=is_published)
+            tags = self.tags.complete(prefix, limit)
+        return dict(
+            titles = [dict(id=media_id, slug=data[0], title=title)
+                      for media_id, title, data in titles],
+            tags = [dict(name=name, slug=slug)
+                    for tag_id, name, slug in tags],
+        )
+
+    # --- updates from the mapper events --------------------------------------
+    def record(self, session, kind, ref, entry):
+        """Remember a change which is applied when the session commits.
+
+        :param kind: 'titles' or 'tags'.
+        :param entry: A (text, data) tuple or None to remove the entry.
+        """
+        if session is not None:
+            self._changes.setdefault(session, {})[(kind, ref)] = entry
+
+    def apply_changes(self, session, changes):
+        if not changes or self._built_on is None:
+            return
+        with self._lock:
+            for (kind, ref), entry in changes.items():
+                index = getattr(self, kind)
+                if entry is None:
+                    index.remove(ref)
+                else:
+                    index.add(ref, *entry)
+
+suggestions = SuggestionIndex()
+
+
+def _publishable_condition():
+    # the publish dates are checked when the suggestions are requested
+    return sql.and_(
+        media_table.c.reviewed == True,
+        media_table.c.encoded == True,
+        media_table.c.publishable == True,
+    )
+
+def _record_media(media):
+    entry = None
+    if media.reviewed and media.encoded and media.publishable:
+        entry = (media.title, (media.slug, media.publish_on, media.publish_until))
+    suggestions.record(object_session(media), 'titles', media.id, entry)
+
+@observes(events.Environment.init_model)
+def _forget_index():
+    suggestions.invalidate()
+
+@observes(events.Media.after_insert, events.Media.after_update)
+def _media_saved(instance):
+    _record_media(instance)
+
+@observes(events.Media.before_delete)
+def _media_deleted(instance):
+    suggestions.record(object_session(instance), 'titles', instance.id, None)
+
+@observes(events.Tag.after_insert, events.Tag.after_update)
+def _tag_saved(instance):
+    suggestions.record(object_session(instance), 'tags',
+        instance.id, (instance.name, instance.slug))
+
+@observes(events.Tag.before_delete)
+def _tag_deleted(instance):
+    suggestions.record(object_session(instance), 'tags', instance.id, None)
+
+
+apply_on_commit(suggestions)
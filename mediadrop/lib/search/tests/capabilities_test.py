@@ -0,0 +1,58 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+
+from pythonic_testcase import *
+
+from mediadrop.lib.search import (backend_instance, search_capabilities,
+    InvertedIndexSearch)
+from mediadrop.lib.test.db_testcase import DBTestCase
+from mediadrop.model import DBSession, Media
+from mediadrop.plugin import events
+
+
+class SearchCapabilityRegistryTest(DBTestCase):
+    def setUp(self):
+        super(SearchCapabilityRegistryTest, self).setUp()
+        self.backend = backend_instance(InvertedIndexSearch)
+        self.probes = []
+        def is_available(connection):
+            self.probes.append(connection)
+            return True
+        self.backend.is_available = is_available
+        search_capabilities.refresh()
+
+    def tearDown(self):
+        del self.backend.is_available
+        search_capabilities.refresh()
+        super(SearchCapabilityRegistryTest, self).tearDown()
+
+    def test_detects_capabilities_only_once(self):
+        Media.query.search(u'foo').all()
+        Media.query.admin_search(u'foo').all()
+        Media.query.related(Media.example()).all()
+
+        assert_equals(1, len(self.probes))
+        capabilities = search_capabilities.for_connection(DBSession.connection())
+        assert_equals(self.backend, capabilities.backend)
+        assert_true(capabilities.supports('inverted_index'))
+
+    def test_refreshes_capabilities_after_migration(self):
+        search_capabilities.for_connection(DBSession.connection())
+        assert_equals(1, len(self.probes))
+
+        events.Environment.database_migrated()
+        assert_equals(2, len(self.probes))
+
+
+import unittest
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(SearchCapabilityRegistryTest))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite')
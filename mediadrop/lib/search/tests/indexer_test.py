@@ -0,0 +1,116 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+
+from pythonic_testcase import *
+
+from mediadrop.lib.search import search_backend, search_indexer
+from mediadrop.lib.test.db_testcase import DBTestCase
+from mediadrop.model import Category, DBSession, Media, Tag
+
+
+class SearchIndexerTest(DBTestCase):
+    def setUp(self):
+        super(SearchIndexerTest, self).setUp()
+        self.backend = search_backend(DBSession.connection())
+        self.indexed = []
+        original_index_media = self.backend.index_media
+        def index_media(connection, documents):
+            self.indexed.append(sorted(documents))
+            return original_index_media(connection, documents)
+        self.backend.index_media = index_media
+
+    def tearDown(self):
+        del self.backend.index_media
+        super(SearchIndexerTest, self).tearDown()
+
+    def search(self, search):
+        return Media.query.search(search).order_by(Media.id).all()
+
+    def test_indexes_changed_media_once_on_commit(self):
+        media = Media.example(title=u'Draft')
+        media.title = u'Hedgehogs'
+        DBSession.flush()
+        media.set_tags(u'spiky, cute')
+        DBSession.flush()
+        assert_equals([], self.indexed)
+        assert_equals(set([media.id]), search_indexer.pending(DBSession()))
+
+        DBSession.commit()
+        assert_equals([[media.id]], self.indexed)
+        assert_equals(set(), search_indexer.pending(DBSession()))
+        assert_equals([], self.search(u'draft'))
+        assert_equals([media], self.search(u'hedgehogs'))
+        assert_equals([media], self.search(u'spiky'))
+
+    def test_ignores_changes_to_attributes_which_are_not_indexed(self):
+        media = Media.example()
+        DBSession.commit()
+        self.indexed = []
+
+        media.views = 42
+        DBSession.commit()
+        assert_equals([], self.indexed)
+
+    def test_forgets_changes_after_rollback(self):
+        Media.example(title=u'Hedgehogs')
+        DBSession.rollback()
+        assert_equals(set(), search_indexer.pending(DBSession()))
+
+        DBSession.commit()
+        assert_equals([], self.indexed)
+
+    def test_reindexes_media_when_tag_is_renamed_or_deleted(self):
+        media = Media.example()
+        media.set_tags(u'hedgehogs')
+        DBSession.commit()
+        assert_equals([media], self.search(u'hedgehogs'))
+
+        tag = Tag.query.filter(Tag.name == u'hedgehogs').one()
+        tag.name = u'porcupines'
+        DBSession.commit()
+        assert_equals([], self.search(u'hedgehogs'))
+        assert_equals([media], self.search(u'porcupines'))
+
+        DBSession.delete(tag)
+        DBSession.commit()
+        assert_equals([], self.search(u'porcupines'))
+
+    def test_reindexes_media_when_category_is_renamed(self):
+        category = Category.example(name=u'Hedgehogs')
+        media = Media.example()
+        media.set_categories([category.id])
+        DBSession.commit()
+        assert_equals([media], self.search(u'hedgehogs'))
+
+        category.name = u'Porcupines'
+        DBSession.commit()
+        assert_equals([], self.search(u'hedgehogs'))
+        assert_equals([media], self.search(u'porcupines'))
+
+    def test_can_rebuild_index_with_progress(self):
+        media = Media.example(title=u'Hedgehogs')
+        DBSession.commit()
+        connection = DBSession.connection()
+        self.backend.clear_index(connection)
+        assert_equals([], self.search(u'hedgehogs'))
+
+        progress = []
+        total = self.backend.rebuild_index(connection, batch_size=1,
+            progress=progress.append)
+        assert_equals(Media.query.count(), total)
+        assert_equals(range(1, total + 1), progress)
+        assert_equals([media], self.search(u'hedgehogs'))
+
+
+import unittest
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(SearchIndexerTest))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite')
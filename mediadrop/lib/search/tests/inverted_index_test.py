@@ -0,0 +1,127 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+
+from pythonic_testcase import *
+
+from mediadrop.lib.search import (parse_search_query, search_backend,
+    tokenize, InvertedIndexSearch, SearchTerm)
+from mediadrop.lib.test.db_testcase import DBTestCase
+from mediadrop.model import DBSession, Media
+
+
+class TokenizeTest(PythonicTestCase):
+    def test_normalizes_words(self):
+        assert_equals([u'foo', u'bar', u'42'], tokenize(u'Foo, BAR! 42'))
+
+    def test_drops_short_words_and_stopwords(self):
+        assert_equals([u'quick', u'fox'], tokenize(u'the quick a fox'))
+
+    def test_ignores_operators_in_natural_language_mode(self):
+        assert_equals([SearchTerm(u'foo'), SearchTerm(u'bar')],
+            parse_search_query(u'+foo -bar*'))
+
+    def test_can_parse_boolean_operators(self):
+        assert_equals([
+                SearchTerm(u'foo', required=True),
+                SearchTerm(u'bar', excluded=True),
+                SearchTerm(u'baz', prefix=True),
+                SearchTerm(u'some', required=True),
+                SearchTerm(u'phrase', required=True),
+            ],
+            parse_search_query(u'+foo -bar baz* +"some phrase"', bool=True))
+
+
+class InvertedIndexSearchTest(DBTestCase):
+    def setUp(self):
+        super(InvertedIndexSearchTest, self).setUp()
+        self.backend = search_backend(DBSession.connection())
+
+    def search(self, search, bool=False, admin=False):
+        query = Media.query.order_by(Media.id)
+        if admin:
+            query = query.admin_search(search, bool=bool)
+        else:
+            query = query.search(search, bool=bool)
+        return query.all()
+
+    def test_is_used_for_sqlite(self):
+        assert_isinstance(self.backend, InvertedIndexSearch)
+
+    def test_finds_media_by_title(self):
+        foo = Media.example(title=u'Foo Tutorial')
+        Media.example(title=u'Bar')
+        DBSession.commit()
+
+        assert_equals([foo], self.search(u'tutorial'))
+        assert_equals([], self.search(u'unknown'))
+
+    def test_ranks_title_matches_higher_than_description_matches(self):
+        in_description = Media.example(title=u'First',
+            description_plain=u'Something about kittens')
+        in_title = Media.example(title=u'Kittens')
+        DBSession.commit()
+
+        assert_equals([in_title, in_description], self.search(u'kittens'))
+
+    def test_notes_are_only_searchable_by_admins(self):
+        media = Media.example(notes=u'secret')
+        DBSession.commit()
+
+        assert_equals([], self.search(u'secret'))
+        assert_equals([media], self.search(u'secret', admin=True))
+
+    def test_reindexes_changed_media(self):
+        media = Media.example(title=u'Dusty Title')
+        DBSession.commit()
+        media.title = u'Shiny Title'
+        media.set_tags(u'kittens')
+        DBSession.commit()
+
+        assert_equals([], self.search(u'dusty'))
+        assert_equals([media], self.search(u'shiny'))
+        assert_equals([media], self.search(u'kittens'))
+
+    def test_removes_deleted_media_from_index(self):
+        media = Media.example(title=u'Foo')
+        DBSession.commit()
+        DBSession.delete(media)
+        DBSession.commit()
+
+        assert_equals([], self.search(u'foo'))
+
+    def test_supports_boolean_mode(self):
+        foo = Media.example(title=u'Foo')
+        foo_bar = Media.example(title=u'Foo Bar')
+        foobar = Media.example(title=u'Foobar')
+        DBSession.commit()
+
+        assert_equals([foo_bar], self.search(u'+foo +bar', bool=True))
+        assert_equals([foo], self.search(u'+foo -bar', bool=True))
+        assert_equals(set([foo, foo_bar, foobar]),
+            set(self.search(u'foo*', bool=True)))
+        assert_equals([], self.search(u'+foo +unknown', bool=True))
+
+    def test_can_rebuild_index(self):
+        media = Media.example(title=u'Foo')
+        DBSession.commit()
+        connection = DBSession.connection()
+        self.backend.remove_media(connection, [media.id])
+        assert_equals([], self.search(u'foo'))
+
+        assert_equals(Media.query.count(), self.backend.rebuild_index(connection))
+        assert_equals([media], self.search(u'foo'))
+
+
+import unittest
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TokenizeTest))
+    suite.addTest(unittest.makeSuite(InvertedIndexSearchTest))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite')
@@ -0,0 +1,44 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+
+from pythonic_testcase import *
+
+from mediadrop.lib.search import parse_search_query
+from mediadrop.lib.search.postgresql import build_tsqueries
+
+
+class BuildTSQueriesTest(PythonicTestCase):
+    def tsqueries(self, search, bool=False):
+        return build_tsqueries(parse_search_query(search, bool=bool))
+
+    def test_optional_terms_match_any_word(self):
+        assert_equals((u"('foo' | 'bar')", u"'foo' | 'bar'"),
+            self.tsqueries(u'foo bar'))
+
+    def test_required_terms_restrict_results(self):
+        filter_query, rank_query = self.tsqueries(u'+foo bar', bool=True)
+        assert_equals(u"'foo'", filter_query)
+        assert_equals(u"'foo' | 'bar'", rank_query)
+
+    def test_supports_excluded_and_prefix_terms(self):
+        filter_query, rank_query = self.tsqueries(u'foo* -bar', bool=True)
+        assert_equals(u"('foo':*) & !'bar'", filter_query)
+        assert_equals(u"'foo':*", rank_query)
+
+    def test_returns_none_without_positive_terms(self):
+        assert_equals((None, None), self.tsqueries(u'-foo', bool=True))
+        assert_equals((None, None), self.tsqueries(u'a'))
+
+
+import unittest
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(BuildTSQueriesTest))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite')
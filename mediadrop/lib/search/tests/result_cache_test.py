@@ -0,0 +1,110 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+
+from beaker.cache import Cache
+from pythonic_testcase import *
+from sqlalchemy import event
+
+from mediadrop.lib.search.result_cache import (cached_search_results,
+    normalize_search_query, search_cache_key, CachedSearchResults)
+from mediadrop.lib.test.db_testcase import DBTestCase
+from mediadrop.model import DBSession, increment_catalog_version, Media
+
+
+class SearchCacheKeyTest(PythonicTestCase):
+    def test_normalizes_search_query(self):
+        assert_equals(u'foo bar', normalize_search_query(u'  Foo\tBAR '))
+        assert_equals(search_cache_key(u'Foo  bar'), search_cache_key(u'foo bar'))
+
+    def test_key_depends_on_listing_and_catalog_version(self):
+        key = search_cache_key(u'foo', show=u'latest')
+        assert_not_equals(key, search_cache_key(u'foo', show=u'popular'))
+        assert_not_equals(key, search_cache_key(u'foo', show=u'latest', tag=u'bar'))
+        assert_not_equals(key, search_cache_key(u'foo', show=u'latest', version=1))
+
+
+class CachedSearchResultsTest(DBTestCase):
+    def setUp(self):
+        super(CachedSearchResultsTest, self).setUp()
+        self.cache = Cache('search_results_test', type='memory')
+        self.cache.clear()
+        self.media = [Media.example(title=u'Item %d' % i) for i in range(5)]
+        DBSession.commit()
+        self.created = 0
+
+    def create_results(self):
+        self.created += 1
+        return list(reversed(self.media))
+
+    def cached_results(self, search=u'item'):
+        return cached_search_results(self.create_results, search,
+            cache=self.cache)
+
+    def test_loads_only_the_requested_slice(self):
+        results = CachedSearchResults([m.id for m in self.media])
+        assert_length(5, results)
+        assert_equals(self.media[1:3], results[1:3])
+        assert_equals(self.media[4], results[4])
+        assert_equals([], results[5:10])
+
+    def test_caches_result_ids(self):
+        results = self.cached_results()
+        assert_equals(1, self.created)
+        assert_equals(list(reversed(self.media)), list(results))
+
+        assert_equals(list(reversed(self.media))[:2], self.cached_results(u' ITEM ')[:2])
+        assert_equals(1, self.created)
+
+    def test_new_catalog_version_invalidates_cached_results(self):
+        self.cached_results()
+        increment_catalog_version(DBSession.connection())
+
+        self.cached_results()
+        assert_equals(2, self.created)
+
+    def test_selects_only_the_ids_of_a_query(self):
+        statements = []
+        event.listen(DBSession.bind, 'before_cursor_execute',
+            lambda conn, cursor, statement, *args: statements.append(statement))
+        media_ids = [m.id for m in self.media]
+        query = Media.query.filter(Media.id.in_(media_ids))\
+            .order_by(Media.id.desc())
+        results = cached_search_results(lambda: query, u'item', cache=self.cache)
+        assert_equals(list(reversed(media_ids)), results.media_ids)
+        select = statements[-1]
+        assert_true(select.startswith('SELECT media.id AS media_id \nFROM media'))
+
+    def test_counts_all_results_of_a_query(self):
+        self.pylons_config['search_cache_max_results'] = '2'
+        media_ids = [m.id for m in self.media]
+        query = Media.query.filter(Media.id.in_(media_ids))\
+            .order_by(Media.id.desc())
+        results = cached_search_results(lambda: query, u'item', cache=self.cache)
+        assert_length(5, results)
+        assert_equals(list(reversed(self.media))[3:], results[3:5])
+
+    def test_loads_pages_past_the_cached_ids_from_the_results(self):
+        self.pylons_config['search_cache_max_results'] = '3'
+        results = self.cached_results()
+        assert_equals(3, len(results.media_ids))
+        assert_length(5, results)
+        expected = list(reversed(self.media))
+        assert_equals(expected[:2], results[:2])
+        assert_equals(1, self.created)
+        assert_equals(expected[2:4], results[2:4])
+        assert_equals(expected, list(results))
+
+
+import unittest
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(SearchCacheKeyTest))
+    suite.addTest(unittest.makeSuite(CachedSearchResultsTest))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite')
@@ -0,0 +1,133 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+
+from datetime import datetime, timedelta
+
+from pythonic_testcase import *
+
+from mediadrop.lib.search import suggestions, PrefixIndex
+from mediadrop.lib.test.db_testcase import DBTestCase
+from mediadrop.lib.test.support import published_media
+from mediadrop.model import DBSession, Media, Tag
+
+
+class PrefixIndexTest(PythonicTestCase):
+    def setUp(self):
+        self.index = PrefixIndex()
+        self.index.add(1, u'Joe Smith: Live Performance')
+        self.index.add(2, u'Smithsonian Tour')
+        self.index.add(3, u'Cooking')
+
+    def refs(self, prefix, **kwargs):
+        return [ref for ref, text, data in self.index.complete(prefix, **kwargs)]
+
+    def test_completes_the_start_of_every_word(self):
+        assert_equals([1], self.refs(u'live'))
+        assert_equals([1], self.refs(u'SMITH: l'))
+        assert_equals([], self.refs(u'erformance'))
+
+    def test_ranks_matches_at_the_start_of_the_text_first(self):
+        assert_equals([2, 1], self.refs(u'smith'))
+        assert_equals([2], self.refs(u'smith', limit=1))
+
+    def test_can_replace_and_remove_entries(self):
+        self.index.add(3, u'Smith Cooking')
+        assert_equals([3, 2, 1], self.refs(u'smith'))
+        assert_equals([3], self.refs(u'coo'))
+
+        self.index.remove(1)
+        assert_equals([3, 2], self.refs(u'smith'))
+        assert_length(2, self.index)
+
+    def test_can_add_many_entries_at_once(self):
+        self.index.add_all([(3, u'Smith Cooking', None), (4, u'Live Music', 'x')])
+        assert_equals([3, 2, 1], self.refs(u'smith'))
+        assert_equals([4, 1], self.refs(u'live'))
+        assert_equals([3], self.refs(u'coo'))
+        assert_length(4, self.index)
+
+
+class SuggestionIndexTest(DBTestCase):
+    def published_media(self, title, **kwargs):
+        media = published_media(title=title, **kwargs)
+        DBSession.commit()
+        return media
+
+    def titles(self, prefix):
+        return [item['title'] for item in suggestions.suggest(prefix)['titles']]
+
+    def test_suggests_published_titles_and_tags(self):
+        media = self.published_media(u'Hedgehogs in Winter')
+        media.set_tags(u'hedgehog care')
+        Media.example(title=u'Hedgehog Draft')
+        DBSession.commit()
+
+        result = suggestions.suggest(u'hedge')
+        assert_equals([dict(id=media.id, slug=media.slug, title=media.title)],
+            result['titles'])
+        assert_equals([dict(name=u'hedgehog care', slug=u'hedgehog-care')],
+            result['tags'])
+
+    def test_hides_media_which_are_not_yet_published(self):
+        self.published_media(u'Hedgehogs', publish_on=datetime.now() + timedelta(days=1))
+        assert_equals([], self.titles(u'hedge'))
+
+    def test_applies_changes_on_commit(self):
+        media = self.published_media(u'Hedgehogs')
+        assert_equals([u'Hedgehogs'], self.titles(u'hedge'))
+
+        media.title = u'Porcupines'
+        DBSession.flush()
+        assert_equals([u'Hedgehogs'], self.titles(u'hedge'))
+        DBSession.commit()
+        assert_equals([], self.titles(u'hedge'))
+        assert_equals([u'Porcupines'], self.titles(u'porc'))
+
+        media.title = u'Hedgehogs'
+        DBSession.flush()
+        DBSession.rollback()
+        assert_equals([u'Porcupines'], self.titles(u'porc'))
+
+        DBSession.delete(media)
+        DBSession.commit()
+        assert_equals([], self.titles(u'porc'))
+
+    def test_updates_renamed_tags(self):
+        tag = Tag(u'hedgehogs')
+        DBSession.add(tag)
+        DBSession.commit()
+        assert_length(1, suggestions.suggest(u'hedge')['tags'])
+
+        tag.name = u'porcupines'
+        DBSession.commit()
+        assert_length(0, suggestions.suggest(u'hedge')['tags'])
+        assert_length(1, suggestions.suggest(u'porc')['tags'])
+
+    def test_only_one_thread_rebuilds_the_index(self):
+        self.published_media(u'Hedgehogs')
+        assert_equals([u'Hedgehogs'], self.titles(u'hedge'))
+        suggestions.invalidate()
+        self.published_media(u'Hedgehog Care')
+
+        # another thread is rebuilding: keep using the outdated index
+        suggestions._rebuild_lock.acquire()
+        try:
+            assert_equals([u'Hedgehogs'], self.titles(u'hedge'))
+        finally:
+            suggestions._rebuild_lock.release()
+        assert_equals([u'Hedgehog Care', u'Hedgehogs'], self.titles(u'hedge'))
+
+
+import unittest
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(PrefixIndexTest))
+    suite.addTest(unittest.makeSuite(SuggestionIndexTest))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite')
@@ -0,0 +1,178 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+"""
+Streamed responses
+
+Large documents (e.g. sitemaps with all media) are generated while they are
+sent to the client instead of being built in memory first. The action
+returns an iterable which WSGI servers send as a chunked response.
+
+The iterable is consumed after the action returned so the request-local
+pylons globals (``request``, ``url``, ...) are not registered anymore. A
+:class:`RequestContext` captures them and restores them while the next
+chunk is generated. The database session is kept open until the response
+is complete.
+"""
+
+import pylons
+from sqlalchemy import orm
+
+from mediadrop.lib.paginate import decode_cursor, encode_cursor, seek_order
+from mediadrop.model.media import Media
+from mediadrop.model.meta import DBSession
+
+__all__ = ['cursor_first_id', 'iter_media', 'page_cursors', 'stream_response',
+    'RequestContext', 'StreamedResponse', 'STREAMING_ENVIRON_KEY']
+
+# preferred size of every chunk of a streamed response (in bytes)
+CHUNK_SIZE = 32 * 1024
+# number of media loaded from the database at once
+BATCH_SIZE = 500
+
+# set in the WSGI environ for streamed responses so middlewares (e.g. gzip)
+# can avoid buffering them
+STREAMING_ENVIRON_KEY = 'mediadrop.streaming'
+
+REQUEST_GLOBALS = ('request', 'response', 'session', 'tmpl_context',
+    'app_globals', 'url', 'translator', 'cache')
+
+
+class RequestContext(object):
+    """Capture the pylons globals of the current request and restore them
+    (as a context manager) later."""
+
+    def __init__(self):
+        self.objects = []
+        for name in REQUEST_GLOBALS:
+            proxy = getattr(pylons, name)
+            try:
+                self.objects.append((proxy, proxy._current_obj()))
+            except TypeError:
+                # not registered for this request
+                continue
+
+    def __enter__(self):
+        for proxy, obj in self.objects:
+            proxy._push_object(obj)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        for proxy, obj in reversed(self.objects):
+            proxy._pop_object(obj)
+
+
+class StreamedResponse(object):
+    """A WSGI iterable which joins the (unicode) chunks into strings of
+    about ``chunk_size`` bytes.
+
+    The request context is restored while the chunks are generated. The
+    database session is removed when the server closes the iterable.
+    """
+
+    def __init__(self, chunks, encoding='utf-8', chunk_size=CHUNK_SIZE):
+        self.chunks = chunks
+        self.encoding = encoding
+        self.chunk_size = chunk_size
+        self.context = RequestContext()
+
+    def __iter__(self):
+        iterator = iter(self.chunks)
+        while True:
+            buffered = []
+            size = 0
+            with self.context:
+                for chunk in iterator:
+                    chunk = chunk.encode(self.encoding)
+                    buffered.append(chunk)
+                    size += len(chunk)
+                    if size >= self.chunk_size:
+                        break
+            if not buffered:
+                break
+            yield ''.join(buffered)
+
+    def close(self):
+        # the DBSessionRemoverMiddleware leaves the session alone for
+        # streamed responses
+        DBSession.remove()
+
+
+def stream_response(chunks, encoding='utf-8', chunk_size=CHUNK_SIZE):
+    """Return a WSGI iterable which produces the (unicode) chunks.
+
+    Must be called during the request.
+
+    :rtype: :class:`StreamedResponse`
+    """
+    pylons.request.environ[STREAMING_ENVIRON_KEY] = True
+    return StreamedResponse(chunks, encoding=encoding, chunk_size=chunk_size)
+
+
+def iter_media(query, restrict=None, first_id=None, limit=None,
+               batch_size=BATCH_SIZE):
+    """Iterate over the media of the query in batches, ordered by id.
+
+    Only one batch is held in memory at any time. Files, tags and
+    categories of a batch are loaded with one query each.
+
+    :param query: A :class:`mediadrop.model.media.MediaQuery`.
+    :param restrict: An optional callable which filters the query for
+        every batch, e.g. :func:`mediadrop.lib.auth.util.viewable_media`.
+    :param first_id: Start with the media item with this id.
+    :param limit: Stop after this many media items (before restriction).
+    """
+    ids_query = query.with_entities(Media.id).order_by(Media.id)
+    if first_id is not None:
+        ids_query = ids_query.filter(Media.id >= first_id)
+    restrict = restrict or (lambda query: query)
+    last_id = None
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = batch_size if remaining is None else min(batch_size, remaining)
+        batch_query = ids_query
+        if last_id is not None:
+            batch_query = batch_query.filter(Media.id > last_id)
+        media_ids = [row[0] for row in batch_query.limit(size)]
+        if not media_ids:
+            break
+        last_id = media_ids[-1]
+        if remaining is not None:
+            remaining -= len(media_ids)
+        batch = query.filter(Media.id.in_(media_ids)).order_by(Media.id)\
+            .options(orm.subqueryload(Media.files),
+                     orm.subqueryload(Media.tags),
+                     orm.subqueryload(Media.categories))
+        for media in restrict(batch):
+            yield media
+
+
+def page_cursors(query, page_size):
+    """Return cursor tokens for the pages of the given size if the media of
+    the query are split into pages (ordered by id).
+
+    Every page is located by skipping ``page_size`` ids of the index from
+    the start of the previous page so no query has to skip more than one
+    page. Pass the cursor to :func:`cursor_first_id` to get the first id of
+    the page for :func:`iter_media`.
+
+    :param query: A :class:`mediadrop.model.media.MediaQuery`.
+    :rtype: list
+    """
+    ids_query = query.with_entities(Media.id).order_by(Media.id)
+    first_id = ids_query.limit(1).scalar()
+    cursors = []
+    while first_id is not None:
+        cursors.append(encode_cursor([first_id]))
+        first_id = ids_query.filter(Media.id >= first_id)\
+            .offset(page_size).limit(1).scalar()
+    return cursors
+
+def cursor_first_id(cursor):
+    """Return the first media id of a page as returned by
+    :func:`page_cursors` or None if the cursor is invalid."""
+    values = decode_cursor(cursor, seek_order(Media.query.order_by(Media.id)))
+    return values and values[0] or None
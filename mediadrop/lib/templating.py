@@ -22,6 +22,7 @@ __all__ = [
     'XHTMLPlusSerializer',
     'render',
     'render_stream',
+    'render_streamed',
 ]
 
 log = logging.getLogger(__name__)
@@ -114,16 +115,37 @@ def render_stream(stream, method='auto', template_name=None):
     :returns: A subclassed `unicode` object.
 
     """
+    method = _serialization_method(method, template_name)
+    return Markup(stream.render(method=method, encoding=None))
+
+def render_streamed(template, tmpl_vars=None, method='auto'):
+    """Render the given template while the response is sent to the client.
+
+    The markup is serialized lazily so the template can iterate over
+    large result sets (see :func:`mediadrop.lib.streaming.iter_media`)
+    without building the whole document in memory.
+
+    :param template: A template path.
+    :param tmpl_vars: A dict of variables to pass into the template.
+    :param method: The serialization method, see :func:`render_stream`.
+    :returns: A WSGI iterable of utf-8 encoded chunks.
+
+    """
+    # the model imports this module (through the forms)
+    from mediadrop.lib.streaming import stream_response
+    stream = render(template, tmpl_vars=tmpl_vars)
+    method = _serialization_method(method, template)
+    return stream_response(stream.serialize(method=method))
+
+def _serialization_method(method, template_name):
     if method == 'auto':
         if template_name and template_name.endswith('.xml'):
             method = 'xml'
         else:
             method = 'xhtml'
-
     if method == 'xhtml':
         method = XHTMLPlusSerializer
-
-    return Markup(stream.render(method=method, encoding=None))
+    return method
 
 class XHTMLPlusSerializer(XHTMLSerializer):
     """
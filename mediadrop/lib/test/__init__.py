@@ -20,17 +20,27 @@ from mediadrop.lib.test.support import *
 def suite():
     from mediadrop.controllers.tests import login_test, upload_test
     from mediadrop.lib.auth.tests import (
-        cookieplugin_test,
+        category_access_policy_test, cookieplugin_test,
         filtering_restricted_items_test,
         group_based_permissions_policy_test,
         is_logged_in_decorator_test,
         loginform_test,
         mediadrop_permission_system_test,
-        permission_system_test, query_result_proxy_test, static_query_test)
-    from mediadrop.lib.tests import (css_delivery_test, current_url_test,
-        helpers_test, human_readable_size_test, js_delivery_test,
-        observable_test, players_test, request_mixin_test,
-        translator_test, url_for_test, xhtml_normalization_test)
+        permission_context_test, permission_system_test,
+        query_result_proxy_test, static_query_test)
+    from mediadrop.lib.tests import (api_cache_test, catalog_test,
+        conditional_get_test,
+        css_delivery_test,
+        current_url_test, embed_cache_test, feed_files_test, helpers_test,
+        human_readable_size_test, js_delivery_test, keyset_pagination_test,
+        media_export_test,
+        observable_test,
+        players_test, popularity_test,
+        random_media_test, related_media_test, request_mixin_test,
+        streaming_test, translator_test, url_for_test, view_counter_test,
+        xhtml_normalization_test)
+    from mediadrop.lib.search.tests import (capabilities_test, indexer_test,
+        inverted_index_test, postgresql_test, result_cache_test, suggest_test)
     from mediadrop.lib.services.tests import youtube_client_test
     from mediadrop.lib.storage.tests import youtube_storage_test
     from mediadrop.model.tests import (category_example_test, group_example_test, 
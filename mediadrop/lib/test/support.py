@@ -7,6 +7,7 @@
 # See LICENSE.txt in the main project directory, for more information.
 
 from cStringIO import StringIO
+from datetime import datetime, timedelta
 import os
 import urllib
 
@@ -29,6 +30,7 @@ from mediadrop.config.middleware import create_tw_engine_manager
 from mediadrop.lib.app_globals import is_object_registered
 from mediadrop.lib.paginate import Bunch
 from mediadrop.lib.i18n import Translator
+from mediadrop.model.media import Media
 from mediadrop.model.meta import DBSession, metadata
 from mediadrop.plugin import PluginManager
 
@@ -36,6 +38,7 @@ __all__ = [
     'build_http_body', 
     'create_wsgi_environ',
     'fake_request',
+    'published_media',
     'register_instance',
     'remove_globals',
     'setup_session',
@@ -196,6 +199,14 @@ def remove_globals():
             global_._pop_object()
 
 
+def published_media(**kwargs):
+    """Return a new media item (see :meth:`Media.example`) which was
+    published yesterday unless other values are given."""
+    kwargs.setdefault('publish_on', datetime.now() - timedelta(days=1))
+    return Media.example(reviewed=True, encoded=True, publishable=True,
+        **kwargs)
+
+
 def setup_session(registry=None, if_not_registered=True):
     assert if_not_registered == True, 'only True supported right now'
     paste_registry = registry or _paste_registry(pylons.request)
@@ -0,0 +1,132 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+
+from pythonic_testcase import *
+import simplejson
+from webob import Request
+
+from mediadrop.config.middleware import setup_app
+from mediadrop.lib.api_cache import api_cache_key, normalize_api_params
+from mediadrop.lib.test.db_testcase import DBTestCase
+from mediadrop.lib.test.support import published_media
+from mediadrop.model import Category, DBSession, Media
+from mediadrop.model.media import media as media_table
+
+
+class APICacheKeyTest(PythonicTestCase):
+    def test_normalizes_parameters(self):
+        assert_equals({'order': u'views desc', 'limit': u'10'},
+            normalize_api_params(dict(order=' Views  DESC', limit=10,
+                api_key='secret', search='', tag=None)))
+
+    def test_key_depends_on_action_parameters_and_version(self):
+        params = {'limit': u'10'}
+        key = api_cache_key(u'MediaController.index', params, u'public', 1)
+        assert_equals(key, api_cache_key(u'MediaController.index',
+            {'limit': u'10'}, u'public', 1))
+        assert_not_equals(key, api_cache_key(u'CategoriesController.index',
+            params, u'public', 1))
+        assert_not_equals(key, api_cache_key(u'MediaController.index',
+            {'limit': u'5'}, u'public', 1))
+        assert_not_equals(key, api_cache_key(u'MediaController.index',
+            params, u'key', 1))
+        assert_not_equals(key, api_cache_key(u'MediaController.index',
+            params, u'public', 2))
+
+
+class APIResponseCacheTest(DBTestCase):
+    def setUp(self):
+        super(APIResponseCacheTest, self).setUp()
+        app_globals = self.pylons_config['pylons.app_globals']
+        app_globals.settings['api_secret_key_required'] = 'false'
+        app_globals.cache.get_cache('api_responses').clear()
+        self.app = setup_app(self.pylons_config, full_stack=False,
+            static_files=False)
+        self.media_id = self.publish(u'Hedgehog').id
+
+    def get(self, url, **headers):
+        return Request.blank(url, headers=headers).get_response(self.app)
+
+    def get_json(self, url):
+        response = self.get(url)
+        assert_equals(200, response.status_int)
+        return simplejson.loads(response.body)
+
+    def publish(self, title):
+        media = published_media(title=title)
+        DBSession.commit()
+        return media
+
+    def set_views(self, views):
+        # counters are written without the ORM (see view_counter)
+        DBSession.execute(media_table.update()\
+            .where(media_table.c.id == self.media_id).values(views=views))
+        DBSession.commit()
+
+    def views(self, result):
+        views = dict((item['id'], item['views']) for item in result['media'])
+        return views[self.media_id]
+
+    def test_caches_responses(self):
+        result = self.get_json('/api/media?limit=5&order=views+desc')
+        self.set_views(42)
+
+        cached = self.get_json('/api/media?order=VIEWS%20desc&limit=5&api_key=')
+        assert_equals(result, cached)
+        assert_not_equals(42, self.views(cached))
+        assert_equals(42, self.views(self.get_json('/api/media?limit=4')))
+
+    def test_media_changes_invalidate_cached_responses(self):
+        self.get_json('/api/media')
+        self.set_views(42)
+        # the session is removed at the end of each request
+        Media.query.get(self.media_id).title = u'Porcupine'
+        DBSession.commit()
+
+        result = self.get_json('/api/media')
+        info = [item for item in result['media'] if item['id'] == self.media_id][0]
+        assert_equals(u'Porcupine', info['title'])
+        assert_equals(42, info['views'])
+
+    def test_category_changes_invalidate_cached_responses(self):
+        category_id = Category.example(name=u'Animals').id
+        DBSession.commit()
+        result = self.get_json('/api/categories?limit=50')
+        assert_contains(u'Animals', [item['name'] for item in result['categories']])
+
+        Category.query.get(category_id).name = u'Plants'
+        DBSession.commit()
+        result = self.get_json('/api/categories?limit=50')
+        assert_contains(u'Plants', [item['name'] for item in result['categories']])
+
+    def test_cached_responses_answer_conditional_requests(self):
+        etag = self.get('/api/media').headers['ETag']
+        response = self.get('/api/media')
+        assert_equals(etag, response.headers['ETag'])
+        assert_equals(304, self.get('/api/media', If_None_Match=etag).status_int)
+
+    def test_does_not_cache_random_results_or_disabled_caches(self):
+        self.get_json('/api/media?order=random')
+        self.set_views(42)
+        result = self.get_json('/api/media?order=random&limit=50')
+        assert_equals(42, self.views(result))
+
+        self.pylons_config['cache_enabled'] = 'false'
+        self.get_json('/api/media?limit=5')
+        self.set_views(43)
+        assert_equals(43, self.views(self.get_json('/api/media?limit=5')))
+
+
+import unittest
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(APICacheKeyTest))
+    suite.addTest(unittest.makeSuite(APIResponseCacheTest))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite')
@@ -0,0 +1,87 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+
+from pythonic_testcase import *
+
+from mediadrop.lib.test.db_testcase import DBTestCase
+from mediadrop.lib.test.support import published_media
+from mediadrop.model import (Category, current_catalog_version, DBSession,
+    Media, Tag)
+
+
+class CatalogVersionTest(DBTestCase):
+    def version(self):
+        return current_catalog_version(DBSession.connection())
+
+    def test_increments_version_when_media_is_published(self):
+        version = self.version()
+        published_media()
+        assert_equals(version + 1, self.version())
+
+    def test_increments_version_when_media_is_unpublished_or_deleted(self):
+        media = published_media()
+        version = self.version()
+        media.publishable = False
+        DBSession.flush()
+        assert_equals(version + 1, self.version())
+
+        DBSession.delete(media)
+        DBSession.flush()
+        assert_equals(version + 2, self.version())
+
+    def test_increments_version_when_published_content_changes(self):
+        media = published_media()
+        version = self.version()
+        media.title = u'New Title'
+        DBSession.flush()
+        assert_equals(version + 1, self.version())
+
+        media.publishable = False
+        DBSession.flush()
+        version = self.version()
+        media.title = u'Unpublished Title'
+        DBSession.flush()
+        assert_equals(version, self.version())
+
+    def test_ignores_unrelated_changes(self):
+        media = published_media()
+        version = self.version()
+        media.notes = u'Internal notes'
+        media.likes += 1
+        media.popularity_points += 1
+        DBSession.flush()
+        assert_equals(version, self.version())
+
+    def test_increments_version_when_categories_or_tags_change(self):
+        version = self.version()
+        category = Category.example(name=u'Animals')
+        assert_equals(version + 1, self.version())
+        category.name = u'Plants'
+        DBSession.flush()
+        assert_equals(version + 2, self.version())
+
+        tag = Tag(u'spiny')
+        DBSession.add(tag)
+        DBSession.flush()
+        DBSession.delete(tag)
+        DBSession.flush()
+        assert_equals(version + 4, self.version())
+
+    def test_does_not_increment_version_for_unpublished_media(self):
+        version = self.version()
+        Media.example()
+        assert_equals(version, self.version())
+
+
+import unittest
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(CatalogVersionTest))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite')
@@ -0,0 +1,102 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+
+from datetime import datetime, timedelta
+
+from pythonic_testcase import *
+from webob import Request
+
+from mediadrop.config.middleware import setup_app
+from mediadrop.lib.test.db_testcase import DBTestCase
+from mediadrop.lib.test.support import published_media
+from mediadrop.model import DBSession
+
+
+class ConditionalGetTest(DBTestCase):
+    def setUp(self):
+        super(ConditionalGetTest, self).setUp()
+        self.pylons_config['cache_enabled'] = 'false'
+        settings = self.pylons_config['pylons.app_globals'].settings
+        settings['sitemaps_display'] = 'True'
+        settings['rss_display'] = 'True'
+        settings['api_secret_key_required'] = 'false'
+        self.app = setup_app(self.pylons_config, full_stack=False,
+            static_files=False)
+
+    def get(self, url, **headers):
+        request = Request.blank(url, headers=headers)
+        return request.get_response(self.app)
+
+    def publish(self, title):
+        media = published_media(title=title)
+        DBSession.commit()
+        return media
+
+    def assert_not_modified(self, url, **headers):
+        response = self.get(url, **headers)
+        assert_equals(304, response.status_int)
+        assert_equals('', response.body)
+        return response
+
+    def test_answers_matching_etags_with_not_modified(self):
+        for url in ('/latest.xml', '/mrss.xml', '/sitemap.xml',
+                    '/podcasts/feed/hello-world.xml', '/api/media?limit=5',
+                    '/api/media?limit=5&count=false&cursor='):
+            response = self.get(url)
+            assert_equals(200, response.status_int, message=url)
+            etag = response.headers['ETag']
+            assert_true(etag.startswith('W/"'), message=url)
+            assert_not_none(response.last_modified, message=url)
+
+            not_modified = self.assert_not_modified(url, If_None_Match=etag)
+            assert_equals(etag, not_modified.headers['ETag'])
+
+    def test_etag_changes_when_media_is_published_or_deleted(self):
+        etag = self.get('/latest.xml').headers['ETag']
+        media = self.publish(u'Hedgehog')
+        response = self.get('/latest.xml', If_None_Match=etag)
+        assert_equals(200, response.status_int)
+        assert_not_equals(etag, response.headers['ETag'])
+
+        etag = response.headers['ETag']
+        DBSession.delete(media)
+        DBSession.commit()
+        response = self.get('/latest.xml', If_None_Match=etag)
+        assert_equals(200, response.status_int)
+        assert_not_equals(etag, response.headers['ETag'])
+
+    def test_etag_depends_on_the_query_parameters(self):
+        etag = self.get('/api/media?limit=5').headers['ETag']
+        response = self.get('/api/media?limit=1', If_None_Match=etag)
+        assert_equals(200, response.status_int)
+        assert_not_equals(etag, response.headers['ETag'])
+
+    def test_answers_if_modified_since(self):
+        self.publish(u'Hedgehog')
+        response = self.get('/latest.xml')
+        last_modified = response.headers['Last-Modified']
+        self.assert_not_modified('/latest.xml', If_Modified_Since=last_modified)
+
+        yesterday = datetime.utcnow() - timedelta(days=1)
+        response = self.get('/latest.xml',
+            If_Modified_Since=yesterday.strftime('%a, %d %b %Y %H:%M:%S GMT'))
+        assert_equals(200, response.status_int)
+
+    def test_random_api_results_are_not_validated(self):
+        response = self.get('/api/media?order=random')
+        assert_equals(200, response.status_int)
+        assert_not_contains('ETag', response.headers)
+
+
+import unittest
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(ConditionalGetTest))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite')
@@ -0,0 +1,90 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+
+from datetime import datetime, timedelta
+
+from pythonic_testcase import *
+from webob import Request
+
+from mediadrop.config.middleware import setup_app
+from mediadrop.lib.storage.api import add_new_media_file
+from mediadrop.lib.test.db_testcase import DBTestCase
+from mediadrop.model import (cleanup_players_table, DBSession, Media,
+    MediaFile, PlayerPrefs)
+from mediadrop.model.media import media as media_table
+
+
+class EmbedCacheTest(DBTestCase):
+    def setUp(self):
+        super(EmbedCacheTest, self).setUp()
+        app_globals = self.pylons_config['pylons.app_globals']
+        app_globals.cache.get_cache('embed_markup').clear()
+        self.app = setup_app(self.pylons_config, full_stack=False,
+            static_files=False)
+        media = Media.example(title=u'Hedgehog', reviewed=True, encoded=True,
+            publishable=True, publish_on=datetime.now() - timedelta(days=1))
+        add_new_media_file(media, url=u'http://site.example/videos.mp4')
+        cleanup_players_table(enabled=True)
+        DBSession.commit()
+        self.media_id = media.id
+
+    def embed_player(self, slug=u'hedgehog'):
+        response = Request.blank('/media/%s/embed_player' % slug)\
+            .get_response(self.app)
+        assert_equals(200, response.status_int)
+        return response.body
+
+    def test_caches_player_markup(self):
+        assert_contains('hedgehog-player', self.embed_player())
+        # keeps modified_on so the cached markup is still used
+        modified_on = Media.query.get(self.media_id).modified_on
+        DBSession.execute(media_table.update()\
+            .where(media_table.c.id == self.media_id)\
+            .values(slug=u'porcupine', modified_on=modified_on))
+        DBSession.commit()
+        assert_contains('hedgehog-player', self.embed_player(u'porcupine'))
+
+    def test_media_edits_invalidate_cached_markup(self):
+        self.embed_player()
+        # the session is removed at the end of each request
+        media = Media.query.get(self.media_id)
+        media.slug = u'porcupine'
+        media.modified_on = datetime.now() + timedelta(seconds=1)
+        DBSession.commit()
+        assert_contains('porcupine-player', self.embed_player(u'porcupine'))
+
+    def test_file_changes_invalidate_cached_markup(self):
+        assert_contains('videos.mp4', self.embed_player())
+        media_file = Media.query.get(self.media_id).files[0]
+        media_file.unique_id = u'http://site.example/other.mp4'
+        DBSession.commit()
+        assert_contains('other.mp4', self.embed_player())
+
+        media = Media.query.get(self.media_id)
+        add_new_media_file(media, url=u'http://site.example/extra.mp4')
+        DBSession.delete(MediaFile.query.get(media_file.id))
+        DBSession.commit()
+        body = self.embed_player()
+        assert_not_contains('other.mp4', body)
+        assert_contains('extra.mp4', body)
+
+    def test_player_changes_invalidate_cached_markup(self):
+        body = self.embed_player()
+        for player in PlayerPrefs.query:
+            player.enabled = (player.name == u'html5')
+        DBSession.commit()
+        assert_not_equals(body, self.embed_player())
+
+
+import unittest
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(EmbedCacheTest))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite')
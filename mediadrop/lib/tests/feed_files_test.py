@@ -0,0 +1,144 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+
+from datetime import datetime, timedelta
+import os
+
+from pythonic_testcase import *
+from webob import Request
+
+from mediadrop.config.middleware import setup_app
+from mediadrop.lib.feed_files import feed_files
+from mediadrop.lib.test.db_testcase import DBTestCase
+from mediadrop.model import DBSession, Media
+
+
+class FeedFilesTest(DBTestCase):
+    def setUp(self):
+        super(FeedFilesTest, self).setUp()
+        self.feeds_dir = os.path.join(self.env_dir, 'feeds')
+        self.pylons_config['pregenerate_feeds'] = 'true'
+        self.pylons_config['feeds_dir'] = self.feeds_dir
+        self.pylons_config['cache_enabled'] = 'false'
+        self.pylons_config['file_serve_method'] = 'default'
+        settings = self.pylons_config['pylons.app_globals'].settings
+        settings['sitemaps_display'] = 'True'
+        settings['rss_display'] = 'True'
+        self.app = setup_app(self.pylons_config, full_stack=False,
+            static_files=False)
+        self.scheduled = []
+        feed_files.schedule = self.scheduled.append
+
+    def tearDown(self):
+        del feed_files.schedule
+        super(FeedFilesTest, self).tearDown()
+
+    def feed_file(self, path):
+        return os.path.join(self.feeds_dir, path)
+
+    def read(self, path):
+        return open(self.feed_file(path), 'rb').read()
+
+    def generate(self):
+        return feed_files.generate('http://server.example/', app=self.app)
+
+    def test_generates_files_for_all_feeds(self):
+        written = self.generate()
+        assert_equals(len(feed_files.feeds()), written)
+        for path in ('sitemap.xml', 'mrss.xml', 'latest.xml', 'featured.xml',
+                     'podcasts/feed/hello-world.xml'):
+            assert_true(os.path.isfile(self.feed_file(path)), message=path)
+
+        media = Media.query.published().first()
+        sitemap = self.read('sitemap.xml')
+        assert_contains('<urlset', sitemap)
+        assert_contains('http://server.example:80/media/%s' % media.slug, sitemap)
+        assert_contains('<rss', self.read('latest.xml'))
+        assert_equals([], [name for name in os.listdir(self.feeds_dir)
+                           if name.startswith('.')])
+
+    def test_removes_files_of_unavailable_feeds(self):
+        self.generate()
+        stale_file = self.feed_file('categories/feed/deleted.xml')
+        open(stale_file, 'wb').write('<rss/>')
+
+        settings = self.pylons_config['pylons.app_globals'].settings
+        settings['sitemaps_display'] = 'False'
+        self.generate()
+        assert_false(os.path.exists(self.feed_file('sitemap.xml')))
+        assert_false(os.path.exists(self.feed_file('mrss.xml')))
+        assert_false(os.path.exists(stale_file))
+        assert_true(os.path.isfile(self.feed_file('latest.xml')))
+
+    def test_serves_pregenerated_files(self):
+        self.generate()
+        open(self.feed_file('latest.xml'), 'wb').write('<rss>pregenerated</rss>')
+
+        response = Request.blank('/latest.xml').get_response(self.app)
+        assert_equals(200, response.status_int)
+        assert_equals('<rss>pregenerated</rss>', response.body)
+        assert_equals('application/rss+xml', response.content_type)
+
+        # custom parameters are rendered on request
+        response = Request.blank('/latest.xml?limit=1').get_response(self.app)
+        assert_contains('<channel>', response.body)
+
+        self.pylons_config['pregenerate_feeds'] = 'false'
+        response = Request.blank('/latest.xml').get_response(self.app)
+        assert_contains('<channel>', response.body)
+
+    def test_sitemap_index_links_the_pregenerated_pages(self):
+        for i in range(2):
+            Media.example(reviewed=True, encoded=True, publishable=True,
+                publish_on=datetime.now() - timedelta(days=1))
+        DBSession.commit()
+        response = Request.blank('/sitemap.xml?limit=1').get_response(self.app)
+        assert_contains('<sitemapindex', response.body)
+        assert_contains('/sitemap1.xml</loc>', response.body)
+        assert_not_contains('cursor', response.body)
+
+        self.pylons_config['pregenerate_feeds'] = 'false'
+        response = Request.blank('/sitemap.xml?limit=1').get_response(self.app)
+        assert_contains('/sitemap1.xml?cursor=', response.body)
+
+    def test_ignores_paths_outside_of_the_feeds_directory(self):
+        assert_equals(self.feed_file('mrss.xml'), feed_files.path_for('/mrss.xml'))
+        assert_none(feed_files.path_for('/categories/feed/../../../passwd'))
+
+    def test_schedules_regeneration_when_media_is_published(self):
+        media = Media.example()
+        DBSession.commit()
+        assert_equals([], self.scheduled)
+
+        media.title = u'Draft'
+        DBSession.commit()
+        assert_equals([], self.scheduled)
+
+        media.reviewed = media.encoded = media.publishable = True
+        media.publish_on = datetime.now() - timedelta(days=1)
+        DBSession.flush()
+        DBSession.rollback()
+        assert_equals([], self.scheduled)
+
+        media.reviewed = media.encoded = media.publishable = True
+        media.publish_on = datetime.now() - timedelta(days=1)
+        DBSession.commit()
+        assert_length(1, self.scheduled)
+
+        media.views = 10
+        DBSession.commit()
+        assert_length(1, self.scheduled)
+
+
+import unittest
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(FeedFilesTest))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite')
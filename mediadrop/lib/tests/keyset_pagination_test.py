@@ -0,0 +1,153 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+
+from datetime import datetime, timedelta
+import re
+
+from pythonic_testcase import *
+from webob import Request
+
+from mediadrop.config.middleware import setup_app
+from mediadrop.lib.auth.query_result_proxy import QueryResultProxy
+from mediadrop.lib.paginate import (CustomPage, decode_cursor, encode_cursor,
+    seek_order)
+from mediadrop.lib.test.db_testcase import DBTestCase
+from mediadrop.model import DBSession, Media
+
+
+class KeysetPaginationTest(DBTestCase):
+    def setUp(self):
+        super(KeysetPaginationTest, self).setUp()
+        for media in Media.query:
+            DBSession.delete(media)
+        DBSession.commit()
+        self.now = datetime(2018, 5, 3, 12, 30, 15, 123)
+        # two media share the same date so the id decides about the order
+        for hours in (1, 2, 3, 3, 4, 5, 6):
+            self.add_media(self.now - timedelta(hours=hours))
+        self.query = Media.query.order_by(Media.publish_on.desc())
+
+    def add_media(self, publish_on):
+        media = Media.example(publish_on=publish_on)
+        DBSession.commit()
+        return media
+
+    def ids(self, items):
+        return [item.id for item in items]
+
+    def all_ids(self):
+        return self.ids(self.query.order_by(Media.id.desc()))
+
+    def test_appends_the_primary_key_to_the_order(self):
+        order = seek_order(self.query)
+        assert_equals([('publish_on', True), ('id', True)],
+                      [(column.key, descending) for column, descending in order])
+        assert_none(seek_order(Media.query))
+
+    def test_can_encode_and_decode_cursors(self):
+        order = seek_order(self.query)
+        cursor = encode_cursor([self.now, 42])
+        assert_equals([self.now, 42], decode_cursor(cursor, order))
+
+        assert_none(decode_cursor('invalid', order))
+        assert_none(decode_cursor(encode_cursor([self.now]), order))
+        assert_none(decode_cursor(encode_cursor([self.now, '42']), order))
+        assert_none(decode_cursor(u'\xe4', order))
+
+    def test_fetches_next_page_after_the_cursor(self):
+        first_page = CustomPage(self.query, 1, items_per_page=3, seek=True)
+        assert_equals(self.all_ids()[:3], self.ids(first_page))
+        cursor_args = first_page.cursor_args(2)
+        assert_equals(['after'], cursor_args.keys())
+        assert_equals({}, first_page.cursor_args(3))
+
+        # media published in the meantime does not shift the next page
+        self.add_media(self.now)
+        page = CustomPage(self.query, 2, items_per_page=3, seek=True,
+                          **cursor_args)
+        assert_equals(self.all_ids()[4:7], self.ids(page))
+        offset_page = CustomPage(self.query, 2, items_per_page=3, seek=True)
+        assert_equals(self.all_ids()[3:6], self.ids(offset_page))
+
+    def test_fetches_previous_page_before_the_cursor(self):
+        page = CustomPage(self.query, 3, items_per_page=2, seek=True)
+        assert_equals(self.all_ids()[4:6], self.ids(page))
+
+        cursor_args = page.cursor_args(2)
+        assert_equals(['before'], cursor_args.keys())
+        previous_page = CustomPage(self.query, 2, items_per_page=2, seek=True,
+                                   **cursor_args)
+        assert_equals(self.all_ids()[2:4], self.ids(previous_page))
+        assert_equals(2, previous_page.page)
+
+    def test_falls_back_to_offset_for_invalid_cursors(self):
+        page = CustomPage(self.query, 2, items_per_page=3, seek=True,
+                          after='invalid')
+        assert_equals(self.all_ids()[3:6], self.ids(page))
+
+        media = list(self.query.order_by(Media.id.desc()))
+        page = CustomPage(media, 2, items_per_page=3, seek=True,
+                          after=encode_cursor([self.now, 1]))
+        assert_equals(self.all_ids()[3:6], self.ids(page))
+        assert_equals({}, page.cursor_args(3))
+
+    def test_applies_the_filter_of_query_result_proxies(self):
+        excluded_id = self.all_ids()[4]
+        proxy = QueryResultProxy(self.query,
+            filter_=lambda media: media.id != excluded_id)
+        first_page = CustomPage(proxy, 1, items_per_page=3, seek=True)
+        proxy = QueryResultProxy(self.query,
+            filter_=lambda media: media.id != excluded_id)
+        page = CustomPage(proxy, 2, items_per_page=3, seek=True,
+                          **first_page.cursor_args(2))
+        assert_equals([self.all_ids()[3]] + self.all_ids()[5:7], self.ids(page))
+
+
+class SitemapPagesTest(DBTestCase):
+    def setUp(self):
+        super(SitemapPagesTest, self).setUp()
+        settings = self.pylons_config['pylons.app_globals'].settings
+        settings['sitemaps_display'] = 'True'
+        self.app = setup_app(self.pylons_config, full_stack=False,
+            static_files=False)
+
+    def get(self, url):
+        response = Request.blank(url).get_response(self.app)
+        assert_equals(200, response.status_int)
+        return response.body
+
+    def media_links(self, sitemap):
+        return re.findall(r'<loc>(http://[^<]+/media/[^<]+)</loc>', sitemap)
+
+    def test_links_pages_with_cursors(self):
+        published = Media.query.published().count()
+        assert_true(published > 2)
+        index = self.get('/sitemap.xml?limit=2')
+        pages = re.findall(r'<loc>http://localhost:80(/sitemap\d+\.xml\?[^<]+)</loc>', index)
+        assert_length((published + 1) // 2, pages)
+
+        media_links = []
+        for page_number, url in enumerate(pages):
+            url = url.replace('&amp;', '&') + '&limit=2'
+            assert_contains('cursor=', url)
+            page = self.get(url)
+            media_links.extend(self.media_links(page))
+            # pages linked without a cursor contain the same media
+            assert_equals(self.media_links(page),
+                self.media_links(self.get('/sitemap%d.xml?limit=2' % page_number)))
+        assert_length(published, set(media_links))
+
+
+import unittest
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(KeysetPaginationTest))
+    suite.addTest(unittest.makeSuite(SitemapPagesTest))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite')
@@ -0,0 +1,107 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+
+from datetime import datetime, timedelta
+from StringIO import StringIO
+import urllib
+
+from pythonic_testcase import *
+import simplejson
+from webob import Request
+
+from mediadrop.config.middleware import setup_app
+from mediadrop.lib import media_export
+from mediadrop.lib.media_export import export_to_file, parse_modified_since
+from mediadrop.lib.test.db_testcase import DBTestCase
+from mediadrop.model import DBSession, Media
+from mediadrop.model.media import media as media_table
+
+
+class MediaExportTest(DBTestCase):
+    def setUp(self):
+        super(MediaExportTest, self).setUp()
+        settings = self.pylons_config['pylons.app_globals'].settings
+        settings['api_secret_key_required'] = 'false'
+        self.api_key = settings['api_secret_key'] = 'secret'
+        self.app = setup_app(self.pylons_config, full_stack=False,
+            static_files=False)
+        self.now = datetime.now().replace(microsecond=0)
+        DBSession.execute(media_table.update()\
+            .values(modified_on=self.now - timedelta(days=10)))
+        self.media_ids = []
+        for days in (3, 1, 2, 1):
+            media = Media.example(title=u'Hedgehog %d' % days, reviewed=True,
+                encoded=True, publishable=True,
+                publish_on=self.now - timedelta(days=5))
+            DBSession.commit()
+            self.set_modified_on(media.id, self.now - timedelta(days=days))
+            self.media_ids.append(media.id)
+        self.batch_size = media_export.EXPORT_BATCH_SIZE
+        media_export.EXPORT_BATCH_SIZE = 2
+
+    def tearDown(self):
+        media_export.EXPORT_BATCH_SIZE = self.batch_size
+        super(MediaExportTest, self).tearDown()
+
+    def set_modified_on(self, media_id, modified_on):
+        DBSession.execute(media_table.update()\
+            .where(media_table.c.id == media_id)\
+            .values(modified_on=modified_on))
+        DBSession.commit()
+
+    def export(self, **params):
+        params.setdefault('api_key', self.api_key)
+        url = '/api/media/export?' + urllib.urlencode(params)
+        return Request.blank(url).get_response(self.app)
+
+    def parse(self, body):
+        return [simplejson.loads(line) for line in body.splitlines()]
+
+    def test_exports_published_media_ordered_by_modification(self):
+        response = self.export()
+        assert_equals(200, response.status_int)
+        assert_equals('application/x-ndjson', response.content_type)
+        items = self.parse(response.body)
+
+        ids = [item['id'] for item in items]
+        expected = [self.media_ids[i] for i in (0, 2, 1, 3)]
+        assert_equals(expected, [i for i in ids if i in self.media_ids])
+        assert_equals(Media.query.published().count(), len(ids))
+        assert_equals(u'Hedgehog 3', items[ids.index(expected[0])]['title'])
+        assert_contains('thumbs', items[0])
+
+    def test_can_export_media_modified_since_a_date(self):
+        since = self.now - timedelta(days=1, hours=1)
+        response = self.export(modified_since=since.strftime('%Y-%m-%d %H:%M:%S'))
+        assert_equals([self.media_ids[1], self.media_ids[3]],
+                      [item['id'] for item in self.parse(response.body)])
+
+        assert_equals(400, self.export(modified_since='yesterday').status_int)
+        assert_none(parse_modified_since('yesterday'))
+        assert_equals(datetime(2018, 5, 3), parse_modified_since('2018-05-03'))
+
+    def test_requires_the_api_key(self):
+        assert_equals(403, self.export(api_key='').status_int)
+        assert_equals(403, self.export(api_key='wrong').status_int)
+
+    def test_can_write_export_to_file(self):
+        output = StringIO()
+        exported = export_to_file(self.app, 'http://media.example', output,
+            self.api_key)
+        items = self.parse(output.getvalue())
+        assert_equals(len(items), exported)
+        assert_true(items[0]['url'].startswith('http://media.example:80/'))
+
+
+import unittest
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(MediaExportTest))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite')
@@ -0,0 +1,95 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+
+from datetime import datetime, timedelta
+
+from pythonic_testcase import *
+from sqlalchemy import sql
+
+from mediadrop.lib.popularity import (popularity_settings,
+    recompute_popularity, update_popularity)
+from mediadrop.lib.test.db_testcase import DBTestCase
+from mediadrop.lib.test.support import published_media
+from mediadrop.lib.util import calculate_popularity
+from mediadrop.model import DBSession, Media
+from mediadrop.model.media import media as media_table
+
+
+class CalculatePopularityTest(PythonicTestCase):
+    def test_newer_media_gets_more_points(self):
+        older = calculate_popularity(datetime(2010, 1, 1), 10, 4, 36)
+        newer = calculate_popularity(datetime(2010, 1, 2, 12), 10, 4, 36)
+        assert_equals(older + 1, newer)
+
+    def test_ranks_media_published_before_2000(self):
+        assert_true(calculate_popularity(datetime(1995, 1, 1), 10, 4, 36) > 0)
+        assert_equals(calculate_popularity(datetime(1850, 1, 1), 16, 4, 36),
+                      calculate_popularity(datetime(1800, 1, 1), 16, 4, 36))
+
+    def test_disliked_media_gets_no_points(self):
+        assert_equals(0, calculate_popularity(datetime(2010, 1, 1), -3, 4, 36))
+
+
+class PopularityUpdateTest(DBTestCase):
+    def published_media(self, **kwargs):
+        kwargs.setdefault('publish_on', datetime(2010, 1, 1))
+        return published_media(**kwargs)
+
+    def points(self, media):
+        c = media_table.c
+        select = sql.select([c.popularity_points, c.popularity_likes,
+            c.popularity_dislikes], c.id == media.id)
+        return tuple(DBSession.execute(select).fetchone())
+
+    def test_reads_settings_from_database(self):
+        assert_equals((4, 36), popularity_settings(DBSession.connection()))
+
+    def test_updates_only_changed_scores(self):
+        media = self.published_media(likes=20, dislikes=4)
+        draft = Media.example(likes=5)
+        DBSession.execute(media_table.update().values(popularity_likes=7))
+        connection = DBSession.connection()
+
+        assert_equals(2, update_popularity(connection, [media.id, draft.id]))
+        expected = tuple(calculate_popularity(media.publish_on, score, 4, 36)
+                         for score in (16, 20, 4))
+        assert_equals(expected, self.points(media))
+        assert_equals((0, 0, 0), self.points(draft))
+
+        assert_equals(0, update_popularity(connection, [media.id, draft.id]))
+
+    def test_scores_media_published_by_reaching_publish_date(self):
+        media = self.published_media(likes=3,
+            publish_on=datetime.now() + timedelta(hours=1))
+        media.update_popularity()
+        DBSession.flush()
+        assert_equals((0, 0, 0), self.points(media))
+
+        later = datetime.now() + timedelta(hours=2)
+        update_popularity(DBSession.connection(), [media.id], now=later)
+        assert_not_equals(0, self.points(media)[0])
+
+    def test_can_recompute_all_media_in_batches(self):
+        media = [self.published_media(likes=i+1) for i in range(3)]
+        progress = []
+        updated = recompute_popularity(DBSession.connection(), decay=(4, 36),
+            batch_size=2, progress=progress.append)
+        assert_equals(3, updated)
+        total = Media.query.count()
+        assert_equals(range(2, total, 2) + [total], progress)
+        assert_true(all(self.points(m)[0] > 0 for m in media))
+
+
+import unittest
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(CalculatePopularityTest))
+    suite.addTest(unittest.makeSuite(PopularityUpdateTest))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite')
@@ -0,0 +1,85 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+
+from datetime import datetime, timedelta
+
+from pythonic_testcase import *
+
+from mediadrop.lib.random_media import random_media, RandomMediaSampler
+from mediadrop.lib.test.db_testcase import DBTestCase
+from mediadrop.lib.test.support import published_media
+from mediadrop.model import DBSession, Media
+
+
+class RandomMediaTest(DBTestCase):
+    def setUp(self):
+        super(RandomMediaTest, self).setUp()
+        # remove the example media created by the setup
+        for media in Media.query:
+            DBSession.delete(media)
+        DBSession.commit()
+        self.sampler = RandomMediaSampler()
+
+    def published_media(self, **kwargs):
+        media = published_media(**kwargs)
+        DBSession.commit()
+        return media
+
+    def pick(self, query=None, **kwargs):
+        if query is None:
+            query = Media.query
+        return random_media(query, sampler=self.sampler, **kwargs)
+
+    def test_returns_distinct_published_media(self):
+        published = set(self.published_media() for i in range(5))
+        Media.example(title=u'Draft')
+        DBSession.commit()
+
+        assert_length(1, self.pick())
+        picks = self.pick(count=10)
+        assert_length(5, picks)
+        assert_equals(published, set(picks))
+
+    def test_refreshes_ids_when_media_is_published(self):
+        self.published_media()
+        assert_length(1, self.sampler.media_ids())
+
+        draft = Media.example()
+        DBSession.commit()
+        assert_length(1, self.sampler.media_ids())
+
+        draft.reviewed = draft.encoded = draft.publishable = True
+        draft.publish_on = datetime.now() - timedelta(days=1)
+        DBSession.commit()
+        assert_length(2, self.sampler.media_ids())
+
+    def test_applies_query_filters_and_restrictions(self):
+        media = [self.published_media() for i in range(20)]
+        wanted = media[7]
+
+        picks = self.pick(Media.query.filter(Media.id == wanted.id), count=3)
+        assert_equals([wanted], picks)
+
+        def restrict(query):
+            return query.filter(Media.id.in_([media[3].id, media[11].id]))
+        picks = self.pick(restrict=restrict, count=5)
+        assert_equals(set([media[3], media[11]]), set(picks))
+
+    def test_returns_nothing_without_published_media(self):
+        Media.example()
+        DBSession.commit()
+        assert_equals([], self.pick())
+
+
+import unittest
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(RandomMediaTest))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite')
@@ -0,0 +1,85 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+
+from pythonic_testcase import *
+
+from mediadrop.lib.related_media import update_related_media
+from mediadrop.lib.test.db_testcase import DBTestCase
+from mediadrop.lib.test.support import published_media
+from mediadrop.model import DBSession, Media
+from mediadrop.model.media import media_related_status
+
+
+class RelatedMediaTest(DBTestCase):
+    def published_media(self, title, tags):
+        media = published_media(title=title)
+        media.set_tags(tags)
+        DBSession.commit()
+        return media
+
+    def related(self, media):
+        return Media.query.related(media).all()
+
+    def test_computes_related_media_when_tags_change(self):
+        cats = self.published_media(u'Cats', u'cute, animals')
+        dogs = self.published_media(u'Dogs', u'animals')
+        self.published_media(u'Cars', u'engines')
+
+        assert_equals([dogs], self.related(cats))
+        assert_equals([cats], self.related(dogs))
+
+    def test_ranks_media_with_more_shared_tags_higher(self):
+        cats = self.published_media(u'Cats', u'cute, animals')
+        dogs = self.published_media(u'Dogs', u'animals')
+        kittens = self.published_media(u'Kittens', u'cute, animals')
+
+        assert_equals([kittens, dogs], self.related(cats))
+
+    def test_removes_media_from_outdated_lists(self):
+        cats = self.published_media(u'Cats', u'animals')
+        dogs = self.published_media(u'Dogs', u'animals')
+        dogs.set_tags(u'pets')
+        DBSession.flush()
+        # the lists are updated when the session commits
+        assert_equals([dogs], self.related(cats))
+        DBSession.commit()
+        assert_equals([], self.related(cats))
+
+    def test_discards_changes_after_rollback(self):
+        cats = self.published_media(u'Cats', u'animals')
+        dogs = self.published_media(u'Dogs', u'animals')
+        dogs.set_tags(u'pets')
+        DBSession.flush()
+        DBSession.rollback()
+        DBSession.commit()
+        assert_equals([dogs], self.related(cats))
+
+    def test_falls_back_to_live_query_for_media_without_list(self):
+        cats = self.published_media(u'Cats', u'animals')
+        dogs = self.published_media(u'Dogs', u'animals')
+        DBSession.execute(media_related_status.delete())
+
+        assert_equals([dogs], self.related(cats))
+
+    def test_can_recompute_lists(self):
+        cats = self.published_media(u'Cats', u'animals')
+        dogs = self.published_media(u'Dogs', u'animals')
+        DBSession.execute(media_related_status.delete())
+
+        update_related_media(DBSession.connection(), [cats.id])
+        assert_equals(1, DBSession.execute(media_related_status.count()).scalar())
+        assert_equals([dogs], self.related(cats))
+
+
+import unittest
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(RelatedMediaTest))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite')
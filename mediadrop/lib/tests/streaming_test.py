@@ -0,0 +1,78 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+
+import zlib
+
+from pythonic_testcase import *
+
+from mediadrop.config.middleware import GzipStreamIterator
+from mediadrop.lib.streaming import iter_media, StreamedResponse
+from mediadrop.lib.test.db_testcase import DBTestCase
+from mediadrop.model import DBSession, Media
+
+
+class IterMediaTest(DBTestCase):
+    def setUp(self):
+        super(IterMediaTest, self).setUp()
+        # remove the example media created by the setup
+        for media in Media.query:
+            DBSession.delete(media)
+        DBSession.commit()
+        self.media = [Media.example(title=u'Media %d' % i) for i in range(7)]
+        DBSession.commit()
+        self.media_ids = [media.id for media in self.media]
+
+    def ids(self, media):
+        return [item.id for item in media]
+
+    def test_iterates_over_all_media_in_batches(self):
+        media = iter_media(Media.query, batch_size=3)
+        assert_equals(self.media_ids, self.ids(media))
+
+    def test_can_limit_the_number_of_media(self):
+        media = iter_media(Media.query, limit=4, batch_size=3)
+        assert_equals(self.media_ids[:4], self.ids(media))
+        assert_equals([], self.ids(iter_media(Media.query, limit=0)))
+
+    def test_can_start_with_a_given_id(self):
+        first_id = self.media_ids[2]
+        media = iter_media(Media.query, first_id=first_id, limit=3,
+                           batch_size=2)
+        assert_equals(self.media_ids[2:5], self.ids(media))
+
+    def test_applies_query_filters_and_restrictions(self):
+        query = Media.query.filter(Media.id != self.media_ids[0])
+        def restrict(query):
+            return query.filter(Media.id != self.media_ids[-1])
+        media = iter_media(query, restrict=restrict, batch_size=2)
+        assert_equals(self.media_ids[1:-1], self.ids(media))
+
+
+class StreamedResponseTest(PythonicTestCase):
+    def test_joins_small_chunks(self):
+        chunks = [u'abc', u'def', u'ghi', u'j\xe4']
+        response = StreamedResponse(chunks, chunk_size=5)
+        assert_equals(['abcdef', 'ghij\xc3\xa4'], list(response))
+
+    def test_can_compress_chunks_while_they_are_sent(self):
+        chunks = ['<item>%d</item>' % i for i in range(100)]
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        compressed = list(GzipStreamIterator(chunks, compressor))
+        assert_length(101, compressed)
+        decompressed = zlib.decompress(''.join(compressed), 16 + zlib.MAX_WBITS)
+        assert_equals(''.join(chunks), decompressed)
+
+
+import unittest
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(IterMediaTest))
+    suite.addTest(unittest.makeSuite(StreamedResponseTest))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite')
@@ -0,0 +1,110 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+
+import threading
+
+from pythonic_testcase import *
+from sqlalchemy import sql
+
+from mediadrop.lib.view_counter import view_counter
+from mediadrop.lib.test.db_testcase import DBTestCase
+from mediadrop.model import DBSession, Media
+from mediadrop.model.media import media as media_table
+
+
+class ViewCounterTest(DBTestCase):
+    def setUp(self):
+        super(ViewCounterTest, self).setUp()
+        view_counter.discard()
+        self.pylons_config['views_flush_interval'] = '3600'
+
+    def tearDown(self):
+        view_counter.__dict__.pop('schedule', None)
+        view_counter.__dict__.pop('flush', None)
+        view_counter.discard()
+        super(ViewCounterTest, self).tearDown()
+
+    def views_in_database(self, media):
+        select = sql.select([media_table.c.views], media_table.c.id == media.id)
+        return DBSession.execute(select).scalar()
+
+    def test_buffers_views_until_flush(self):
+        media = Media.example()
+        other = Media.example()
+        DBSession.commit()
+
+        assert_equals(1, media.increment_views())
+        assert_equals(2, media.increment_views())
+        assert_equals(1, other.increment_views())
+        assert_equals(2, view_counter.pending(media.id))
+        assert_equals(0, self.views_in_database(media))
+
+        assert_equals(2, view_counter.flush(DBSession.connection()))
+        assert_equals(0, view_counter.pending(media.id))
+        assert_equals(2, self.views_in_database(media))
+        assert_equals(1, self.views_in_database(other))
+
+    def test_loaded_media_include_pending_views(self):
+        media = Media.example()
+        DBSession.commit()
+        view_counter.count_view(media.id, views=5)
+        DBSession.expire(media)
+        assert_equals(5, media.views)
+
+        assert_equals(6, media.increment_views())
+        media.title = u'Changed'
+        DBSession.commit()
+        # the ORM must not write the buffered views
+        assert_equals(0, self.views_in_database(media))
+
+        view_counter.flush(DBSession.connection())
+        DBSession.expire(media)
+        assert_equals(6, media.views)
+
+    def test_schedules_write_when_interval_has_passed(self):
+        media = Media.example()
+        DBSession.commit()
+        scheduled = []
+        view_counter.schedule = lambda: scheduled.append(True)
+
+        media.increment_views()
+        assert_equals([], scheduled)
+        self.pylons_config['views_flush_interval'] = '0'
+        media.increment_views()
+        assert_equals([True], scheduled)
+
+    def test_writes_views_in_a_background_thread(self):
+        threads = []
+        flushed = threading.Event()
+        def flush():
+            threads.append(threading.current_thread())
+            flushed.set()
+        view_counter.flush = flush
+        view_counter.schedule()
+        flushed.wait(5)
+        assert_length(1, threads)
+        assert_not_equals(threading.current_thread(), threads[0])
+        threads[0].join(5)
+        assert_none(view_counter._worker)
+
+    def test_keeps_views_if_writing_fails(self):
+        class BrokenConnection(object):
+            def execute(self, *args):
+                raise ValueError('broken')
+        view_counter.count_view(42, views=3)
+        assert_equals(0, view_counter.flush(BrokenConnection()))
+        assert_equals(3, view_counter.pending(42))
+
+
+import unittest
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(ViewCounterTest))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite')
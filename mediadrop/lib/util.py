@@ -18,6 +18,7 @@ from pylons import app_globals, config, request, url as pylons_url
 from webob.exc import HTTPFound
 
 __all__ = [
+    'POPULARITY_EPOCH',
     'calculate_popularity',
     'current_url',
     'delete_files',
@@ -166,7 +167,11 @@ def merge_dicts(dst, *srcs):
                     current_dst[key] = current_src[key]
     return dst
 
-def calculate_popularity(publish_date, score):
+# Publication dates are counted from this date when calculating popularity.
+# Media published earlier are treated as if published on this date.
+POPULARITY_EPOCH = datetime(1900, 1, 1)
+
+def calculate_popularity(publish_date, score, log_base=None, base_life_hours=None):
     """Calculate how 'hot' an item is given its response since publication.
 
     In our ranking algorithm, being base_life_hours newer is equivalent
@@ -176,22 +181,27 @@ def calculate_popularity(publish_date, score):
     :param publish_date: The date of publication. An older date reduces
         the popularity score.
     :param int score: The number of likes, dislikes or likes - dislikes.
+    :param int log_base: The decay exponent, defaults to the
+        'popularity_decay_exponent' setting of the current request.
+    :param int base_life_hours: The decay lifetime, defaults to the
+        'popularity_decay_lifetime' setting of the current request.
     :rtype: int
     :returns: Popularity points.
 
     """
-    settings = request.settings
-    log_base = int(settings['popularity_decay_exponent'])
-    base_life = int(settings['popularity_decay_lifetime']) * 3600
-    # FIXME: The current algorithm assumes that the earliest publication
-    #        date is January 1, 2000.
+    if log_base is None or base_life_hours is None:
+        settings = request.settings
+        log_base = settings['popularity_decay_exponent']
+        base_life_hours = settings['popularity_decay_lifetime']
+    log_base = int(log_base)
+    base_life = int(base_life_hours) * 3600
     if score > 0:
         sign = 1
     elif score < 0:
         sign = -1
     else:
         sign = 0
-    delta = publish_date - datetime(2000, 1, 1) # since January 1, 2000
+    delta = max(publish_date, POPULARITY_EPOCH) - POPULARITY_EPOCH
     t = delta.days * 86400 + delta.seconds
     popularity = math.log(max(abs(score), 1), log_base) + sign * t / base_life
     return max(int(popularity), 0)
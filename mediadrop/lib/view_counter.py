@@ -0,0 +1,177 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+"""
+Buffered view counting
+
+Incrementing ``media.views`` on every page view needs a transaction per
+request and serializes all requests for a popular media item on its row
+lock. Instead views are counted in memory and written periodically (by a
+background thread) with a single UPDATE for all media which were viewed in
+the meantime. Views which were not written yet are flushed when the process
+exits.
+
+Media loaded by this process include its buffered views in ``views`` so the
+displayed numbers stay current.
+"""
+
+import atexit
+import logging
+import threading
+import time
+
+from pylons import config
+from sqlalchemy import event, sql
+from sqlalchemy.orm import attributes
+
+from mediadrop.model.media import Media, media as media_table
+from mediadrop.model.meta import metadata
+
+__all__ = ['view_counter', 'ViewCounter', 'VIEWS_FLUSH_INTERVAL']
+
+log = logging.getLogger(__name__)
+
+# default number of seconds between two writes
+VIEWS_FLUSH_INTERVAL = 30
+# write earlier when views for this many media items are buffered
+MAX_PENDING_MEDIA = 1000
+# number of media updated by one statement
+BATCH_SIZE = 500
+
+
+class ViewCounter(object):
+    """Count views in memory and write them to the database in bulk."""
+
+    def __init__(self):
+        self._deltas = {}
+        self._flushed_on = time.time()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._warned_unbound = False
+
+    def _interval(self):
+        return int(config.get('views_flush_interval', VIEWS_FLUSH_INTERVAL))
+
+    def count_view(self, media_id, views=1):
+        """Count views for the given media id.
+
+        The views are written in the background when the flush interval
+        has passed since the last write.
+
+        :returns: The number of views of this media item which were not
+            written yet.
+        """
+        with self._lock:
+            delta = self._deltas.get(media_id, 0) + views
+            self._deltas[media_id] = delta
+            due = (self._flushed_on + self._interval() <= time.time()) or \
+                (len(self._deltas) >= MAX_PENDING_MEDIA)
+        if due:
+            self.schedule()
+        return delta
+
+    def pending(self, media_id):
+        """Return the number of views which were not written yet."""
+        return self._deltas.get(media_id, 0)
+
+    def schedule(self):
+        """Write the buffered views in a background thread."""
+        with self._lock:
+            if self._worker is not None:
+                return
+            self._worker = threading.Thread(target=self._flush_in_background)
+            self._worker.daemon = True
+        self._worker.start()
+
+    def _flush_in_background(self):
+        try:
+            self.flush()
+        except Exception:
+            log.exception('Unable to write views')
+        finally:
+            with self._lock:
+                self._worker = None
+
+    def flush(self, connection=None):
+        """Write all buffered views to the database.
+
+        :param connection: The connection to use. By default a new
+            connection is used and committed so the write does not depend
+            on (or hold locks in) the current session.
+        :returns: The number of media items which were updated.
+        """
+        with self._lock:
+            deltas, self._deltas = self._deltas, {}
+            self._flushed_on = time.time()
+        if not deltas:
+            return 0
+        try:
+            if connection is not None:
+                self._write(connection, deltas)
+            elif metadata.bind is not None:
+                connection = metadata.bind.connect()
+                try:
+                    transaction = connection.begin()
+                    self._write(connection, deltas)
+                    transaction.commit()
+                finally:
+                    connection.close()
+            else:
+                if not self._warned_unbound:
+                    self._warned_unbound = True
+                    log.warn('Unable to write views: the database is not '
+                             'configured yet, will retry later.')
+                self._restore(deltas)
+                return 0
+        except Exception, e:
+            log.warn('Unable to write views, will retry later: %s', e)
+            self._restore(deltas)
+            return 0
+        return len(deltas)
+
+    def _write(self, connection, deltas):
+        media_ids = sorted(deltas)
+        for i in range(0, len(media_ids), BATCH_SIZE):
+            batch = media_ids[i:i+BATCH_SIZE]
+            increment = sql.case(dict((media_id, deltas[media_id])
+                for media_id in batch), value=media_table.c.id)
+            connection.execute(media_table.update()\
+                .where(media_table.c.id.in_(batch))\
+                .values(views=media_table.c.views + increment))
+
+    def _restore(self, deltas):
+        with self._lock:
+            for media_id, views in deltas.items():
+                self._deltas[media_id] = self._deltas.get(media_id, 0) + views
+
+    def discard(self):
+        """Forget all buffered views."""
+        with self._lock:
+            self._deltas = {}
+
+view_counter = ViewCounter()
+
+
+def _show_pending_views(target, *args):
+    views = view_counter.pending(target.id)
+    if views and target.views is not None:
+        attributes.set_committed_value(target, 'views', target.views + views)
+
+def _show_pending_views_after_refresh(target, context, attrs):
+    if attrs is None or 'views' in attrs:
+        _show_pending_views(target)
+
+event.listen(Media, 'load', _show_pending_views)
+event.listen(Media, 'refresh', _show_pending_views_after_refresh)
+
+
+def _flush_on_exit():
+    try:
+        view_counter.flush()
+    except Exception:
+        log.exception('Unable to write views on shutdown')
+
+atexit.register(_flush_on_exit)
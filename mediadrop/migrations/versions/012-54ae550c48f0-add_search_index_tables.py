@@ -0,0 +1,59 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+"""add search index tables
+
+tables for the built-in inverted index search backend
+
+added: 2018-11-05 (v0.11dev)
+
+Revision ID: 54ae550c48f0
+Revises: 4979e106cad8
+Create Date: 2018-11-05 10:12:31.482215
+"""
+
+# revision identifiers, used by Alembic.
+revision = '54ae550c48f0'
+down_revision = '4979e106cad8'
+
+from alembic.op import create_index, create_table, drop_index, drop_table
+from sqlalchemy import Column, ForeignKey, Integer, Unicode
+
+
+def upgrade():
+    create_table('search_terms',
+        Column('id', Integer, autoincrement=True, primary_key=True),
+        Column('term', Unicode(64), unique=True, nullable=False),
+        mysql_engine='InnoDB',
+        mysql_charset='utf8',
+    )
+    create_table('search_postings',
+        Column('term_id', Integer, ForeignKey('search_terms.id', onupdate='CASCADE', ondelete='CASCADE'),
+            primary_key=True),
+        Column('media_id', Integer, ForeignKey('media.id', onupdate='CASCADE', ondelete='CASCADE'),
+            primary_key=True),
+        Column('public_weight', Integer, default=0, nullable=False),
+        Column('admin_weight', Integer, default=0, nullable=False),
+        mysql_engine='InnoDB',
+        mysql_charset='utf8',
+    )
+    create_index('search_postings_media_id', 'search_postings', ['media_id'])
+    create_table('search_documents',
+        Column('media_id', Integer, ForeignKey('media.id', onupdate='CASCADE', ondelete='CASCADE'),
+            primary_key=True),
+        Column('public_length', Integer, default=0, nullable=False),
+        Column('admin_length', Integer, default=0, nullable=False),
+        mysql_engine='InnoDB',
+        mysql_charset='utf8',
+    )
+    # The index is populated after all migrations were applied (see
+    # mediadrop.lib.search.inverted_index).
+
+def downgrade():
+    drop_table('search_documents')
+    drop_index('search_postings_media_id', 'search_postings')
+    drop_table('search_postings')
+    drop_table('search_terms')
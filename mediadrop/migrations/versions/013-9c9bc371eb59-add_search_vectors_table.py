@@ -0,0 +1,54 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+"""add search vectors table
+
+weighted tsvectors for the PostgreSQL full text search backend (the table
+is created for all databases to keep the schema identical but only used
+with PostgreSQL)
+
+added: 2018-11-07 (v0.11dev)
+
+Revision ID: 9c9bc371eb59
+Revises: 54ae550c48f0
+Create Date: 2018-11-07 19:41:05.231877
+"""
+
+# revision identifiers, used by Alembic.
+revision = '9c9bc371eb59'
+down_revision = '54ae550c48f0'
+
+from alembic.op import create_table, drop_table, execute, get_bind
+from sqlalchemy import Column, ForeignKey, Integer, UnicodeText
+from sqlalchemy.types import UserDefinedType
+
+
+class TSVector(UserDefinedType):
+    def get_col_spec(self):
+        return 'TSVECTOR'
+
+def is_postgresql():
+    return get_bind().dialect.name == 'postgresql'
+
+def upgrade():
+    vector_type = is_postgresql() and TSVector() or UnicodeText()
+    create_table('search_vectors',
+        Column('media_id', Integer, ForeignKey('media.id', onupdate='CASCADE', ondelete='CASCADE'),
+            primary_key=True),
+        Column('public_vector', vector_type),
+        Column('admin_vector', vector_type),
+        mysql_engine='InnoDB',
+        mysql_charset='utf8',
+    )
+    if is_postgresql():
+        for name in ('public_vector', 'admin_vector'):
+            execute('CREATE INDEX search_vectors_%(name)s '
+                    'ON search_vectors USING gin(%(name)s)' % {'name': name})
+    # The vectors are populated after all migrations were applied (see
+    # mediadrop.lib.search.api).
+
+def downgrade():
+    drop_table('search_vectors')
@@ -0,0 +1,47 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+"""add media related tables
+
+precomputed related media lists, run batch-scripts/update_related_media.py
+to fill them for existing media
+
+added: 2018-11-12 (v0.11dev)
+
+Revision ID: 3d5b8c93c914
+Revises: 9c9bc371eb59
+Create Date: 2018-11-12 14:03:52.917345
+"""
+
+# revision identifiers, used by Alembic.
+revision = '3d5b8c93c914'
+down_revision = '9c9bc371eb59'
+
+from alembic.op import create_table, drop_table
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Integer
+
+
+def upgrade():
+    create_table('media_related',
+        Column('media_id', Integer, ForeignKey('media.id', onupdate='CASCADE', ondelete='CASCADE'),
+            primary_key=True),
+        Column('related_id', Integer, ForeignKey('media.id', onupdate='CASCADE', ondelete='CASCADE'),
+            primary_key=True),
+        Column('score', Float, nullable=False),
+        mysql_engine='InnoDB',
+        mysql_charset='utf8',
+    )
+    create_table('media_related_status',
+        Column('media_id', Integer, ForeignKey('media.id', onupdate='CASCADE', ondelete='CASCADE'),
+            primary_key=True),
+        Column('computed_on', DateTime, nullable=False),
+        mysql_engine='InnoDB',
+        mysql_charset='utf8',
+    )
+
+def downgrade():
+    drop_table('media_related_status')
+    drop_table('media_related')
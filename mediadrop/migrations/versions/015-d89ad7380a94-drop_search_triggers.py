@@ -0,0 +1,53 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+"""drop search triggers
+
+the media_fulltext table is now maintained by the application (see
+mediadrop.lib.search.indexer), remove the MySQL triggers which were
+installed manually from setup_triggers.sql
+
+added: 2018-11-19 (v0.11dev)
+
+Revision ID: d89ad7380a94
+Revises: 3d5b8c93c914
+Create Date: 2018-11-19 10:41:07.220514
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'd89ad7380a94'
+down_revision = '3d5b8c93c914'
+
+import logging
+
+from alembic.op import execute, get_bind
+from sqlalchemy.exc import DBAPIError
+
+log = logging.getLogger(__name__)
+
+TRIGGERS = (
+    'media_ai', 'media_au', 'media_ad',
+    'media_tags_ai', 'media_tags_ad', 'tags_au', 'tags_ad',
+    'media_categories_ai', 'media_categories_ad', 'categories_au',
+    'categories_ad',
+)
+
+def upgrade():
+    if get_bind().dialect.name != 'mysql':
+        return
+    for name in TRIGGERS:
+        try:
+            execute('DROP TRIGGER IF EXISTS %s' % name)
+        except DBAPIError:
+            # Usually the triggers were installed by a MySQL superuser. They
+            # are harmless as the indexer overwrites their changes anyway.
+            log.warning('Could not drop the MySQL trigger %r, please remove '
+                'it manually.', name)
+            break
+
+def downgrade():
+    # The triggers were never created by a migration.
+    pass
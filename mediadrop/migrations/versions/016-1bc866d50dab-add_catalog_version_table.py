@@ -0,0 +1,53 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+"""add catalog version table
+
+single counter which changes whenever media is published, unpublished or
+deleted, used to invalidate cached search results
+
+added: 2018-11-23 (v0.11dev)
+
+Revision ID: 1bc866d50dab
+Revises: d89ad7380a94
+Create Date: 2018-11-23 16:12:40.581937
+"""
+
+# revision identifiers, used by Alembic.
+revision = '1bc866d50dab'
+down_revision = 'd89ad7380a94'
+
+from alembic.op import create_table, drop_table, execute, inline_literal
+from sqlalchemy import Column, Integer, MetaData, Table
+
+# -- table definition ---------------------------------------------------------
+metadata = MetaData()
+catalog_version = Table('catalog_version', metadata,
+    Column('id', Integer, autoincrement=False, primary_key=True),
+    Column('version', Integer, default=0, nullable=False),
+    mysql_engine='InnoDB',
+    mysql_charset='utf8',
+)
+# -----------------------------------------------------------------------------
+
+def upgrade():
+    create_table('catalog_version',
+        Column('id', Integer, autoincrement=False, primary_key=True),
+        Column('version', Integer, default=0, nullable=False),
+        mysql_engine='InnoDB',
+        mysql_charset='utf8',
+    )
+    # the single row is only ever updated
+    execute(
+        catalog_version.insert().\
+            values({
+                'id': inline_literal(1),
+                'version': inline_literal(0),
+            })
+    )
+
+def downgrade():
+    drop_table('catalog_version')
@@ -0,0 +1,110 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+"""recompute popularity scores with the new epoch
+
+publication dates are now counted from 1900-01-01 instead of 2000-01-01 so
+all stored scores must be recomputed (otherwise every newly liked media
+item would outrank all other media)
+
+added: 2018-11-26 (v0.11dev)
+
+Revision ID: 2f0c1e9a7b34
+Revises: 1bc866d50dab
+Create Date: 2018-11-26 10:41:07.312554
+"""
+
+# revision identifiers, used by Alembic.
+revision = '2f0c1e9a7b34'
+down_revision = '1bc866d50dab'
+
+from datetime import datetime
+import math
+
+from alembic.op import get_bind
+from sqlalchemy import Boolean, Column, DateTime, Integer, MetaData, Table, \
+    Unicode, UnicodeText, sql
+
+# -- table definition ---------------------------------------------------------
+metadata = MetaData()
+media = Table('media', metadata,
+    Column('id', Integer, autoincrement=True, primary_key=True),
+    Column('reviewed', Boolean, default=False, nullable=False),
+    Column('encoded', Boolean, default=False, nullable=False),
+    Column('publishable', Boolean, default=False, nullable=False),
+    Column('publish_on', DateTime),
+    Column('publish_until', DateTime),
+    Column('likes', Integer, default=0, nullable=False),
+    Column('dislikes', Integer, default=0, nullable=False),
+    Column('popularity_points', Integer, default=0, nullable=False),
+    Column('popularity_likes', Integer, default=0, nullable=False),
+    Column('popularity_dislikes', Integer, default=0, nullable=False),
+)
+settings = Table('settings', metadata,
+    Column('id', Integer, autoincrement=True, primary_key=True),
+    Column('key', Unicode(255), nullable=False, unique=True),
+    Column('value', UnicodeText),
+)
+
+BATCH_SIZE = 1000
+
+
+def popularity(publish_date, score, log_base, base_life, epoch):
+    sign = cmp(score, 0)
+    delta = max(publish_date, epoch) - epoch
+    t = delta.days * 86400 + delta.seconds
+    points = math.log(max(abs(score), 1), log_base) + sign * t / base_life
+    return max(int(points), 0)
+
+def recompute(epoch):
+    connection = get_bind()
+    select = sql.select([settings.c.key, settings.c.value],
+        settings.c.key.in_([u'popularity_decay_exponent',
+                            u'popularity_decay_lifetime']))
+    values = dict(connection.execute(select).fetchall())
+    if len(values) != 2:
+        return
+    log_base = int(values[u'popularity_decay_exponent'])
+    base_life = int(values[u'popularity_decay_lifetime']) * 3600
+
+    now = datetime.now()
+    published = sql.and_(
+        media.c.reviewed == True,
+        media.c.encoded == True,
+        media.c.publishable == True,
+        media.c.publish_on <= now,
+        sql.or_(media.c.publish_until == None, media.c.publish_until >= now),
+    )
+    update = media.update().where(media.c.id == sql.bindparam('media_id'))\
+        .values(popularity_points=sql.bindparam('points'),
+                popularity_likes=sql.bindparam('likes_points'),
+                popularity_dislikes=sql.bindparam('dislikes_points'))
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sql.select([media.c.id, media.c.publish_on, media.c.likes,
+                        media.c.dislikes],
+                       sql.and_(published, media.c.id > last_id))\
+                .order_by(media.c.id).limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        connection.execute(update, [dict(
+            media_id=row.id,
+            points=popularity(row.publish_on, row.likes - row.dislikes,
+                log_base, base_life, epoch),
+            likes_points=popularity(row.publish_on, row.likes,
+                log_base, base_life, epoch),
+            dislikes_points=popularity(row.publish_on, row.dislikes,
+                log_base, base_life, epoch),
+        ) for row in rows])
+        last_id = rows[-1].id
+
+def upgrade():
+    recompute(epoch=datetime(1900, 1, 1))
+
+def downgrade():
+    recompute(epoch=datetime(2000, 1, 1))
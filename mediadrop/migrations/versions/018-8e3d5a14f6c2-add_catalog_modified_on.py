@@ -0,0 +1,32 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+"""add catalog modified_on column
+
+time of the last catalog change, used as Last-Modified date for feeds and
+API responses (deleting media does not change the modification date of any
+remaining media item)
+
+added: 2018-11-28 (v0.11dev)
+
+Revision ID: 8e3d5a14f6c2
+Revises: 2f0c1e9a7b34
+Create Date: 2018-11-28 11:05:52.204318
+"""
+
+# revision identifiers, used by Alembic.
+revision = '8e3d5a14f6c2'
+down_revision = '2f0c1e9a7b34'
+
+from alembic.op import add_column, drop_column
+from sqlalchemy import Column, DateTime
+
+
+def upgrade():
+    add_column('catalog_version', Column('modified_on', DateTime))
+
+def downgrade():
+    drop_column('catalog_version', 'modified_on')
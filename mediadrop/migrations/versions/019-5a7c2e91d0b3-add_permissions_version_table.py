@@ -0,0 +1,53 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+"""add permissions version table
+
+single counter which changes whenever groups or their permissions change,
+used to invalidate the cached permissions of all processes
+
+added: 2018-12-04 (v0.11dev)
+
+Revision ID: 5a7c2e91d0b3
+Revises: 8e3d5a14f6c2
+Create Date: 2018-12-04 10:21:37.318542
+"""
+
+# revision identifiers, used by Alembic.
+revision = '5a7c2e91d0b3'
+down_revision = '8e3d5a14f6c2'
+
+from alembic.op import create_table, drop_table, execute, inline_literal
+from sqlalchemy import Column, Integer, MetaData, Table
+
+# -- table definition ---------------------------------------------------------
+metadata = MetaData()
+permissions_version = Table('permissions_version', metadata,
+    Column('id', Integer, autoincrement=False, primary_key=True),
+    Column('version', Integer, default=0, nullable=False),
+    mysql_engine='InnoDB',
+    mysql_charset='utf8',
+)
+# -----------------------------------------------------------------------------
+
+def upgrade():
+    create_table('permissions_version',
+        Column('id', Integer, autoincrement=False, primary_key=True),
+        Column('version', Integer, default=0, nullable=False),
+        mysql_engine='InnoDB',
+        mysql_charset='utf8',
+    )
+    # the single row is only ever updated
+    execute(
+        permissions_version.insert().\
+            values({
+                'id': inline_literal(1),
+                'version': inline_literal(0),
+            })
+    )
+
+def downgrade():
+    drop_table('permissions_version')
@@ -0,0 +1,38 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+"""add category access table
+
+groups which may view the media of restricted categories (used by the
+CategoryAccessPolicy)
+
+added: 2018-12-06 (v0.11dev)
+
+Revision ID: c41e8f07a2d9
+Revises: 5a7c2e91d0b3
+Create Date: 2018-12-06 14:48:02.917415
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'c41e8f07a2d9'
+down_revision = '5a7c2e91d0b3'
+
+from alembic.op import create_table, drop_table
+from sqlalchemy import Column, ForeignKey, Integer
+
+
+def upgrade():
+    create_table('category_access',
+        Column('category_id', Integer, ForeignKey('categories.id',
+            onupdate='CASCADE', ondelete='CASCADE'), primary_key=True),
+        Column('group_id', Integer, ForeignKey('groups.group_id',
+            onupdate='CASCADE', ondelete='CASCADE'), primary_key=True),
+        mysql_engine='InnoDB',
+        mysql_charset='utf8',
+    )
+
+def downgrade():
+    drop_table('category_access')
@@ -261,3 +261,7 @@ from mediadrop.model.media import Media, MediaFile
 from mediadrop.model.podcasts import Podcast
 from mediadrop.model.players import PlayerPrefs, players, cleanup_players_table
 from mediadrop.model.storage import storage
+from mediadrop.model.search import (search_documents, search_postings,
+    search_terms, search_vectors)
+from mediadrop.model.catalog import (catalog_version,
+    current_catalog_state, current_catalog_version, increment_catalog_version)
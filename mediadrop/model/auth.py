@@ -7,7 +7,7 @@
 import os
 from datetime import datetime
 
-from sqlalchemy import Table, ForeignKey, Column, not_
+from sqlalchemy import Table, ForeignKey, Column, not_, sql
 from sqlalchemy.types import Unicode, Integer, DateTime
 from sqlalchemy.orm import mapper, relation, synonym
 
@@ -61,6 +61,42 @@ permissions = Table('permissions', metadata,
     mysql_charset='utf8',
 )
 
+# A counter which is incremented whenever groups or their permissions change
+# so all processes notice that their cached permissions are outdated (see
+# mediadrop.lib.auth.permission_matrix).
+PERMISSIONS_VERSION_ID = 1
+
+permissions_version = Table('permissions_version', metadata,
+    Column('id', Integer, autoincrement=False, primary_key=True),
+    Column('version', Integer, default=0, nullable=False),
+    mysql_engine='InnoDB',
+    mysql_charset='utf8',
+)
+
+def current_permissions_version(connection):
+    """Return the current permissions version (0 if it was never
+    incremented).
+
+    :param connection: A :class:`sqlalchemy.engine.base.Connection`.
+    :rtype: int
+    """
+    select = sql.select([permissions_version.c.version],
+        permissions_version.c.id == PERMISSIONS_VERSION_ID)
+    return connection.execute(select).scalar() or 0
+
+def increment_permissions_version(connection):
+    """Increment the permissions version in the current transaction.
+
+    The row is created by the setup (and the migration) so concurrent
+    transactions just wait for each other's row lock.
+
+    :param connection: A :class:`sqlalchemy.engine.base.Connection`.
+    """
+    update = permissions_version.update().\
+        where(permissions_version.c.id == PERMISSIONS_VERSION_ID).\
+        values(version=permissions_version.c.version + 1)
+    connection.execute(update)
+
 
 class User(object):
     """
@@ -236,6 +272,7 @@ mapper(
 
 mapper(
     Group, groups,
+    extension=events.MapperObserver(events.Group),
     properties={
         'users': relation(User, secondary=users_groups, backref='groups'),
     },
@@ -243,6 +280,7 @@ mapper(
 
 mapper(
     Permission, permissions,
+    extension=events.MapperObserver(events.Permission),
     properties={
         'groups': relation(Group,
             secondary=groups_permissions,
@@ -0,0 +1,74 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+"""
+Catalog Version
+
+A single counter which is incremented whenever the set of published media,
+their public data, categories or tags change (see :mod:`mediadrop.lib.catalog`). Caches of public listings store
+the version they were built for so all processes notice outdated entries
+without any further coordination. The time of the last change is the
+Last-Modified date of these listings (see :mod:`mediadrop.lib.conditional_get`).
+"""
+
+from datetime import datetime
+
+from sqlalchemy import Column, sql, Table
+from sqlalchemy.types import DateTime, Integer
+
+from mediadrop.model.meta import metadata
+
+__all__ = ['catalog_version', 'current_catalog_state',
+    'current_catalog_version', 'increment_catalog_version',
+    'CATALOG_VERSION_ID']
+
+CATALOG_VERSION_ID = 1
+
+catalog_version = Table('catalog_version', metadata,
+    Column('id', Integer, autoincrement=False, primary_key=True),
+    Column('version', Integer, default=0, nullable=False),
+    Column('modified_on', DateTime),
+    mysql_engine='InnoDB',
+    mysql_charset='utf8',
+)
+
+def current_catalog_version(connection):
+    """Return the current catalog version (0 if it was never incremented).
+
+    :param connection: A :class:`sqlalchemy.engine.base.Connection`.
+    :rtype: int
+    """
+    select = sql.select([catalog_version.c.version],
+        catalog_version.c.id == CATALOG_VERSION_ID)
+    return connection.execute(select).scalar() or 0
+
+def current_catalog_state(connection):
+    """Return the current catalog version and the time of the last change.
+
+    :param connection: A :class:`sqlalchemy.engine.base.Connection`.
+    :returns: A (version, modified_on) tuple, modified_on is None if the
+        catalog was never changed.
+    """
+    select = sql.select([catalog_version.c.version,
+            catalog_version.c.modified_on],
+        catalog_version.c.id == CATALOG_VERSION_ID)
+    row = connection.execute(select).first()
+    if row is None:
+        return (0, None)
+    return (row.version, row.modified_on)
+
+def increment_catalog_version(connection):
+    """Increment the catalog version in the current transaction.
+
+    The row is created by the setup (and the migration) so concurrent
+    transactions just wait for each other's row lock.
+
+    :param connection: A :class:`sqlalchemy.engine.base.Connection`.
+    """
+    update = catalog_version.update().\
+        where(catalog_version.c.id == CATALOG_VERSION_ID).\
+        values(version=catalog_version.c.version + 1, modified_on=datetime.now())
+    connection.execute(update)
@@ -25,6 +25,17 @@ categories = Table('categories', metadata,
     mysql_charset='utf8'
 )
 
+# Categories with at least one row here can only be viewed by the listed
+# groups (see mediadrop.lib.auth.category_access_policy).
+category_access = Table('category_access', metadata,
+    Column('category_id', Integer, ForeignKey('categories.id', onupdate='CASCADE', ondelete='CASCADE'),
+        primary_key=True),
+    Column('group_id', Integer, ForeignKey('groups.group_id', onupdate='CASCADE', ondelete='CASCADE'),
+        primary_key=True),
+    mysql_engine='InnoDB',
+    mysql_charset='utf8'
+)
+
 class CategoryNestingException(Exception):
     pass
 
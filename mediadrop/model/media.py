@@ -28,7 +28,7 @@ from sqlalchemy.orm import (attributes, backref, class_mapper, column_property,
     composite, dynamic_loader, mapper, Query, relation, validates)
 from sqlalchemy.orm.collections import attribute_mapped_collection
 from sqlalchemy.schema import DDL
-from sqlalchemy.types import Boolean, DateTime, Integer, Unicode, UnicodeText
+from sqlalchemy.types import Boolean, DateTime, Float, Integer, Unicode, UnicodeText
 
 from mediadrop.lib.auth import Resource
 from mediadrop.lib.compat import any
@@ -36,7 +36,7 @@ from mediadrop.lib.filetypes import AUDIO, AUDIO_DESC, VIDEO, guess_mimetype
 from mediadrop.lib.util import calculate_popularity
 from mediadrop.lib.xhtml import line_break_xhtml, strip_xhtml
 from mediadrop.model import (get_available_slug, SLUG_LENGTH, 
-    _mtm_count_property, _properties_dict_from_labels, MatchAgainstClause)
+    _mtm_count_property, _properties_dict_from_labels)
 from mediadrop.model.meta import DBSession, metadata
 from mediadrop.model.authors import Author
 from mediadrop.model.categories import Category, CategoryList
@@ -209,6 +209,24 @@ media_categories = Table('media_categories', metadata,
     mysql_charset='utf8',
 )
 
+media_related = Table('media_related', metadata,
+    Column('media_id', Integer, ForeignKey('media.id', onupdate='CASCADE', ondelete='CASCADE'),
+        primary_key=True),
+    Column('related_id', Integer, ForeignKey('media.id', onupdate='CASCADE', ondelete='CASCADE'),
+        primary_key=True),
+    Column('score', Float, nullable=False),
+    mysql_engine='InnoDB',
+    mysql_charset='utf8',
+)
+# Media which have a computed related media list (it might be empty).
+media_related_status = Table('media_related_status', metadata,
+    Column('media_id', Integer, ForeignKey('media.id', onupdate='CASCADE', ondelete='CASCADE'),
+        primary_key=True),
+    Column('computed_on', DateTime, default=datetime.now, nullable=False),
+    mysql_engine='InnoDB',
+    mysql_charset='utf8',
+)
+
 media_fulltext = Table('media_fulltext', metadata,
     Column('media_id', Integer, ForeignKey('media.id'), primary_key=True),
     Column('title', Unicode(255), nullable=False),
@@ -293,43 +311,15 @@ class MediaQuery(Query):
         return self.order_by(Media.popularity_points.desc())
 
     def search(self, search, bool=False, order_by=True):
-        search_cols = _fulltext_indexes['public']
-        return self._search(search_cols, search, bool, order_by)
+        return self._search('public', search, bool, order_by)
 
     def admin_search(self, search, bool=False, order_by=True):
-        search_cols = _fulltext_indexes['admin']
-        return self._search(search_cols, search, bool, order_by)
-
-    def _search(self, search_cols, search, bool=False, order_by=True):
-        # XXX: If full text searching is not enabled, we use a very
-        #      rudimentary fallback.
-        if not self._fulltext_enabled():
-            return self.filter(sql.or_(Media.title.ilike("%%%s%%" % search),
-                                       Media.description_plain.ilike("%%%s%%" % search)))
-
-        filter = MatchAgainstClause(search_cols, search, bool)
-        query = self.join(MediaFullText).filter(filter)
-        if order_by:
-            # MySQL automatically orders natural lang searches by relevance,
-            # so override any existing ordering
-            query = query.order_by(None)
-            if bool:
-                # To mimic the same behaviour in boolean mode, we must do an
-                # extra natural language search on our boolean-filtered results
-                relevance = MatchAgainstClause(search_cols, search, bool=False)
-                query = query.order_by(relevance)
-        return query
-
-    def _fulltext_enabled(self):
-        connection = self.session.connection()
-        if connection.dialect.name == 'mysql':
-            # use a fun trick to see if the media_fulltext table is being used
-            # thanks to this guy: http://data.agaric.com/node/2241#comment-544
-            select = sql.select('1').select_from(media_fulltext).limit(1)
-            result = connection.execute(select)
-            if result.scalar() is not None:
-                return True
-        return False
+        return self._search('admin', search, bool, order_by)
+
+    def _search(self, scope, search, bool=False, order_by=True):
+        from mediadrop.lib.search import search_backend
+        backend = search_backend(self.session.connection())
+        return backend.search(self, scope, search, bool, order_by)
 
     def in_category(self, cat):
         """Filter results to Media in the given category"""
@@ -375,15 +365,27 @@ class MediaQuery(Query):
     def related(self, media):
         query = self.published().filter(Media.id != media.id)
 
-        # XXX: If full text searching is not enabled, we simply return media
-        #      in the same categories.
-        if not self._fulltext_enabled():
+        # Use the precomputed list (see mediadrop.lib.related_media) if there
+        # is one for this media.
+        computed = sql.select([media_related_status.c.media_id],
+            media_related_status.c.media_id == media.id)
+        if self.session.execute(computed).first() is not None:
+            return query\
+                .join(media_related, media_related.c.related_id == Media.id)\
+                .filter(media_related.c.media_id == media.id)\
+                .order_by(None)\
+                .order_by(media_related.c.score.desc(), Media.id)
+
+        # XXX: If the search backend can not rank its results, we simply
+        #      return media in the same categories.
+        from mediadrop.lib.search import search_backend
+        if not search_backend(self.session.connection()).ranks_results:
             return query.in_categories(media.categories)
 
-        search_terms = '%s %s %s' % (
+        search_terms = u'%s %s %s' % (
             media.title,
-            media.fulltext and media.fulltext.tags or '',
-            media.fulltext and media.fulltext.categories or '',
+            u' '.join(tag.name for tag in media.tags),
+            u' '.join(category.name for category in media.categories),
         )
         return query.search(search_terms, bool=True)
 
@@ -518,19 +520,19 @@ class Media(object):
         return Resource('media', self.id, media=self)
 
     def increment_views(self):
-        """Increment the number of views in the database.
+        """Count one view of this media item.
 
-        We avoid concurrency issues by incrementing JUST the views and
-        not allowing modified_on to be updated automatically.
+        Views are buffered by :data:`mediadrop.lib.view_counter.view_counter`
+        and written in bulk later so a page view does not need a transaction
+        (and a row lock) of its own.
 
         """
         if self.id is None:
             self.views += 1
             return self.views
 
-        DBSession.execute(media.update()\
-            .values(views=media.c.views + 1)\
-            .where(media.c.id == self.id))
+        from mediadrop.lib.view_counter import view_counter
+        view_counter.count_view(self.id)
 
         # Increment the views by one for the rest of the request,
         # but don't allow the ORM to increment the views too.
@@ -6,11 +6,16 @@
 # See LICENSE.txt in the main project directory, for more information.
 
 """SQLAlchemy Metadata and Session object"""
-from sqlalchemy import MetaData
-from sqlalchemy.orm import scoped_session, sessionmaker
+from weakref import WeakKeyDictionary
+
+from sqlalchemy import event, MetaData
+from sqlalchemy.orm import attributes, scoped_session, sessionmaker
 
 __all__ = [
     'DBSession',
+    'SessionChanges',
+    'apply_on_commit',
+    'attributes_changed',
     'metadata',
 ]
 
@@ -20,3 +25,61 @@ maker = sessionmaker()
 DBSession = scoped_session(maker)
 
 metadata = MetaData()
+
+
+def attributes_changed(instance, names):
+    """Return True if any of the named attributes of the instance changed
+    (without loading unloaded attributes)."""
+    for name in names:
+        history = attributes.get_history(instance, name,
+            passive=attributes.PASSIVE_NO_INITIALIZE)
+        if history.has_changes():
+            return True
+    return False
+
+
+class SessionChanges(object):
+    """Changes which are collected per session until the session commits.
+
+    Subclasses store the changes of a session in ``_changes`` (a weak dict
+    so sessions are not kept alive) and implement :meth:`apply_changes`.
+    See :func:`apply_on_commit` for the session events."""
+
+    def __init__(self):
+        self._changes = WeakKeyDictionary()
+
+    def apply(self, session):
+        """Apply all changes collected for the given session now."""
+        if session not in self._changes:
+            return None
+        return self.apply_changes(session, self._changes.pop(session))
+
+    def apply_changes(self, session, changes):
+        raise NotImplementedError
+
+    def discard(self, session):
+        """Forget all changes collected for the given session."""
+        self._changes.pop(session, None)
+
+def apply_on_commit(session_changes, before_commit=False):
+    """Apply the changes of every session when it commits and discard them
+    when it is rolled back.
+
+    :param session_changes: A :class:`SessionChanges` instance.
+    :param before_commit: Apply the changes within the committed transaction
+        instead of after the commit.
+    """
+    def apply(session):
+        if before_commit:
+            # SQLAlchemy flushes the pending changes only after the
+            # 'before_commit' event so we have to do it here.
+            session.flush()
+        session_changes.apply(session)
+
+    def discard(session, previous_transaction):
+        # Changes from an outer transaction survive the rollback of a savepoint.
+        if not previous_transaction.nested:
+            session_changes.discard(session)
+
+    event.listen(maker, before_commit and 'before_commit' or 'after_commit', apply)
+    event.listen(maker, 'after_soft_rollback', discard)
@@ -0,0 +1,99 @@
+# This file is a part of MediaDrop (https://www.mediadrop.video),
+# Copyright 2009-2018 MediaDrop contributors
+# For the exact contribution history, see the git revision log.
+# The source code contained in this file is licensed under the GPLv3 or
+# (at your option) any later version.
+# See LICENSE.txt in the main project directory, for more information.
+"""
+Search Index Tables
+
+Storage for the built-in inverted index which is used by
+:class:`mediadrop.lib.search.InvertedIndexSearch`:
+
+* ``search_terms``: one row per distinct (normalized) word.
+* ``search_postings``: the weighted term frequency of a word in a media item.
+  Two weights are stored so the same index can serve the public search and
+  the admin search (which includes the administrative notes).
+* ``search_documents``: the weighted length of every indexed media item,
+  needed for the BM25 length normalization.
+
+The ``search_vectors`` table holds the weighted ``tsvector`` of every media
+item for :class:`mediadrop.lib.search.PostgreSQLFullTextSearch`. It is only
+used with PostgreSQL.
+"""
+
+from sqlalchemy import Column, event, ForeignKey, Index, Table
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.schema import DDL
+from sqlalchemy.types import Integer, Unicode, UnicodeText
+
+from mediadrop.model.meta import metadata
+
+__all__ = ['search_documents', 'search_postings', 'search_terms',
+    'search_vectors', 'TERM_LENGTH', 'TSVector']
+
+# maximum length of a single indexed word
+TERM_LENGTH = 64
+
+search_terms = Table('search_terms', metadata,
+    Column('id', Integer, autoincrement=True, primary_key=True),
+    Column('term', Unicode(TERM_LENGTH), unique=True, nullable=False),
+    mysql_engine='InnoDB',
+    mysql_charset='utf8',
+)
+
+search_postings = Table('search_postings', metadata,
+    Column('term_id', Integer, ForeignKey('search_terms.id', onupdate='CASCADE', ondelete='CASCADE'),
+        primary_key=True),
+    Column('media_id', Integer, ForeignKey('media.id', onupdate='CASCADE', ondelete='CASCADE'),
+        primary_key=True),
+    Column('public_weight', Integer, default=0, nullable=False),
+    Column('admin_weight', Integer, default=0, nullable=False),
+    mysql_engine='InnoDB',
+    mysql_charset='utf8',
+)
+# removing a media item from the index must not scan the whole postings table
+Index('search_postings_media_id', search_postings.c.media_id)
+
+search_documents = Table('search_documents', metadata,
+    Column('media_id', Integer, ForeignKey('media.id', onupdate='CASCADE', ondelete='CASCADE'),
+        primary_key=True),
+    Column('public_length', Integer, default=0, nullable=False),
+    Column('admin_length', Integer, default=0, nullable=False),
+    mysql_engine='InnoDB',
+    mysql_charset='utf8',
+)
+
+
+class TSVector(UnicodeText):
+    """A PostgreSQL ``tsvector`` (plain text for all other databases)."""
+
+@compiles(TSVector)
+def _compile_tsvector(element, compiler, **kwargs):
+    return compiler.process(UnicodeText())
+
+@compiles(TSVector, 'postgresql')
+def _compile_tsvector_postgresql(element, compiler, **kwargs):
+    return 'TSVECTOR'
+
+search_vectors = Table('search_vectors', metadata,
+    Column('media_id', Integer, ForeignKey('media.id', onupdate='CASCADE', ondelete='CASCADE'),
+        primary_key=True),
+    Column('public_vector', TSVector),
+    Column('admin_vector', TSVector),
+    mysql_engine='InnoDB',
+    mysql_charset='utf8',
+)
+
+def _setup_postgresql_gin_indexes():
+    for name in ('public_vector', 'admin_vector'):
+        sql = (
+            'CREATE INDEX %%(table)s_%(name)s '
+            'ON %%(table)s USING gin(%(name)s)'
+        ) % {'name': name}
+        event.listen(
+            search_vectors,
+            u'after_create',
+            DDL(sql).execute_if(dialect=u'postgresql')
+        )
+_setup_postgresql_gin_indexes()
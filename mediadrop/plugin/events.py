@@ -259,6 +259,9 @@ class API(object):
     class MediaController(object):
         index = Event(['**kwargs'])
         get = Event(['**kwargs'])
+        bulk = Event(['**kwargs'])
+        export = Event(['**kwargs'])
+        suggest = Event(['**kwargs'])
 
 class CategoriesController(object):
     index = Event(['**kwargs'])
@@ -387,6 +390,22 @@ class User(object):
     before_update = Event(['instance'])
     after_update = Event(['instance'])
 
+class Group(object):
+    before_delete = Event(['instance'])
+    after_delete = Event(['instance'])
+    before_insert = Event(['instance'])
+    after_insert = Event(['instance'])
+    before_update = Event(['instance'])
+    after_update = Event(['instance'])
+
+class Permission(object):
+    before_delete = Event(['instance'])
+    after_delete = Event(['instance'])
+    before_insert = Event(['instance'])
+    after_insert = Event(['instance'])
+    before_update = Event(['instance'])
+    after_update = Event(['instance'])
+
 ###############################################################################
 # Forms
 
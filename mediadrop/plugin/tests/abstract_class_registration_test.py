@@ -32,8 +32,15 @@ class AbstractClassRegistrationTest(PythonicTestCase):
         
         def size(self):
             return 42
+    def setUp(self):
+        super(AbstractClassRegistrationTest, self).setUp()
+        # other tests rely on the implementations registered on import
+        self._registry = AbstractMetaClass._registry.copy()
+    
     def tearDown(self):
         AbstractMetaClass._registry.clear()
+        AbstractMetaClass._registry.update(self._registry)
+        super(AbstractClassRegistrationTest, self).tearDown()
     
     
     # --- tests ---------------------------------------------------------------
@@ -27,6 +27,8 @@ from mediadrop.plugin import events
 from mediadrop.model import (Author, AuthorWithIP, Category, Comment,
     DBSession, Group, Media, MediaFile, Permission, Podcast, Setting,
     User, metadata, cleanup_players_table)
+from mediadrop.model.auth import permissions_version, PERMISSIONS_VERSION_ID
+from mediadrop.model.catalog import catalog_version, CATALOG_VERSION_ID
 
 log = logging.getLogger(__name__)
 here = os.path.dirname(__file__)
@@ -86,12 +88,6 @@ def setup_app(command, conf, vars):
            ``python batch-scripts/upgrade/upgrade_from_v072.py deployment.ini``
            ``python batch-scripts/upgrade/upgrade_from_v080.py deployment.ini``
 
-    XXX: For search to work, we depend on a number of MySQL triggers which
-         copy the data from our InnoDB tables to a MyISAM table for its
-         fulltext indexing capability. Triggers can only be installed with
-         a mysql superuser like root, so you must run the setup_triggers.sql
-         script yourself.
-
     """
     # paster just scans the source code for a "websetup.py". Due to our
     # compatibility module for the old "mediacore" namespace it actually finds
@@ -169,6 +165,12 @@ def random_string(length):
 def add_default_data():
     log.info('Adding default data')
 
+    # the catalog and permissions versions are only updated, never inserted
+    DBSession.execute(catalog_version.insert().\
+        values(id=CATALOG_VERSION_ID, version=0))
+    DBSession.execute(permissions_version.insert().\
+        values(id=PERMISSIONS_VERSION_ID, version=0))
+
     settings = [
         (u'email_media_uploaded', None),
         (u'email_comment_posted', None),